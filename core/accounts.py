@@ -0,0 +1,63 @@
+import threading
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+GROUP_NAMES = {True: 'Especialistas', False: 'Clientes'}
+
+# ids dos grupos, buscados uma vez por processo (limpo pelo signal de Group)
+_group_ids = {}
+_lock = threading.Lock()
+
+
+def get_group_ids():
+    """{is_specialist: id do grupo}, sem ida ao banco depois da primeira vez."""
+    ids = dict(_group_ids)
+    if len(ids) < len(GROUP_NAMES):
+        with _lock:
+            ids = {
+                is_specialist: Group.objects.get_or_create(name=name)[0].pk
+                for is_specialist, name in GROUP_NAMES.items()
+            }
+            _group_ids.update(ids)
+    return ids
+
+
+def clear_group_ids():
+    _group_ids.clear()
+
+
+class EmailTaken(Exception):
+    """O email já tem conta (índice único LOWER(email) ou username)."""
+
+
+def email_taken(email):
+    return User.objects.filter(Q(username__iexact=email) | Q(email__iexact=email)).exists()
+
+
+def create_account(email, password, name='', is_specialist=False):
+    """Cadastro numa transação só: usuário (com first_name), perfil (pelo signal,
+    já com is_specialist) e grupo. Email repetido vira EmailTaken; outro
+    IntegrityError (grupo apagado por outro processo) tenta de novo com os ids
+    relidos e, se falhar outra vez, sobe para quem chamou."""
+    encoded = make_password(password)  # o hash é feito fora da transação
+    try:
+        return _insert_account(email, encoded, name, is_specialist)
+    except IntegrityError:
+        if email_taken(email):
+            raise EmailTaken(email)
+        clear_group_ids()
+        return _insert_account(email, encoded, name, is_specialist)
+
+
+def _insert_account(email, encoded, name, is_specialist):
+    group_id = get_group_ids()[is_specialist]
+    user = User(username=email, email=email, first_name=name or '', password=encoded)
+    user.profile_defaults = {'is_specialist': is_specialist}
+
+    with transaction.atomic():
+        user.save()
+        User.groups.through.objects.create(user_id=user.pk, group_id=group_id)
+    return user
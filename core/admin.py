@@ -1,17 +1,237 @@
-from django.contrib import admin
-from .models import Profile, Appointment
+from datetime import date
+
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Count, Max, Q
+from django.template.response import TemplateResponse
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .models import Profile, Appointment, Payment, Subscription, appointments_changed
+from .exports import streaming_export
+
+# Abaixo disso o COUNT(*) é barato e a paginação mostra o número exato
+ESTIMATE_THRESHOLD = 10000
+
+
+# --- CONTAGEM ESTIMADA (paginação de tabelas grandes) ---
+def estimated_rows(model, using):
+    """Linhas da tabela segundo as estatísticas do banco (pg_class.reltuples no
+    PostgreSQL, sqlite_stat1 depois de um ANALYZE no SQLite) ou None."""
+    connection = connections[using]
+    table = model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+            elif connection.vendor == 'sqlite':
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+            else:
+                return None
+            row = cursor.fetchone()
+    except DatabaseError:
+        # SQLite que nunca rodou ANALYZE ainda não tem a sqlite_stat1
+        return None
+    if row is None:
+        return None
+    estimate = int(str(row[0]).split()[0])
+    return estimate if estimate >= 0 else None  # reltuples = -1: tabela nunca analisada
+
+
+class EstimatedCountPaginator(Paginator):
+    """A lista sem filtro usa a estimativa do banco em vez de COUNT(*) na tabela
+    inteira; com filtro ou busca a contagem é exata (e passa pelos índices)."""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_rows(queryset.model, queryset.db)
+            if estimate is not None and estimate > ESTIMATE_THRESHOLD:
+                return estimate
+        return super().count
+
+
+# --- FILTRO LATERAL COM AUTOCOMPLETE ---
+class AutocompleteFilter(admin.SimpleListFilter):
+    """Filtro por chave estrangeira que busca as opções no autocomplete do admin
+    (paginado, pelo search_fields do outro model) em vez de listar todos na barra lateral."""
+    template = 'admin/core/autocomplete_filter.html'
+    # parameter_name é o próprio campo (?specialist=<pk>)
+    label_related = ()
+
+    def __init__(self, request, params, model, model_admin):
+        self.model = model
+        self.admin_site = model_admin.admin_site
+        super().__init__(request, params, model, model_admin)
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(**{self.parameter_name: self.value()})
+        return queryset
+
+    def widget(self):
+        # Só o valor escolhido é carregado (para o rótulo); o resto vem do autocomplete_view
+        field = self.model._meta.get_field(self.parameter_name)
+        choices = forms.ModelChoiceField(
+            queryset=field.remote_field.model._default_manager.select_related(*self.label_related),
+            widget=AutocompleteSelect(field, self.admin_site),
+            required=False,
+        )
+        return choices.widget.render(self.parameter_name, self.value(), attrs={'id': f'filter_{self.parameter_name}'})
+
+
+class SpecialistFilter(AutocompleteFilter):
+    title = 'especialista'
+    parameter_name = 'specialist'
+    label_related = ('user',)
+
+
+class ClientFilter(AutocompleteFilter):
+    title = 'cliente'
+    parameter_name = 'client'
+
 
 # Registra o Perfil para poder editar/ver no admin
-admin.site.register(Profile)
+@admin.register(Profile)
+class ProfileAdmin(admin.ModelAdmin):
+    # Também é a busca do autocomplete de especialista na Agenda
+    search_fields = ('^user__first_name', '^user__username')
+    list_display = ('__str__', 'is_specialist', 'profession', 'has_active_plan')
+    list_filter = ('is_specialist', 'has_active_plan')
+    list_select_related = ('user',)
+    ordering = ('pk',)
+
+    def get_queryset(self, request):
+        # O __str__ usa o username: o autocomplete não passa pelo list_select_related
+        return super().get_queryset(request).select_related('user')
+
+    def get_search_results(self, request, queryset, search_term):
+        queryset, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        # Autocomplete do campo specialist (filtro e formulário da Agenda): só especialistas
+        if request.GET.get('model_name') == 'appointment' and request.GET.get('field_name') == 'specialist':
+            queryset = queryset.filter(is_specialist=True)
+        return queryset, may_have_duplicates
+
 
 # Configuração avançada para a Agenda no Admin
 @admin.register(Appointment)
 class AppointmentAdmin(admin.ModelAdmin): # <--- A CORREÇÃO ESTÁ AQUI (era admin.site.ModelAdmin)
-    # O que aparece na lista
+    # O que aparece na lista (especialista, usuário e cliente no mesmo SELECT)
     list_display = ('specialist', 'date', 'time', 'is_booked', 'client')
-    
-    # Filtros laterais para facilitar a busca
-    list_filter = ('is_booked', 'date', 'specialist')
-    
-    # Barra de busca
-    search_fields = ('specialist__user__first_name', 'client__username')
\ No newline at end of file
+    list_select_related = ('specialist__user', 'client')
+
+    # Filtros laterais para facilitar a busca (especialista/cliente por autocomplete)
+    list_filter = ('is_booked', SpecialistFilter, ClientFilter)
+    show_facets = admin.ShowFacets.NEVER
+
+    # Navegação por ano/mês/dia pelo índice appt_date_time_idx
+    date_hierarchy = 'date'
+    # O pk no fim evita o '-pk' que o admin acrescentaria (ordem fora do índice)
+    ordering = ('date', 'time', 'pk')
+
+    # Barra de busca (prefixo: sem o '%' inicial do icontains)
+    search_fields = ('^specialist__user__first_name', '^client__username')
+
+    # Formulário: busca em vez de um <select> com todos os perfis e usuários
+    autocomplete_fields = ('specialist', 'client')
+
+    # Sem COUNT(*) da tabela inteira a cada página
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    # Exportação em streaming dos horários selecionados (ou de todos os filtrados)
+    actions = ('export_csv', 'export_jsonl', 'release_slots', 'delete_slots')
+
+    @property
+    def media(self):
+        # select2 do autocomplete também na lista (filtros laterais)
+        field = Appointment._meta.get_field('specialist')
+        return (
+            super().media
+            + AutocompleteSelect(field, self.admin_site).media
+            + forms.Media(js=['js/admin_autocomplete_filter.js'])
+        )
+
+    def get_actions(self, request):
+        # O delete_selected carrega e lista cada objeto antes de apagar um por um
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    @admin.action(description='Exportar selecionados (CSV)')
+    def export_csv(self, request, queryset):
+        return streaming_export(queryset, 'csv', request=request)
+
+    @admin.action(description='Exportar selecionados (JSONL)')
+    def export_jsonl(self, request, queryset):
+        return streaming_export(queryset, 'jsonl', request=request)
+
+    # --- AÇÕES EM LOTE (um UPDATE/DELETE só, sem carregar os objetos) ---
+    @admin.action(description='Liberar horários selecionados', permissions=['change'])
+    def release_slots(self, request, queryset):
+        booked = queryset.filter(is_booked=True)
+        specialist_ids = set(booked.order_by().values_list('specialist_id', flat=True).distinct())
+        updated = booked.update(is_booked=False, client=None, updated_at=timezone.now())
+        # Sem post_save: caches, facetas e a agenda ao vivo ficam com o signal em lote
+        appointments_changed.send(sender=Appointment, specialist_ids=specialist_ids)
+        self.message_user(request, f'{updated} horário(s) liberado(s).', messages.SUCCESS)
+
+    @admin.action(description='Excluir horários selecionados', permissions=['delete'])
+    def delete_slots(self, request, queryset):
+        if request.POST.get('post') != 'yes':
+            # Confirmação só com os totais (um agregado), sem listar objeto por objeto
+            totals = queryset.aggregate(total=Count('pk'), booked=Count('pk', filter=Q(is_booked=True)))
+            return TemplateResponse(request, 'admin/core/appointment/delete_slots.html', {
+                **self.admin_site.each_context(request),
+                'title': 'Excluir horários',
+                'opts': self.model._meta,
+                'totals': totals,
+                'selected': request.POST.getlist(admin.helpers.ACTION_CHECKBOX_NAME),
+                'select_across': request.POST.get('select_across', '0'),
+                'action': request.POST.get('action'),
+            })
+
+        # Por especialista, a data mais distante apagada: quem perdeu horário futuro muda no catálogo
+        latest = dict(
+            queryset.order_by().values('specialist_id').annotate(latest=Max('date'))
+            .values_list('specialist_id', 'latest')
+        )
+        with transaction.atomic(using=queryset.db):
+            # DELETE direto: o delete() passaria pelo Collector e pelo post_delete de cada linha
+            deleted = queryset.order_by()._raw_delete(queryset.db)
+            today = date.today()
+            Profile.objects.filter(pk__in=[pk for pk, day in latest.items() if day >= today]).update(
+                updated_at=timezone.now(),
+            )
+        appointments_changed.send(sender=Appointment, specialist_ids=set(latest))
+        self.message_user(request, f'{deleted} horário(s) excluído(s).', messages.SUCCESS)
+
+
+# Assinaturas e pagamentos (core.billing): o pagamento é só leitura
+@admin.register(Subscription)
+class SubscriptionAdmin(admin.ModelAdmin):
+    list_display = ('profile', 'plan', 'expires_at', 'is_active')
+    list_select_related = ('profile__user',)
+    list_filter = ('is_active', 'plan')
+    autocomplete_fields = ('profile',)
+
+
+@admin.register(Payment)
+class PaymentAdmin(admin.ModelAdmin):
+    list_display = ('profile', 'plan', 'amount', 'created_at')
+    list_select_related = ('profile__user',)
+    list_filter = ('plan',)
+    readonly_fields = ('profile', 'subscription', 'idempotency_key', 'plan', 'amount', 'created_at')
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,96 @@
+import gzip
+import json
+import os
+from datetime import date
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .models import Appointment, ArchivedAppointment, appointments_changed
+
+FIELDS = ('id', 'specialist_id', 'client_id', 'date', 'time', 'is_booked')
+
+
+# --- CHECKPOINT (permite retomar de onde parou) ---
+# Vale só para a mesma data de corte: com outro --before, ids menores que ainda
+# eram futuros na execução anterior podem ter passado e precisam ser lidos de novo.
+def load_checkpoint(path, before):
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path) as fh:
+        data = json.load(fh)
+    if data.get('before') != before.isoformat():
+        return 0
+    return data.get('last_id', 0)
+
+
+def save_checkpoint(path, before, last_id):
+    if not path:
+        return
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as fh:
+        json.dump({'before': before.isoformat(), 'last_id': last_id}, fh)
+    os.replace(tmp, path)
+
+
+def clear_checkpoint(path):
+    # Execução completa: a próxima começa do id 0
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+# --- DESTINOS ---
+def write_table(rows):
+    ArchivedAppointment.objects.bulk_create(
+        [ArchivedAppointment(**row) for row in rows],
+        ignore_conflicts=True,  # rodar de novo o mesmo lote não duplica
+    )
+
+
+def write_jsonl(rows, output_dir):
+    # Um arquivo por lote, nomeado pela faixa de ids: reprocessar sobrescreve o mesmo arquivo
+    name = f"appointments-{rows[0]['id']:012d}-{rows[-1]['id']:012d}.jsonl.gz"
+    path = os.path.join(output_dir, name)
+    tmp = f'{path}.tmp'
+    with gzip.open(tmp, 'wt', encoding='utf-8') as fh:
+        for row in rows:
+            fh.write(json.dumps(row, cls=DjangoJSONEncoder))
+            fh.write('\n')
+    os.replace(tmp, path)
+
+
+# --- PIPELINE ---
+def archive_appointments(before=None, batch_size=1000, output_dir=None, checkpoint=None):
+    """Move em lotes os horários com data < before para o histórico (tabela
+    ArchivedAppointment ou, com output_dir, arquivos .jsonl.gz). Cada lote é
+    copiado e apagado na mesma transação; gera (quantidade, último id) por lote."""
+    before = before or date.today()
+    last_id = load_checkpoint(checkpoint, before)
+
+    while True:
+        rows = list(
+            Appointment.objects.filter(date__lt=before, id__gt=last_id)
+            .order_by('id')
+            .values(*FIELDS)[:batch_size]
+        )
+        if not rows:
+            clear_checkpoint(checkpoint)
+            break
+
+        with transaction.atomic():
+            if output_dir:
+                write_jsonl(rows, output_dir)
+            else:
+                write_table(rows)
+            # DELETE direto: o delete() passaria pelo Collector e pelos post_delete de
+            # cada linha (versões do cache, perfil e evento SSE por horário arquivado)
+            Appointment.objects.filter(id__in=[row['id'] for row in rows])._raw_delete(Appointment.objects.db)
+
+        # Horário passado não aparece em lugar nenhum; com um --before no futuro, um signal por lote
+        visible = {row['specialist_id'] for row in rows if row['date'] >= date.today()}
+        if visible:
+            appointments_changed.send(sender=Appointment, specialist_ids=visible)
+
+        last_id = rows[-1]['id']
+        save_checkpoint(checkpoint, before, last_id)
+        yield len(rows), last_id
@@ -0,0 +1,156 @@
+import asyncio
+from datetime import date
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import redirect, render
+
+from . import availability, caching, events, facets, listing
+from .freshness import ahome_validator, aspecialist_validator, conditional_catalogue, templates_version
+from .middleware import get_request_profile
+from .models import Appointment, Profile
+from .routers import read_from_replica
+
+# Horários livres devolvidos de uma vez pelo endpoint de disponibilidade
+AVAILABILITY_LIMIT = 200
+
+
+# Versões async das páginas de catálogo (só leitura), usadas quando o projeto
+# roda pelo setup/asgi.py (ASYNC_VIEWS). Cliente lento esperando não prende thread.
+def with_viewer(view):
+    """Carrega usuário e perfil antes da view: o request.user preguiçoso do
+    AuthenticationMiddleware consultaria o banco dentro do event loop."""
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        request.user = await request.auser()
+        request.profile = await sync_to_async(get_request_profile)(request)
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+# --- HOME ---
+@with_viewer
+@read_from_replica
+@conditional_catalogue(ahome_validator)
+async def home(request):
+    specialists = listing.specialist_cards()
+
+    category = request.GET.get('category')
+    if category and category != 'all':
+        specialists = specialists.filter(profession=category)
+
+    query = request.GET.get('q')
+    after = listing.parse_cursor(request.GET.get('after'))
+    if query:
+        page = await listing.asearch_page(specialists, query, after=after)
+    else:
+        page = await listing.akeyset_page(specialists, after=after)
+
+    context = {
+        'specialists': page.items,
+        'next_cursor': page.next_cursor,
+        'facets': await sync_to_async(facets.get_facets)(query),
+        'category': category or 'all',
+        'card_seconds': settings.CARD_FRAGMENT_SECONDS,
+        'templates_version': templates_version(),
+    }
+    # O {% cache %} dos cards fala com o cache (arquivo/rede): render numa thread
+    return await sync_to_async(render)(request, 'home.html', context)
+
+
+# --- DETALHES ---
+@with_viewer
+@read_from_replica
+@conditional_catalogue(aspecialist_validator)
+async def specialist_detail_view(request, id):
+    spec = await caching.arequest_specialist_page(request, id)
+    if spec is None:
+        raise Http404
+
+    if not spec['is_specialist']:
+        return redirect('home')
+
+    return await sync_to_async(render)(request, 'specialist_detail.html', {'spec': spec})
+
+
+# --- DISPONIBILIDADE (JSON) ---
+@read_from_replica
+async def availability_view(request, id):
+    """Horários livres a partir de hoje: [{id, date, time}], no máximo AVAILABILITY_LIMIT."""
+    try:
+        await Profile.objects.filter(is_specialist=True).only('pk').aget(pk=id)
+    except Profile.DoesNotExist:
+        raise Http404
+
+    # Índice parcial appt_free_slots_idx (specialist, date, time WHERE NOT is_booked)
+    free = Appointment.objects.filter(specialist_id=id, is_booked=False, date__gte=date.today())
+    # values() e não values_list(): no Django 5.0 o aiterator() do values_list executa
+    # a query fora da thread (SynchronousOnlyOperation)
+    rows = free.order_by('date', 'time').values('pk', 'date', 'time')[:AVAILABILITY_LIMIT]
+    slots = [
+        {'id': row['pk'], 'date': row['date'].isoformat(), 'time': row['time'].strftime('%H:%M')}
+        async for row in rows.aiterator()
+    ]
+    total = await free.acount() if len(slots) == AVAILABILITY_LIMIT else len(slots)
+    return JsonResponse({'specialist': id, 'total': total, 'slots': slots})
+
+
+@read_from_replica
+async def availability_api_view(request):
+    """Horários livres de vários especialistas num intervalo de datas, um mapa
+    de bits por dia com o passo e os ids (ver core.availability.encode_day).
+    Paginado pelo id do especialista."""
+    try:
+        query = availability.parse_query(request.GET)
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+
+    page = await listing.akeyset_page(
+        availability.specialists(query.ids), after=query.after, size=availability.PAGE_SIZE,
+    )
+    ids = [spec.id for spec in page.items]
+    days = await availability.afree_days(ids, query.start, query.end)
+    return JsonResponse({
+        'start': query.start.isoformat(),
+        'end': query.end.isoformat(),
+        'specialists': [{'id': pk, 'days': days[pk]} for pk in ids],
+        'next': page.next_cursor,
+    })
+
+
+# --- AGENDA AO VIVO (SSE) ---
+async def slot_events_view(request, id):
+    """text/event-stream com booked/freed/removed/changed da agenda do especialista.
+    Só no ASGI: num worker síncrono cada conexão aberta prenderia o processo."""
+    if not settings.ASYNC_VIEWS:
+        # 204 faz o EventSource parar de reconectar; a página segue sem atualização ao vivo
+        return HttpResponse(status=204)
+    if not await Profile.objects.filter(pk=id, is_specialist=True).aexists():
+        raise Http404
+
+    response = StreamingHttpResponse(event_stream(id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: não segura os eventos no buffer
+    return response
+
+
+async def event_stream(specialist_id):
+    subscription = events.subscribe(specialist_id)
+    try:
+        yield events.RETRY
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), settings.SLOT_EVENTS_HEARTBEAT)
+            except asyncio.TimeoutError:
+                # Comentário SSE: mantém a conexão viva através de proxies
+                yield ': ping\n\n'
+                continue
+            if event is None:
+                return
+            yield events.encode(event)
+    finally:
+        # Cliente desconectou (o ASGIHandler cancela o stream) ou a fila estourou
+        events.unsubscribe(subscription)
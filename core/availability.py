@@ -0,0 +1,92 @@
+import math
+from collections import namedtuple
+from datetime import date, timedelta
+
+from .models import Appointment, Profile
+
+# Maior intervalo aceito numa chamada (dias, contando início e fim)
+MAX_DAYS = 31
+# Intervalo quando o cliente não manda o fim: uma semana a partir do início
+DEFAULT_DAYS = 7
+# Ids aceitos em ?specialists= e especialistas por página da resposta
+MAX_IDS = 200
+PAGE_SIZE = 50
+
+AvailabilityQuery = namedtuple('AvailabilityQuery', ['ids', 'start', 'end', 'after'])
+
+
+def parse_query(params):
+    """?specialists=1,2,3&start=AAAA-MM-DD&end=AAAA-MM-DD&after=<id>.
+    Sem specialists, pagina por todos. ValueError com a mensagem para o 400."""
+    ids = None
+    raw_ids = params.get('specialists', '').strip()
+    if raw_ids:
+        try:
+            ids = sorted({int(value) for value in raw_ids.split(',') if value.strip()})
+        except ValueError:
+            raise ValueError('specialists espera ids numéricos separados por vírgula.')
+        if len(ids) > MAX_IDS:
+            raise ValueError(f'No máximo {MAX_IDS} especialistas por chamada.')
+
+    try:
+        start = date.fromisoformat(params['start']) if params.get('start') else date.today()
+        end = date.fromisoformat(params['end']) if params.get('end') else start + timedelta(days=DEFAULT_DAYS - 1)
+    except ValueError:
+        raise ValueError('start e end usam o formato AAAA-MM-DD.')
+    if end < start:
+        raise ValueError('end não pode ser antes de start.')
+    if (end - start).days + 1 > MAX_DAYS:
+        raise ValueError(f'O intervalo pode ter no máximo {MAX_DAYS} dias.')
+
+    after = params.get('after')
+    try:
+        after = int(after) if after else None
+    except ValueError:
+        raise ValueError('after espera o id devolvido em next.')
+    # Horário livre no passado não é reservável
+    return AvailabilityQuery(ids, max(start, date.today()), end, after)
+
+
+def specialists(ids=None):
+    queryset = Profile.objects.filter(is_specialist=True).only('id')
+    if ids is not None:
+        queryset = queryset.filter(id__in=ids)
+    return queryset
+
+
+def free_slots(ids, start, end):
+    """Horários livres do intervalo numa consulta só, já na ordem (especialista, dia, hora)."""
+    return (
+        # Índice parcial appt_free_slots_idx (specialist, date, time WHERE NOT is_booked)
+        Appointment.objects.filter(specialist_id__in=ids, is_booked=False, date__range=(start, end))
+        .order_by('specialist_id', 'date', 'time')
+        .values('pk', 'specialist_id', 'date', 'time')
+    )
+
+
+def encode_day(slots):
+    """[(id, minutos desde 00:00), ...] de um dia -> {'step', 'bits', 'ids'}.
+    O passo é o MDC dos minutos (09:00, 09:15 e 09:45 dão 15), então todo
+    horário cai exatamente num bit; ids vem na ordem dos bits ligados."""
+    step = math.gcd(*(minutes for _, minutes in slots)) or 60  # só 00:00: qualquer passo serve
+    bits = 0
+    for _, minutes in slots:
+        bits |= 1 << (minutes // step)
+    return {'step': step, 'bits': format(bits, 'x'), 'ids': [pk for pk, _ in slots]}
+
+
+async def afree_days(ids, start, end):
+    """{id: {'AAAA-MM-DD': encode_day(...)}}; dias sem horário livre ficam de fora."""
+    grouped = {pk: {} for pk in ids}
+    if ids:
+        async for row in free_slots(ids, start, end).aiterator():
+            day = grouped[row['specialist_id']].setdefault(row['date'].isoformat(), [])
+            day.append((row['pk'], row['time'].hour * 60 + row['time'].minute))
+    return {pk: {day: encode_day(slots) for day, slots in days.items()} for pk, days in grouped.items()}
+
+
+def decode(day):
+    """Inverso do encode_day (para testes e clientes em Python): [(id, 'HH:MM'), ...]."""
+    bits, step = int(day['bits'], 16), day['step']
+    offsets = [n * step for n in range(bits.bit_length()) if bits >> n & 1]
+    return [(pk, f'{minutes // 60:02d}:{minutes % 60:02d}') for pk, minutes in zip(day['ids'], offsets)]
@@ -0,0 +1,36 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.exceptions import PermissionDenied
+
+from .hashers import check_password
+
+
+class ProfileBackend(ModelBackend):
+    """ModelBackend que já traz o Profile no mesmo SELECT do usuário da sessão."""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.select_related('profile').get(**{UserModel.USERNAME_FIELD: username})
+        except UserModel.DoesNotExist:
+            # Mesmo custo de um hash de verdade: não revela se o email existe
+            UserModel().set_password(password)
+            raise PermissionDenied
+        # Hash antigo (algoritmo ou custo) é regravado em segundo plano
+        if check_password(user, password) and self.user_can_authenticate(user):
+            return user
+        # PermissionDenied encerra a cadeia: o ModelBackend (listado só pelas
+        # sessões antigas) não calcularia o mesmo hash de novo
+        raise PermissionDenied
+
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.select_related('profile').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,302 @@
+import asyncio
+import random
+import statistics
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, time, timedelta
+from time import perf_counter
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import close_old_connections, connection
+from django.test import Client
+from django.urls import reverse
+
+from . import metrics, search
+from .models import Appointment, Profile, SearchDocument
+
+WORDS = (
+    'python', 'django', 'contabilidade', 'tributário', 'nutrição', 'ansiedade', 'marca',
+    'vendas', 'arquitetura', 'estrutural', 'carreira', 'liderança', 'investimentos', 'saúde',
+)
+NAMES = ('Ana', 'Bruno', 'Carla', 'Diego', 'Elisa', 'Fábio', 'Gabriela', 'Heitor', 'Íris', 'João')
+PROFESSIONS = [value for value, _ in Profile.PROFISSOES_CHOICES]
+BATCH = 2000
+
+
+# --- DADOS SINTÉTICOS (só caminhos em lote, sem signals) ---
+def generate_dataset(clients=100, specialists=100, slots_per_specialist=20, seed=42):
+    rng = random.Random(seed)
+    password = make_password('benchmark')  # um hash só: PBKDF2 por usuário levaria minutos
+    prefix = f'bench{rng.randrange(10**6)}'
+
+    def make_users(kind, count):
+        users = [
+            User(username=f'{prefix}-{kind}{i}@bench.local', email=f'{prefix}-{kind}{i}@bench.local',
+                 first_name=rng.choice(NAMES), password=password)
+            for i in range(count)
+        ]
+        User.objects.bulk_create(users, batch_size=BATCH)
+        return list(User.objects.filter(username__startswith=f'{prefix}-{kind}').order_by('pk'))
+
+    client_users = make_users('client', clients)
+    Profile.objects.bulk_create(
+        [Profile(user=u, has_active_plan=True, access_type='assinatura') for u in client_users],
+        batch_size=BATCH,
+    )
+
+    spec_users = make_users('spec', specialists)
+    Profile.objects.bulk_create(
+        [
+            Profile(
+                user=u, is_specialist=True, profession=rng.choice(PROFESSIONS),
+                description=' '.join(rng.choices(WORDS, k=12)), price=rng.randrange(80, 400),
+            )
+            for u in spec_users
+        ],
+        batch_size=BATCH,
+    )
+    spec_profiles = list(Profile.objects.filter(user__in=spec_users).select_related('user'))
+    SearchDocument.objects.bulk_create(
+        [SearchDocument(profile=p, document=search.build_document(p)) for p in spec_profiles],
+        batch_size=BATCH,
+    )
+
+    start = date.today() + timedelta(days=1)
+    slots = []
+    for profile in spec_profiles:
+        for n in range(slots_per_specialist):
+            slots.append(Appointment(specialist=profile, date=start + timedelta(days=n // 8), time=time(9 + n % 8)))
+            if len(slots) >= BATCH:
+                Appointment.objects.bulk_create(slots, ignore_conflicts=True)
+                slots = []
+    Appointment.objects.bulk_create(slots, ignore_conflicts=True)
+
+    return {
+        'clients': [u.pk for u in client_users],
+        'specialists': [p.pk for p in spec_profiles],
+        'sizes': {'clients': clients, 'specialists': specialists, 'slots_per_specialist': slots_per_specialist},
+    }
+
+
+# --- CENÁRIOS (rotas reais via django.test.Client) ---
+class Scenario:
+    login = False
+
+    def __init__(self, dataset, rng):
+        self.dataset = dataset
+        self.rng = rng
+
+    def request(self, client):
+        raise NotImplementedError
+
+
+class Home(Scenario):
+    def request(self, client):
+        return client.get(reverse('home'))
+
+
+class HomeRevalidate(Scenario):
+    """Navegador que já tem a Home: manda If-None-Match com o ETag recebido."""
+
+    def request(self, client):
+        etag = getattr(client, 'home_etag', None)
+        headers = {'If-None-Match': etag} if etag else {}
+        response = client.get(reverse('home'), headers=headers)
+        client.home_etag = response.get('ETag', etag)
+        return response
+
+
+class Search(Scenario):
+    def request(self, client):
+        return client.get(reverse('home'), {'q': self.rng.choice(WORDS)[:4]})
+
+
+class SpecialistDetail(Scenario):
+    def request(self, client):
+        return client.get(reverse('specialist_detail', args=[self.rng.choice(self.dataset['specialists'])]))
+
+
+class AvailabilityWeek(Scenario):
+    """A mesma agenda do specialist_detail, pela API JSON: uma semana de um especialista."""
+
+    def request(self, client):
+        return client.get(reverse('availability_api'), {'specialists': self.rng.choice(self.dataset['specialists'])})
+
+
+class AvailabilityBatch(Scenario):
+    """Widget de calendário: uma semana de 20 especialistas numa chamada só."""
+
+    def request(self, client):
+        ids = self.rng.sample(self.dataset['specialists'], min(20, len(self.dataset['specialists'])))
+        return client.get(reverse('availability_api'), {'specialists': ','.join(map(str, ids))})
+
+
+class Dashboard(Scenario):
+    login = True
+
+    def request(self, client):
+        return client.get(reverse('dashboard'))
+
+
+class Book(Scenario):
+    """Cada requisição tenta um horário livre diferente (sem disputa)."""
+    login = True
+
+    def __init__(self, dataset, rng):
+        super().__init__(dataset, rng)
+        ids = Appointment.objects.filter(is_booked=False).order_by('?').values_list('pk', flat=True)
+        self.free = iter(list(ids))
+        self.lock = threading.Lock()
+
+    def request(self, client):
+        with self.lock:
+            slot = next(self.free, None)
+        if slot is None:
+            return None
+        return client.get(reverse('book_appointment', args=[slot]))
+
+
+SCENARIOS = {
+    'home': Home,
+    'home_revalidate': HomeRevalidate,
+    'search': Search,
+    'specialist_detail': SpecialistDetail,
+    'availability_week': AvailabilityWeek,
+    'availability_batch': AvailabilityBatch,
+    'dashboard': Dashboard,
+    'book': Book,
+}
+
+
+# --- EXECUÇÃO ---
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_scenario(scenario, dataset, threads=4, requests=200, seed=42):
+    rng = random.Random(seed)
+    scenario = scenario(dataset, rng)
+    per_thread = max(1, requests // threads)
+    lock = threading.Lock()
+    latencies, queries, sizes, renders, errors = [], [], [], [], []
+
+    def worker(index):
+        client = Client()
+        if scenario.login:
+            client.force_login(User.objects.get(pk=dataset['clients'][index % len(dataset['clients'])]))
+        local_latencies, local_queries, local_sizes, local_renders, local_errors = [], [], [], [], 0
+        for _ in range(per_thread):
+            counter = {'queries': 0}
+
+            def count(execute, sql, params, many, context):
+                counter['queries'] += 1
+                return execute(sql, params, many, context)
+
+            # Tempo de render dos templates (core.metrics.InstrumentedTemplates)
+            request_metrics = metrics.RequestMetrics()
+            token = metrics.current.set(request_metrics)
+            start = perf_counter()
+            try:
+                with connection.execute_wrapper(count):
+                    response = scenario.request(client)
+            finally:
+                metrics.current.reset(token)
+            elapsed = perf_counter() - start
+            if response is None:
+                break
+            if response.status_code >= 400:
+                local_errors += 1
+            local_latencies.append(elapsed * 1000)
+            local_queries.append(counter['queries'])
+            local_sizes.append(len(response.content))
+            local_renders.append(request_metrics.render_time * 1000)
+        with lock:
+            latencies.extend(local_latencies)
+            queries.extend(local_queries)
+            sizes.extend(local_sizes)
+            renders.extend(local_renders)
+            errors.append(local_errors)
+
+    def run_in_thread(index):
+        try:
+            worker(index)
+        finally:
+            close_old_connections()
+
+    started = perf_counter()
+    if threads == 1:
+        worker(0)
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(run_in_thread, range(threads)))
+    wall = perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': sum(errors),
+        'threads': threads,
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'mean_ms': round(statistics.fmean(latencies), 2) if latencies else 0.0,
+        'queries_per_request': round(statistics.fmean(queries), 2) if queries else 0.0,
+        'bytes_per_request': round(statistics.fmean(sizes)) if sizes else 0,
+        'render_ms_per_request': round(statistics.fmean(renders), 2) if renders else 0.0,
+        'throughput_rps': round(len(latencies) / wall, 1) if wall else 0.0,
+    }
+
+
+# --- CLIENTES LENTOS (concorrência por worker: ASGI x WSGI) ---
+async def timed_get(host, port, path, start_at, hold=0.0):
+    """GET com Connection: close depois de start_at segundos. Com hold, é um cliente
+    lento: leva hold segundos para terminar de mandar os cabeçalhos (rede móvel ruim)."""
+    await asyncio.sleep(start_at)
+    start = perf_counter()
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\n'.encode())
+        if hold:
+            await writer.drain()
+            await asyncio.sleep(hold)
+        writer.write(b'Connection: close\r\n\r\n')
+        await writer.drain()
+        data = await reader.read()
+        writer.close()
+    except OSError:
+        return perf_counter() - start, 0
+    status = int(data.split(b' ', 2)[1]) if data.startswith(b'HTTP/') else 0
+    return perf_counter() - start, status
+
+
+def run_slow_clients(host, port, path, requests=100, rate=20, slow=0, hold=1.0):
+    """`requests` GETs normais, `rate` por segundo, enquanto `slow` clientes lentos
+    chegam espalhados no mesmo intervalo. Mede a latência dos normais: num worker
+    síncrono, cada cliente lento na fila segura todos que chegam depois dele."""
+    duration = requests / rate
+
+    async def all_clients():
+        normal = [timed_get(host, port, path, i / rate) for i in range(requests)]
+        lagging = [timed_get(host, port, path, i * duration / slow, hold) for i in range(slow)]
+        return await asyncio.gather(*normal, *lagging)
+
+    started = perf_counter()
+    results = asyncio.run(all_clients())
+    wall = perf_counter() - started
+
+    latencies = sorted(elapsed * 1000 for elapsed, _ in results[:requests])
+    return {
+        'requests': requests,
+        'rate': rate,
+        'slow_clients': slow,
+        'slow_hold_ms': round(hold * 1000),
+        'errors': sum(1 for _, status in results if not 200 <= status < 400),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'max_ms': round(latencies[-1], 2) if latencies else 0.0,
+        'wall_s': round(wall, 2),
+    }
@@ -0,0 +1,91 @@
+from collections import namedtuple
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Payment, Profile, Subscription
+
+Plan = namedtuple('Plan', ['price', 'days'])
+
+# Catálogo do servidor: o valor cobrado nunca vem da URL do checkout
+PLANS = {
+    'Basico': Plan(Decimal('29.90'), 30),
+    'Premium': Plan(Decimal('179.70'), 90),  # R$ 59,90/mês cobrado por trimestre
+    'Empresarial': Plan(Decimal('149.90'), 30),
+}
+
+EXPIRY_BATCH = 1000
+
+
+# --- PAGAMENTO (idempotente) ---
+def process_payment(profile, plan_name, idempotency_key):
+    """Registra o pagamento e estende a assinatura. Retorna (payment, created):
+    a mesma chave de novo (duplo clique, reenvio) devolve o pagamento existente
+    sem estender nada."""
+    plan = PLANS[plan_name]
+    now = timezone.now()
+    with transaction.atomic():
+        try:
+            # Savepoint: a constraint unique_payment_idempotency_key decide quem chegou primeiro
+            with transaction.atomic():
+                payment = Payment.objects.create(
+                    profile=profile, plan=plan_name, amount=plan.price, idempotency_key=idempotency_key,
+                )
+        except IntegrityError:
+            return Payment.objects.get(profile=profile, idempotency_key=idempotency_key), False
+
+        subscription = extend_subscription(profile, plan_name, timedelta(days=plan.days), now)
+        payment.subscription = subscription
+        payment.save(update_fields=['subscription'])
+        Profile.objects.filter(pk=profile.pk).update(has_active_plan=True, access_type='assinatura', updated_at=now)
+    return payment, True
+
+
+def extend_subscription(profile, plan_name, duration, now):
+    """Renova a partir do vencimento atual (ou de agora, se já venceu) num UPDATE só:
+    dois pagamentos ao mesmo tempo somam os dois períodos."""
+    subscription, created = Subscription.objects.get_or_create(
+        profile=profile, defaults={'plan': plan_name, 'expires_at': now + duration},
+    )
+    if not created:
+        Subscription.objects.filter(pk=subscription.pk).update(
+            plan=plan_name, is_active=True, updated_at=now,
+            expires_at=Greatest(F('expires_at'), Value(now)) + duration,
+        )
+    return subscription
+
+
+# --- CONSULTA NA RESERVA ---
+def has_active_plan(profile):
+    """Uma consulta pelo índice único de profile_id."""
+    return Subscription.objects.filter(
+        profile_id=profile.pk, is_active=True, expires_at__gt=timezone.now(),
+    ).exists()
+
+
+# --- VENCIMENTO (comando expire_subscriptions) ---
+def expire_subscriptions(now=None, batch_size=EXPIRY_BATCH):
+    """Desativa em lotes as assinaturas vencidas e tira o plano dos perfis, com
+    dois UPDATEs por lote; gera a quantidade desativada em cada lote."""
+    now = now or timezone.now()
+    while True:
+        # Índice parcial subscription_expiry_idx (expires_at WHERE is_active)
+        ids = list(
+            Subscription.objects.filter(is_active=True, expires_at__lte=now)
+            .order_by('expires_at')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        with transaction.atomic():
+            # Refaz o filtro de vencimento: um pagamento entre o SELECT e aqui mantém o plano
+            expired = Subscription.objects.filter(pk__in=ids, is_active=True, expires_at__lte=now)
+            count = expired.update(is_active=False, updated_at=now)
+            Profile.objects.filter(subscription__in=ids, subscription__is_active=False).update(
+                has_active_plan=False, access_type='nenhum', updated_at=now,
+            )
+        yield count
@@ -0,0 +1,215 @@
+import threading
+import time
+import weakref
+from datetime import date
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .models import Appointment, Profile
+from .routers import primary_reads
+
+# O valor fica no cache até a geração mudar; o TTL é só uma rede de segurança
+PAGE_TIMEOUT = 60 * 60 * 24
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 0.05
+LOCK_RETRIES = 40
+
+
+# --- CONTADORES (por processo) ---
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_stats():
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0
+
+
+# --- VERSÕES (contadores compartilhados entre processos via cache) ---
+def get_version(name):
+    key = f'{name}:gen'
+    version = cache.get(key)
+    if version is None:
+        # Começa no relógio (ms) e não em 1: se a chave for despejada do cache,
+        # a nova versão nunca coincide com uma antiga ainda guardada.
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+async def aget_version(name):
+    key = f'{name}:gen'
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, int(time.time() * 1000), None)
+        version = await cache.aget(key)
+    return version
+
+
+def bump_version(name):
+    """Muda a versão agora (a própria transação já lê o valor novo) e de novo no
+    commit: um miss concorrente que remontou o valor com dados de antes do commit
+    fica guardado numa versão que ninguém mais usa."""
+    _incr_version(name)
+    transaction.on_commit(lambda: _incr_version(name))
+
+
+def _incr_version(name):
+    try:
+        cache.incr(f'{name}:gen')
+    except ValueError:
+        get_version(name)
+
+
+def get_generation(specialist_id):
+    return get_version(f'specialist:{specialist_id}')
+
+
+def bump_generation(specialist_id):
+    bump_version(f'specialist:{specialist_id}')
+
+
+# --- PÁGINA PÚBLICA DO ESPECIALISTA ---
+def build_specialist_page(specialist_id):
+    spec = Profile.objects.select_related('user').filter(pk=specialist_id).first()
+    if spec is None:
+        return None
+    if not spec.is_specialist:
+        return {'is_specialist': False}
+
+    appointments = list(Appointment.objects.filter(
+        specialist=spec,
+        date__gte=date.today()
+    ).order_by('date', 'time'))
+
+    return {
+        'is_specialist': True,
+        'id': spec.pk,
+        # Validador do GET condicional (core.freshness): sai junto do cache, sem query extra
+        'updated_at': max([spec.updated_at] + [appt.updated_at for appt in appointments]),
+        'name': spec.user.first_name,
+        'description': spec.description,
+        'card_html': render_to_string('partials/specialist_card.html', {'spec': spec}),
+        'agenda_html': render_to_string('partials/specialist_agenda.html', {'appointments': appointments}),
+    }
+
+
+def _page_key(specialist_id, generation):
+    # A chave inclui a geração e o dia (a agenda só mostra horários futuros)
+    return f'specialist:{specialist_id}:page:{generation}:{date.today()}'
+
+
+def _safe(page):
+    if page and page['is_specialist']:
+        page = dict(page, card_html=mark_safe(page['card_html']), agenda_html=mark_safe(page['agenda_html']))
+    return page
+
+
+def get_specialist_page(specialist_id):
+    """Card + agenda renderizados do especialista, ou None se o perfil não existe."""
+    key = _page_key(specialist_id, get_generation(specialist_id))
+    page = cache.get(key)
+    if page is None:
+        page = _fill(key, specialist_id)
+    else:
+        _count('hits')
+    return _safe(page)
+
+
+async def aget_specialist_page(specialist_id):
+    """get_specialist_page para views async; só a falta (lock + ORM + render) vai para uma thread."""
+    key = _page_key(specialist_id, await aget_version(f'specialist:{specialist_id}'))
+    page = await cache.aget(key)
+    if page is None:
+        page = await sync_to_async(_fill)(key, specialist_id)
+    else:
+        _count('hits')
+    return _safe(page)
+
+
+def request_specialist_page(request, specialist_id):
+    """get_specialist_page uma vez por requisição (o ETag e a view usam a mesma)."""
+    pages = request.__dict__.setdefault('_specialist_pages', {})
+    if specialist_id not in pages:
+        pages[specialist_id] = get_specialist_page(specialist_id)
+    return pages[specialist_id]
+
+
+async def arequest_specialist_page(request, specialist_id):
+    pages = request.__dict__.setdefault('_specialist_pages', {})
+    if specialist_id not in pages:
+        pages[specialist_id] = await aget_specialist_page(specialist_id)
+    return pages[specialist_id]
+
+
+# Locks por chave dentro do processo: o add() do FileBasedCache não é atômico
+# (has_key + set), então duas threads do mesmo worker podiam pegar o lock do cache
+_local_locks = weakref.WeakValueDictionary()
+_local_locks_guard = threading.Lock()
+
+
+def _local_lock(key):
+    with _local_locks_guard:
+        lock = _local_locks.get(key)
+        if lock is None:
+            lock = _local_locks[key] = threading.Lock()
+        return lock
+
+
+def _fill(key, specialist_id):
+    lock = _local_lock(key)
+    acquired = lock.acquire(timeout=LOCK_RETRIES * LOCK_WAIT)
+    try:
+        if acquired:
+            # Outra thread deste processo pode ter acabado de montar
+            page = cache.get(key)
+            if page is not None:
+                _count('hits')
+                return page
+        return _fill_shared(key, specialist_id)
+    finally:
+        if acquired:
+            lock.release()
+
+
+def _fill_shared(key, specialist_id):
+    # Proteção contra stampede: só quem pega o lock consulta o banco,
+    # os demais esperam o valor aparecer no cache.
+    lock_key = f'{key}:lock'
+    locked = False
+    for _ in range(LOCK_RETRIES):
+        locked = cache.add(lock_key, 1, LOCK_TIMEOUT)
+        if locked:
+            break
+        time.sleep(LOCK_WAIT)
+        page = cache.get(key)
+        if page is not None:
+            _count('hits')
+            return page
+
+    _count('misses')
+    try:
+        # Vai ficar no cache com a geração atual: lê do primário, nunca da réplica atrasada
+        with primary_reads():
+            page = build_specialist_page(specialist_id)
+        if page is not None:
+            cache.set(key, page, PAGE_TIMEOUT)
+        return page
+    finally:
+        if locked:
+            cache.delete(lock_key)
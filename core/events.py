@@ -0,0 +1,181 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils.module_loading import import_string
+
+# Eventos guardados por assinante; passou disso o leitor está lento e é desconectado
+QUEUE_SIZE = 100
+# Primeira linha do stream: o EventSource espera 5s antes de reconectar
+RETRY = 'retry: 5000\n\n'
+# PostgresBackend: canal do NOTIFY e espera antes de reabrir o LISTEN que caiu
+PG_CHANNEL = 'slot_events'
+PG_RECONNECT_WAIT = 5
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """Uma conexão SSE: a fila vive no event loop de quem assinou."""
+
+    __slots__ = ('specialist_id', 'loop', 'queue')
+
+    def __init__(self, specialist_id, loop):
+        self.specialist_id = specialist_id
+        self.loop = loop
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+
+    def offer(self, event):
+        # Roda no loop do assinante (call_soon_threadsafe)
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Leitor lento: descarta o que tinha e encerra; ao reconectar ele recarrega a agenda
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class Broadcaster:
+    """Assinantes por especialista neste processo: entregar um evento custa
+    O(assinantes daquele especialista), não O(conexões abertas)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels = {}
+
+    def subscribe(self, specialist_id):
+        subscription = Subscription(specialist_id, asyncio.get_running_loop())
+        with self._lock:
+            self._channels.setdefault(specialist_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            channel = self._channels.get(subscription.specialist_id)
+            if channel is not None:
+                channel.discard(subscription)
+                if not channel:
+                    del self._channels[subscription.specialist_id]
+
+    def deliver(self, specialist_id, event):
+        with self._lock:
+            subscriptions = list(self._channels.get(specialist_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, event)
+            except RuntimeError:
+                # Loop já fechado (worker saindo): o finally do stream remove a assinatura
+                pass
+
+    def subscribers(self, specialist_id):
+        with self._lock:
+            return len(self._channels.get(specialist_id, ()))
+
+
+# --- BACKENDS (SLOT_EVENTS_BACKEND) ---
+class LocalBackend:
+    """Entrega direto no broadcaster deste processo (um worker ASGI só).
+    Com vários workers, um backend de pub/sub (Redis, LISTEN/NOTIFY) implementa
+    o mesmo publish() e chama broadcaster.deliver() em cada processo ao receber."""
+
+    def __init__(self, broadcaster):
+        self.broadcaster = broadcaster
+
+    def publish(self, specialist_id, event):
+        self.broadcaster.deliver(specialist_id, event)
+
+
+class PostgresBackend(LocalBackend):
+    """Vários workers ASGI com PostgreSQL: publish() faz pg_notify e cada processo
+    tem uma thread com LISTEN numa conexão própria (psycopg2) que repassa ao
+    broadcaster local, inclusive no processo que publicou."""
+
+    def __init__(self, broadcaster, using='default'):
+        super().__init__(broadcaster)
+        self.using = using
+        threading.Thread(target=self.listen_forever, name='slot-events-listen', daemon=True).start()
+
+    def publish(self, specialist_id, event):
+        # Roda no on_commit: o NOTIFY sai na hora (autocommit), só depois da mudança
+        with connections[self.using].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [PG_CHANNEL, self.encode(specialist_id, event)])
+
+    @staticmethod
+    def encode(specialist_id, event):
+        # Payload do NOTIFY: até 8000 bytes; os eventos são só ids, datas e horários
+        return json.dumps({'specialist_id': specialist_id, 'event': event})
+
+    def dispatch(self, payload):
+        message = json.loads(payload)
+        self.broadcaster.deliver(message['specialist_id'], message['event'])
+
+    def listen_forever(self):
+        while True:
+            try:
+                self.listen()
+            except Exception:
+                # Eventos enviados enquanto o LISTEN estava fora se perdem; o
+                # cliente recarrega a agenda quando o EventSource reconecta
+                logger.exception('LISTEN %s caiu; reconectando', PG_CHANNEL)
+            time.sleep(PG_RECONNECT_WAIT)
+
+    def listen(self):
+        wrapper = connections[self.using]
+        conn = wrapper.Database.connect(**wrapper.get_connection_params())
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f'LISTEN {PG_CHANNEL}')
+            while True:
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    self.dispatch(conn.notifies.pop(0).payload)
+        finally:
+            conn.close()
+
+
+broadcaster = Broadcaster()
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = import_string(settings.SLOT_EVENTS_BACKEND)(broadcaster)
+    return _backend
+
+
+def publish(specialist_id, kind, **data):
+    """Publica depois do commit: quem recebe o evento já enxerga a mudança no banco."""
+    event = dict(data, type=kind)
+    transaction.on_commit(lambda: get_backend().publish(specialist_id, event))
+
+
+def subscribe(specialist_id):
+    # Cria o backend já na assinatura: o PostgresBackend precisa do LISTEN
+    # mesmo num worker que nunca publicou nada
+    get_backend()
+    return broadcaster.subscribe(specialist_id)
+
+
+def unsubscribe(subscription):
+    broadcaster.unsubscribe(subscription)
+
+
+def encode(event):
+    data = {key: value for key, value in event.items() if key != 'type'}
+    return f'event: {event["type"]}\ndata: {json.dumps(data)}\n\n'
@@ -0,0 +1,112 @@
+import csv
+import json
+from datetime import date
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+# (cabeçalho, lookup) — os joins com Profile/User são resolvidos no próprio SELECT
+EXPORT_COLUMNS = (
+    ('id', 'id'),
+    ('data', 'date'),
+    ('hora', 'time'),
+    ('reservado', 'is_booked'),
+    ('especialista_id', 'specialist_id'),
+    ('especialista', 'specialist__user__first_name'),
+    ('profissao', 'specialist__profession'),
+    ('cliente', 'client__first_name'),
+    ('cliente_email', 'client__email'),
+)
+CHUNK_SIZE = 2000
+# Junta as linhas em blocos de ~64KB antes de mandar para o servidor WSGI
+BUFFER_SIZE = 64 * 1024
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def export_rows(queryset, chunk_size=CHUNK_SIZE):
+    """Tuplas na ordem de EXPORT_COLUMNS, lidas em lotes (cursor do lado do
+    servidor no PostgreSQL): a memória não cresce com o tamanho da agenda."""
+    return (
+        queryset.order_by('date', 'time', 'pk')
+        .values_list(*(lookup for _, lookup in EXPORT_COLUMNS))
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+class _Echo:
+    """Pseudo-arquivo para o csv.writer devolver a linha em vez de gravá-la."""
+
+    def write(self, value):
+        return value
+
+
+def _buffered(lines):
+    # A primeira linha sai sozinha: o download começa antes de o lote encher
+    lines = iter(lines)
+    first = next(lines, None)
+    if first is not None:
+        yield first
+    buffer, size = [], 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= BUFFER_SIZE:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+async def _aiterate(chunks):
+    # Sob ASGI o Django só consome iterador síncrono com sync_to_async(list), ou seja,
+    # o arquivo inteiro em memória. Aqui cada bloco sai da thread do ORM por vez.
+    chunks = iter(chunks)
+    next_chunk = sync_to_async(next)
+    while (chunk := await next_chunk(chunks, None)) is not None:
+        yield chunk
+
+
+# Planilhas tratam texto que começa com estes caracteres como fórmula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _cell(value):
+    # Nome e email vêm do cadastro: "=HYPERLINK(...)" vira texto com um apóstrofo na frente
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([header for header, _ in EXPORT_COLUMNS])
+    for row in rows:
+        yield writer.writerow([_cell(value) for value in row])
+
+
+def jsonl_lines(rows):
+    headers = [header for header, _ in EXPORT_COLUMNS]
+    for row in rows:
+        record = dict(zip(headers, row))
+        record['data'] = record['data'].isoformat()
+        record['hora'] = record['hora'].strftime('%H:%M')
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def streaming_export(queryset, fmt='csv', filename='agenda', request=None):
+    """StreamingHttpResponse com a agenda em CSV ou JSONL. Numa requisição ASGI
+    o corpo é um iterador async, lido em blocos pela thread do ORM."""
+    if fmt not in FORMATS:
+        raise ValueError(f'Formato de exportação inválido: {fmt}')
+    lines = csv_lines if fmt == 'csv' else jsonl_lines
+    content = _buffered(lines(export_rows(queryset)))
+    if isinstance(request, ASGIRequest):
+        content = _aiterate(content)
+    response = StreamingHttpResponse(content, content_type=FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{filename}-{date.today():%Y%m%d}.{fmt}"'
+    return response
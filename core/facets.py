@@ -0,0 +1,72 @@
+import threading
+from collections import OrderedDict
+from datetime import date
+
+from django.db.models import Count, Exists, OuterRef, Q
+
+from . import caching, search
+from .models import Appointment, Profile
+from .routers import primary_reads
+
+VERSION = 'facets'
+MAX_ENTRIES = 256
+
+# Memo em processo: (versão, dia, busca) -> facetas
+_lock = threading.Lock()
+_memo = OrderedDict()
+
+
+def compute_facets(query=None):
+    """Por profissão: especialistas ativos e quantos têm horário livre futuro,
+    num único SELECT agrupado (a busca, se houver, é um subselect no índice FTS)."""
+    specialists = Profile.objects.filter(is_specialist=True, price__isnull=False)
+    if query:
+        specialists = search.filter_matching(specialists, query)
+
+    free_slots = Appointment.objects.filter(
+        specialist=OuterRef('pk'), is_booked=False, date__gte=date.today(),
+    )
+    rows = (
+        specialists.annotate(has_free_slot=Exists(free_slots))
+        .values('profession')
+        .annotate(
+            specialists=Count('pk'),
+            with_free_slots=Count('pk', filter=Q(has_free_slot=True)),
+        )
+        .order_by()
+    )
+    counts = {row['profession']: row for row in rows}
+
+    facets = []
+    for value, label in Profile.PROFISSOES_CHOICES:
+        row = counts.get(value, {})
+        facets.append({
+            'value': value,
+            'label': label,
+            'specialists': row.get('specialists', 0),
+            'with_free_slots': row.get('with_free_slots', 0),
+        })
+    return facets
+
+
+def get_facets(query=None):
+    query = ' '.join(search.tokenize(query or ''))
+    key = (caching.get_version(VERSION), date.today(), query)
+    with _lock:
+        if key in _memo:
+            _memo.move_to_end(key)
+            return _memo[key]
+
+    # Memo com a versão atual: lê do primário, nunca da réplica atrasada
+    with primary_reads():
+        facets = compute_facets(query)
+    with _lock:
+        _memo[key] = facets
+        while len(_memo) > MAX_ENTRIES:
+            _memo.popitem(last=False)
+    return facets
+
+
+def invalidate():
+    # A versão fica no cache do Django: os outros processos também deixam de usar o memo
+    caching.bump_version(VERSION)
@@ -1,4 +1,9 @@
+from datetime import datetime, timedelta
+
 from django import forms
+from django.core.files.base import ContentFile
+
+from .images import sanitize_original
 from .models import Profile
 
 class ProfileForm(forms.ModelForm):
@@ -7,4 +12,81 @@ class ProfileForm(forms.ModelForm):
         fields = ['profession', 'description', 'price', 'phone', 'photo']
         widgets = {
             'description': forms.Textarea(attrs={'rows': 4}),
-        }
\ No newline at end of file
+        }
+
+    def clean_photo(self):
+        photo = self.cleaned_data.get('photo')
+        if not photo or 'photo' not in self.changed_data:
+            return photo
+        # A original também é pública: sai daqui sem EXIF/GPS e com tamanho limitado
+        photo.seek(0)
+        try:
+            data = sanitize_original(photo.read())
+        except OSError:
+            raise forms.ValidationError('Não foi possível ler a imagem enviada.')
+        stem = photo.name.rsplit('.', 1)[0]
+        return ContentFile(data, name=f'{stem}.jpg')
+
+
+class SlotForm(forms.Form):
+    # Horário avulso do painel: sem data ou hora o INSERT falharia no NOT NULL
+    date = forms.DateField(error_messages={'required': 'Informe a data do horário.', 'invalid': 'Data inválida.'})
+    time = forms.TimeField(error_messages={'required': 'Informe a hora do horário.', 'invalid': 'Hora inválida.'})
+
+
+class RecurringScheduleForm(forms.Form):
+    # Limites para que uma única requisição não gere uma agenda gigante
+    MAX_DAYS = 186
+    MAX_SLOTS = 3000
+
+    WEEKDAY_CHOICES = [
+        ('0', 'Seg'), ('1', 'Ter'), ('2', 'Qua'), ('3', 'Qui'),
+        ('4', 'Sex'), ('5', 'Sáb'), ('6', 'Dom'),
+    ]
+    SLOT_CHOICES = [('15', '15 min'), ('30', '30 min'), ('45', '45 min'), ('60', '1 hora'), ('90', '1h30'), ('120', '2 horas')]
+
+    start_date = forms.DateField(label="De")
+    end_date = forms.DateField(label="Até")
+    weekdays = forms.MultipleChoiceField(choices=WEEKDAY_CHOICES, widget=forms.CheckboxSelectMultiple, label="Dias da semana")
+    start_time = forms.TimeField(label="Início")
+    end_time = forms.TimeField(label="Fim")
+    slot_minutes = forms.TypedChoiceField(choices=SLOT_CHOICES, coerce=int, initial='60', label="Duração")
+    exceptions = forms.CharField(required=False, label="Exceto (dd/mm/aaaa, separadas por vírgula)")
+
+    def clean_exceptions(self):
+        dates = []
+        for item in self.cleaned_data['exceptions'].split(','):
+            item = item.strip()
+            if not item:
+                continue
+            for fmt in ('%d/%m/%Y', '%Y-%m-%d'):
+                try:
+                    dates.append(datetime.strptime(item, fmt).date())
+                    break
+                except ValueError:
+                    continue
+            else:
+                raise forms.ValidationError(f'Data inválida: {item}')
+        return dates
+
+    def clean(self):
+        cleaned = super().clean()
+        start_date, end_date = cleaned.get('start_date'), cleaned.get('end_date')
+        start_time, end_time = cleaned.get('start_time'), cleaned.get('end_time')
+        slot_minutes, weekdays = cleaned.get('slot_minutes'), cleaned.get('weekdays')
+
+        if start_date and end_date:
+            if end_date < start_date:
+                raise forms.ValidationError('A data final deve ser depois da inicial.')
+            if (end_date - start_date).days > self.MAX_DAYS:
+                raise forms.ValidationError('O período máximo é de 6 meses.')
+        if start_time and end_time and end_time <= start_time:
+            raise forms.ValidationError('O horário final deve ser depois do inicial.')
+
+        if start_date and end_date and start_time and end_time and slot_minutes and weekdays:
+            window = datetime.combine(start_date, end_time) - datetime.combine(start_date, start_time)
+            per_day = window // timedelta(minutes=slot_minutes)
+            weeks = (end_date - start_date).days // 7 + 1
+            if per_day * len(weekdays) * weeks > self.MAX_SLOTS:
+                raise forms.ValidationError('Muitos horários de uma vez. Diminua o período ou aumente a duração.')
+        return cleaned
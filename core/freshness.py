@@ -0,0 +1,138 @@
+import hashlib
+from datetime import date, datetime, time
+from functools import lru_cache, wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from . import caching, listing
+from .models import Appointment
+
+
+# --- VERSÃO DOS TEMPLATES (deploy novo invalida os ETags) ---
+@lru_cache(maxsize=None)
+def templates_version():
+    if settings.APP_VERSION:
+        return settings.APP_VERSION
+    templates = settings.BASE_DIR / 'core' / 'templates'
+    return str(int(max((p.stat().st_mtime for p in templates.rglob('*.html')), default=0)))
+
+
+def start_of_today():
+    # A agenda e as facetas só mostram horários a partir de hoje: o dia também muda a página
+    return timezone.make_aware(datetime.combine(date.today(), time.min))
+
+
+def _validator(request, name, timestamps, extra=()):
+    """(ETag, Last-Modified) a partir dos updated_at, dos parâmetros da URL,
+    do dia e de quem está vendo (o cabeçalho muda para usuário logado)."""
+    known = [t for t in timestamps if t is not None]
+    last_modified = max(known + [start_of_today()])
+    viewer = ''
+    if request.user.is_authenticated:
+        profile = request.profile
+        viewer = f'{request.user.pk}:{request.user.first_name}'
+        if profile is not None:
+            viewer += f':{profile.updated_at.isoformat()}'
+            last_modified = max(last_modified, profile.updated_at)
+
+    raw = '|'.join([
+        name, templates_version(), request.GET.urlencode(), date.today().isoformat(), viewer,
+        *(t.isoformat() if t else '-' for t in timestamps), *(str(e) for e in extra),
+    ])
+    return hashlib.md5(raw.encode()).hexdigest(), last_modified
+
+
+# --- VALIDADORES (consultas de agregado, sem renderizar nada) ---
+def home_validator(request):
+    specialists = listing.specialist_cards()
+    category = request.GET.get('category')
+    if category and category != 'all':
+        specialists = specialists.filter(profession=category)
+    profiles = specialists.aggregate(latest=Max('updated_at'), total=Count('pk'))
+    # Facetas contam horários livres de todos: qualquer horário alterado muda a Home
+    appointments = Appointment.objects.aggregate(latest=Max('updated_at'))
+    return _validator(request, 'home', [profiles['latest'], appointments['latest']], [profiles['total']])
+
+
+async def ahome_validator(request):
+    """home_validator para a Home async (mesmos agregados, ORM async)."""
+    specialists = listing.specialist_cards()
+    category = request.GET.get('category')
+    if category and category != 'all':
+        specialists = specialists.filter(profession=category)
+    profiles = await specialists.aaggregate(latest=Max('updated_at'), total=Count('pk'))
+    appointments = await Appointment.objects.aaggregate(latest=Max('updated_at'))
+    return _validator(request, 'home', [profiles['latest'], appointments['latest']], [profiles['total']])
+
+
+def specialist_validator(request, id):
+    # O updated_at (perfil + agenda futura) vem com a página do cache versionado
+    page = caching.request_specialist_page(request, id)
+    if not page or not page['is_specialist']:
+        return None  # a view responde 404 ou redireciona
+    return _validator(request, f'specialist:{id}', [page['updated_at']])
+
+
+async def aspecialist_validator(request, id):
+    page = await caching.arequest_specialist_page(request, id)
+    if not page or not page['is_specialist']:
+        return None
+    return _validator(request, f'specialist:{id}', [page['updated_at']])
+
+
+# --- DECORATOR ---
+def catalogue_cache_headers(request, response):
+    if request.user.is_authenticated:
+        # Tem o nome do usuário: só o navegador guarda, sempre revalidando
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(response, public=True, max_age=0, s_maxage=settings.CATALOGUE_SHARED_MAX_AGE)
+    patch_vary_headers(response, ['Cookie'])
+    return response
+
+
+def conditional_catalogue(validator):
+    """GET condicional para páginas públicas: responde 304 sem rodar a view
+    (nem o template) quando o ETag/Last-Modified do cliente ainda vale."""
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            # View async: o validador também é async e roda antes (o condition() só
+            # chama funções síncronas, então recebe os valores já calculados)
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                etag, last_modified = await validator(request, *args, **kwargs) or (None, None)
+                conditioned = condition(
+                    etag_func=lambda *a, **k: etag,
+                    last_modified_func=lambda *a, **k: last_modified,
+                )(view)
+                response = await conditioned(request, *args, **kwargs)
+                if response.status_code in (200, 304):
+                    catalogue_cache_headers(request, response)
+                return response
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            memo = {}
+
+            def compute(request, *args, **kwargs):
+                if 'value' not in memo:
+                    memo['value'] = validator(request, *args, **kwargs)
+                return memo['value']
+
+            conditioned = condition(
+                etag_func=lambda *a, **k: (compute(*a, **k) or (None, None))[0],
+                last_modified_func=lambda *a, **k: (compute(*a, **k) or (None, None))[1],
+            )(view)
+            response = conditioned(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                catalogue_cache_headers(request, response)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,81 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.contrib.auth.models import User
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+# --- HASHERS COM CUSTO VINDO DO SETTINGS (calibrado por calibrate_hashers) ---
+# Mesmo nome de algoritmo dos hashers do Django: os hashes já gravados continuam
+# válidos, e um custo diferente do configurado faz o login regravar a senha.
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_PBKDF2_ITERATIONS', None) or hashers.PBKDF2PasswordHasher.iterations
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    @property
+    def work_factor(self):
+        return getattr(settings, 'PASSWORD_SCRYPT_WORK_FACTOR', None) or hashers.ScryptPasswordHasher.work_factor
+
+    @property
+    def maxmem(self):
+        # O limite padrão do OpenSSL (32MB) não comporta work_factor >= 2**15
+        return 256 * self.work_factor * self.block_size
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """Precisa do pacote argon2-cffi (opcional)."""
+
+    @property
+    def time_cost(self):
+        return getattr(settings, 'PASSWORD_ARGON2_TIME_COST', None) or hashers.Argon2PasswordHasher.time_cost
+
+    @property
+    def memory_cost(self):
+        return getattr(settings, 'PASSWORD_ARGON2_MEMORY_COST', None) or hashers.Argon2PasswordHasher.memory_cost
+
+
+# --- REHASH EM SEGUNDO PLANO (o login não paga dois hashes) ---
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='password-rehash')
+    return _executor
+
+
+def rehash_password(user_id, old_encoded, raw_password):
+    """Regrava a senha com o hasher/custo atual, desde que não tenha sido
+    trocada nesse meio tempo. Retorna True se atualizou."""
+    try:
+        encoded = hashers.make_password(raw_password)
+        return bool(User.objects.filter(pk=user_id, password=old_encoded).update(password=encoded))
+    except Exception:
+        logger.exception('Falha ao atualizar o hash da senha do usuário %s', user_id)
+        return False
+
+
+def rehash_in_worker(user_id, old_encoded, raw_password):
+    close_old_connections()
+    try:
+        return rehash_password(user_id, old_encoded, raw_password)
+    finally:
+        close_old_connections()
+
+
+def check_password(user, raw_password):
+    """Como user.check_password, mas o hash legado é atualizado depois do
+    commit, numa thread separada, em vez de na requisição do login."""
+    user_id, old_encoded = user.pk, user.password
+
+    def schedule_rehash(raw):
+        transaction.on_commit(lambda: get_executor().submit(rehash_in_worker, user_id, old_encoded, raw))
+
+    return hashers.check_password(raw_password, old_encoded, schedule_rehash)
@@ -0,0 +1,132 @@
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from . import caching
+from .models import Profile
+
+logger = logging.getLogger(__name__)
+
+# Larguras usadas pelos templates: avatar (35px), carrossel (60px),
+# perfil (140px) e card da Home (350px), em 1x e 2x
+RENDITION_WIDTHS = (64, 160, 400, 800)
+FORMATS = (('webp', 'WEBP'), ('jpg', 'JPEG'))
+QUALITY = 82
+RENDITION_DIR = 'profiles/renditions'
+# Foto original guardada no upload: 2x o maior card, sem EXIF (GPS, câmera...)
+ORIGINAL_MAX_WIDTH = 1600
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'IMAGE_WORKERS', 2),
+            thread_name_prefix='photo-renditions',
+        )
+    return _executor
+
+
+# --- NOMES (hash do conteúdo -> cache imutável) ---
+def rendition_name(digest, width, ext):
+    return f'{RENDITION_DIR}/{digest}-{width}.{ext}'
+
+
+def rendition_urls(renditions, ext):
+    return [
+        (default_storage.url(rendition_name(renditions['hash'], width, ext)), width)
+        for width in renditions.get('widths', [])
+    ]
+
+
+# --- PROCESSAMENTO ---
+def _resize_to_width(image, width):
+    # Limita só a largura: o '{w}w' do srcset é a largura real do arquivo
+    if image.width <= width:
+        return image.copy()
+    return image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+
+
+def _open_upright(data):
+    with Image.open(BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original)
+        return image.convert('RGB')
+
+
+def sanitize_original(data):
+    """Reencoda a foto enviada (orientação aplicada, sem EXIF, no máximo
+    ORIGINAL_MAX_WIDTH de largura) antes de ela ir para o storage público."""
+    image = _resize_to_width(_open_upright(data), ORIGINAL_MAX_WIDTH)
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def generate_renditions(data):
+    """Gera as miniaturas a partir dos bytes da foto original. As cópias são
+    reencodadas sem EXIF (a orientação é aplicada antes). Retorna os metadados;
+    widths são as larguras reais (uma foto estreita para na própria largura)."""
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    image = _open_upright(data)
+
+    widths = []
+    for target in RENDITION_WIDTHS:
+        # Não aumenta fotos pequenas: a própria largura fecha a lista
+        width = min(target, image.width)
+        if widths and width <= widths[-1]:
+            break
+        copy = _resize_to_width(image, width)
+        for ext, fmt in FORMATS:
+            name = rendition_name(digest, width, ext)
+            if default_storage.exists(name):
+                continue
+            buffer = BytesIO()
+            copy.save(buffer, fmt, quality=QUALITY, optimize=True)
+            default_storage.save(name, ContentFile(buffer.getvalue()))
+        widths.append(width)
+
+    return {'hash': digest, 'widths': widths, 'formats': [ext for ext, _ in FORMATS]}
+
+
+def process_profile_photo(profile_id, photo_name):
+    """Gera as miniaturas e grava no perfil, desde que a foto não tenha sido
+    trocada nesse meio tempo. Retorna os metadados ou None em caso de erro."""
+    try:
+        with default_storage.open(photo_name, 'rb') as fh:
+            renditions = generate_renditions(fh.read())
+        updated = Profile.objects.filter(pk=profile_id, photo=photo_name).update(
+            photo_renditions=renditions, updated_at=timezone.now(),
+        )
+        if updated:
+            caching.bump_generation(profile_id)
+        return renditions
+    except Exception:
+        logger.exception('Falha ao gerar miniaturas do perfil %s', profile_id)
+        return None
+
+
+def process_in_worker(profile_id, photo_name):
+    # Threads do pool têm conexão própria com o banco: abre e fecha a cada tarefa
+    close_old_connections()
+    try:
+        return process_profile_photo(profile_id, photo_name)
+    finally:
+        close_old_connections()
+
+
+def schedule_profile_photo(profile):
+    """Agenda o processamento para depois do commit, fora da thread da requisição."""
+    if not profile.photo:
+        return
+    profile_id, photo_name = profile.pk, profile.photo.name
+    transaction.on_commit(lambda: get_executor().submit(process_in_worker, profile_id, photo_name))
@@ -0,0 +1,198 @@
+import csv
+import json
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+import django
+from django.apps import apps
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from . import search
+from .models import Profile, SearchDocument
+
+PROFESSIONS = {value for value, _ in Profile.PROFISSOES_CHOICES}
+# Senhas por tarefa do pool (poucas: cada hash custa centenas de ms)
+HASH_CHUNK = 16
+
+BatchResult = namedtuple('BatchResult', ['created', 'errors'])
+
+
+# --- LEITURA (CSV ou JSONL, linha a linha) ---
+def read_records(fh, fmt):
+    """Gera (número da linha, dict) sem carregar o arquivo inteiro."""
+    if fmt == 'csv':
+        reader = csv.DictReader(fh)
+        for record in reader:
+            yield reader.line_num, record
+    else:
+        for line_num, line in enumerate(fh, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield line_num, record if isinstance(record, dict) else {'__invalid__': line}
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _text(record, field):
+    # No JSONL o valor pode vir com qualquer tipo ("name": 123): a linha é rejeitada, não o arquivo
+    value = record.get(field)
+    if value is None:
+        return ''
+    if not isinstance(value, str):
+        raise ValueError(f'{field} deve ser texto')
+    return value.strip()
+
+
+def clean_record(record):
+    """Normaliza uma linha do arquivo; ValueError com o motivo se for inválida."""
+    if '__invalid__' in record:
+        raise ValueError('linha não é um objeto JSON')
+
+    email = _text(record, 'email').lower()
+    if '@' not in email or len(email) > 150:
+        raise ValueError('email inválido')
+
+    user_type = _text(record, 'user_type') or 'client'
+    if user_type not in ('specialist', 'client'):
+        raise ValueError(f'user_type desconhecido: {user_type}')
+    is_specialist = user_type == 'specialist'
+
+    profession = _text(record, 'profession') or None
+    if profession and profession not in PROFESSIONS:
+        raise ValueError(f'profissão fora da lista: {profession}')
+
+    price = record.get('price')
+    if price in (None, ''):
+        price = None
+    else:
+        try:
+            price = Decimal(str(price)).quantize(Decimal('0.01'))
+        except InvalidOperation:
+            raise ValueError(f'preço inválido: {price}')
+        if not price.is_finite() or price < 0 or price >= 10 ** 8:
+            raise ValueError(f'preço inválido: {price}')
+
+    password = record.get('password')
+    if password is not None and not isinstance(password, str):
+        raise ValueError('password deve ser texto')
+
+    return {
+        'email': email,
+        'name': _text(record, 'name')[:150],
+        'password': password or None,
+        'is_specialist': is_specialist,
+        'profession': profession if is_specialist else None,
+        'description': _text(record, 'description') if is_specialist else '',
+        'price': price if is_specialist else None,
+    }
+
+
+# --- HASH DAS SENHAS (pool de processos: o PBKDF2 é CPU puro) ---
+def init_worker():
+    # Com "spawn" (macOS/Windows) o processo filho começa sem o Django configurado
+    if not apps.ready:
+        django.setup()
+
+
+def hash_password(raw):
+    # Sem senha no arquivo (raw=None): senha inutilizável, o usuário define depois
+    return make_password(raw)
+
+
+def hash_passwords(passwords, pool=None):
+    if pool is None:
+        return [hash_password(raw) for raw in passwords]
+    return list(pool.map(hash_password, passwords, chunksize=HASH_CHUNK))
+
+
+# --- GRAVAÇÃO EM LOTE ---
+def import_batch(rows, groups, pool=None):
+    """Cria usuários, perfis, grupos e documentos de busca de um lote em
+    poucos INSERTs. rows: [(linha, dict do arquivo)]. Retorna BatchResult."""
+    errors = []
+    cleaned = []
+    seen = set()
+    for line_num, record in rows:
+        try:
+            data = clean_record(record)
+        except ValueError as exc:
+            errors.append((line_num, record.get('email', ''), str(exc)))
+            continue
+        if data['email'] in seen:
+            errors.append((line_num, data['email'], 'email repetido no arquivo'))
+            continue
+        seen.add(data['email'])
+        cleaned.append((line_num, data))
+
+    # Antes do hash: linha que vai ser recusada não gasta CPU com a senha
+    existing = existing_emails([data['email'] for _, data in cleaned])
+    accepted = [(line_num, data) for line_num, data in cleaned if data['email'] not in existing]
+    passwords = hash_passwords([data['password'] for _, data in accepted], pool)
+    pending = [(line_num, data, password) for (line_num, data), password in zip(accepted, passwords)]
+    try:
+        created = _insert(pending, groups)
+    except IntegrityError:
+        # Alguém se cadastrou com um desses emails entre a checagem e o INSERT:
+        # refaz linha a linha e só a linha repetida vira erro
+        created = 0
+        for row in pending:
+            try:
+                created += _insert([row], groups)
+            except IntegrityError:
+                existing.add(row[1]['email'])
+
+    errors += [
+        (line_num, data['email'], 'email já cadastrado')
+        for line_num, data in cleaned if data['email'] in existing
+    ]
+    errors.sort()
+    return BatchResult(created, errors)
+
+
+def existing_emails(emails):
+    """Quais emails (minúsculos) já têm conta. O índice único da migration 0012
+    compara LOWER(email): Foo@X.com já ocupa foo@x.com."""
+    users = User.objects.annotate(lower_email=Lower('email')).filter(
+        Q(lower_email__in=emails) | Q(username__in=emails)
+    )
+    return {value.lower() for row in users.values_list('username', 'email') for value in row} & set(emails)
+
+
+def _insert(pending, groups):
+    if not pending:
+        return 0
+    with transaction.atomic():
+        # bulk_create não dispara post_save: o Profile é criado aqui, junto
+        users = User.objects.bulk_create([
+            User(username=data['email'], email=data['email'], first_name=data['name'], password=password)
+            for _, data, password in pending
+        ])
+        profiles = Profile.objects.bulk_create([
+            Profile(
+                user=user, is_specialist=data['is_specialist'], profession=data['profession'],
+                description=data['description'], price=data['price'],
+            )
+            for user, (_, data, _) in zip(users, pending)
+        ])
+        User.groups.through.objects.bulk_create([
+            User.groups.through(user_id=user.pk, group_id=groups[data['is_specialist']])
+            for user, (_, data, _) in zip(users, pending)
+        ])
+        SearchDocument.objects.bulk_create([
+            SearchDocument(profile=profile, document=search.build_document(profile))
+            for profile in profiles if profile.is_specialist
+        ])
+    return len(users)
@@ -0,0 +1,77 @@
+from collections import namedtuple
+
+from asgiref.sync import sync_to_async
+
+from .models import Profile
+from . import search
+
+# Quantidade de cards por página na Home
+PAGE_SIZE = 12
+
+# Apenas as colunas que os cards (home.html / dashboard.html) exibem; updated_at versiona o card em cache
+CARD_FIELDS = (
+    'id', 'photo', 'photo_renditions', 'profession', 'description', 'price', 'updated_at', 'user__first_name',
+)
+
+SpecialistPage = namedtuple('SpecialistPage', ['items', 'next_cursor'])
+
+
+def specialist_cards():
+    """Especialistas com perfil completo, já com o User no mesmo SELECT."""
+    return (
+        Profile.objects.filter(is_specialist=True)
+        .exclude(price__isnull=True)
+        .select_related('user')
+        .only(*CARD_FIELDS)
+    )
+
+
+def parse_cursor(value):
+    try:
+        return int(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+def keyset_page(queryset, after=None, size=PAGE_SIZE):
+    """Paginação por cursor (id > after): a página N custa o mesmo que a página 1."""
+    if after is not None:
+        queryset = queryset.filter(id__gt=after)
+    rows = list(queryset.order_by('id')[:size + 1])
+    return _cut(rows, size)
+
+
+async def akeyset_page(queryset, after=None, size=PAGE_SIZE):
+    if after is not None:
+        queryset = queryset.filter(id__gt=after)
+    rows = [row async for row in queryset.order_by('id')[:size + 1].aiterator()]
+    return _cut(rows, size)
+
+
+def _cut(rows, size):
+    next_cursor = rows[size - 1].id if len(rows) > size else None
+    return SpecialistPage(rows[:size], next_cursor)
+
+
+def search_page(queryset, query, after=None, size=PAGE_SIZE):
+    """Paginação da busca na ordem de relevância, sem teto de resultados: o FTS
+    já filtra pelo queryset e corta a página no SQL. O cursor é quantos cards
+    já foram mostrados."""
+    offset = after or 0
+    ranked = search.search_ids(query, limit=size + 1, offset=offset, within=queryset)
+    cards = queryset.in_bulk(ranked[:size]) if ranked else {}
+    return _search_cut(ranked, cards, offset, size)
+
+
+async def asearch_page(queryset, query, after=None, size=PAGE_SIZE):
+    # O FTS5 é SQL cru no cursor: vai para a thread do ORM
+    offset = after or 0
+    ranked = await sync_to_async(search.search_ids)(query, limit=size + 1, offset=offset, within=queryset)
+    cards = await queryset.ain_bulk(ranked[:size]) if ranked else {}
+    return _search_cut(ranked, cards, offset, size)
+
+
+def _search_cut(ranked, cards, offset, size):
+    # Perfil removido entre o FTS e o in_bulk some da página
+    items = [cards[pk] for pk in ranked[:size] if pk in cards]
+    return SpecialistPage(items, offset + size if len(ranked) > size else None)
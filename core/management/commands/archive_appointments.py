@@ -0,0 +1,38 @@
+import os
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.archive import archive_appointments
+
+
+class Command(BaseCommand):
+    help = 'Move horários passados da agenda para o histórico, em lotes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', help='Arquiva horários anteriores a esta data (AAAA-MM-DD). Padrão: hoje.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--output-dir', help='Grava lotes .jsonl.gz nesta pasta em vez da tabela de histórico.')
+        parser.add_argument('--checkpoint', help='Arquivo JSON com o último id arquivado, para retomar execuções.')
+
+    def handle(self, *args, **options):
+        try:
+            before = date.fromisoformat(options['before']) if options['before'] else date.today()
+        except ValueError:
+            raise CommandError('Use o formato AAAA-MM-DD em --before.')
+
+        output_dir = options['output_dir']
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+        total = 0
+        for count, last_id in archive_appointments(
+            before=before,
+            batch_size=options['batch_size'],
+            output_dir=output_dir,
+            checkpoint=options['checkpoint'],
+        ):
+            total += count
+            self.stdout.write(f'{total} horários arquivados (último id {last_id})')
+
+        self.stdout.write(self.style.SUCCESS(f'Concluído: {total} horários anteriores a {before} arquivados.'))
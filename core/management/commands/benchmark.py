@@ -0,0 +1,132 @@
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+from datetime import datetime, timezone
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from core.bench import SCENARIOS, generate_dataset, run_scenario
+from core.testing import isolated_caches
+
+# O manifest do WhiteNoise só existe depois do collectstatic; aqui mede-se a aplicação
+BENCH_STORAGES = dict(
+    settings.STORAGES,
+    staticfiles={'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, stderr=subprocess.DEVNULL, text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def database_mode():
+    mode = {
+        'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+        'server_side_cursors': not connection.settings_dict.get('DISABLE_SERVER_SIDE_CURSORS', False),
+        'replica': 'replica' in settings.DATABASES,
+    }
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            mode['journal_mode'] = cursor.fetchone()[0]
+        mode['busy_timeout'] = connection.settings_dict['OPTIONS'].get('timeout')
+    return mode
+
+
+class Command(BaseCommand):
+    help = (
+        'Roda os cenários de carga (home, busca, perfil, painel, reserva) com várias threads '
+        'num banco descartável e grava p50/p95/p99, queries por requisição e vazão em JSON. '
+        'Para comparar bancos, rode com DATABASE_URL diferentes (ou --sqlite-journal) e --scenarios book.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=200)
+        parser.add_argument('--specialists', type=int, default=1000)
+        parser.add_argument('--slots', type=int, default=20, help='Horários por especialista.')
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--requests', type=int, default=400, help='Requisições por cenário.')
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Lista separada por vírgula.')
+        parser.add_argument('--output', help='Arquivo JSON de saída (padrão: só imprime).')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--sqlite-journal', choices=('wal', 'delete'),
+                            help='Modo de journal do SQLite (padrão: SQLITE_WAL do settings).')
+
+    def handle(self, *args, **options):
+        names = [n.strip() for n in options['scenarios'].split(',') if n.strip()]
+        unknown = set(names) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f'Cenários desconhecidos: {", ".join(sorted(unknown))}')
+
+        wal = settings.SQLITE_WAL if options['sqlite_journal'] is None else options['sqlite_journal'] == 'wal'
+
+        # Banco descartável criado como o dos testes (arquivo temporário no SQLite,
+        # para as threads compartilharem o banco; test_<nome> no PostgreSQL)
+        tmpdir = tempfile.mkdtemp(prefix='conektei-bench-')
+        if connection.vendor == 'sqlite':
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(tmpdir, 'bench.sqlite3')
+        # Cache próprio no mesmo diretório: páginas, memos e versões do banco
+        # descartável não vazam para o site (nem as do site distorcem a medição)
+        caches = isolated_caches(os.path.join(tmpdir, 'cache'))
+        try:
+            with override_settings(SQLITE_WAL=wal, CACHES=caches):
+                old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+                setup_test_environment(debug=False)
+                try:
+                    with override_settings(STORAGES=BENCH_STORAGES):
+                        result = self.run(names, options)
+                finally:
+                    teardown_test_environment()
+                    connection.creation.destroy_test_db(old_name, verbosity=0)
+        finally:
+            shutil.rmtree(tmpdir)
+
+        report = json.dumps(result, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(report)
+            self.stdout.write(self.style.SUCCESS(f'Resultado gravado em {options["output"]}'))
+        else:
+            self.stdout.write(report)
+
+    def run(self, names, options):
+        self.stdout.write('Gerando dados sintéticos...')
+        dataset = generate_dataset(
+            clients=options['clients'],
+            specialists=options['specialists'],
+            slots_per_specialist=options['slots'],
+            seed=options['seed'],
+        )
+
+        scenarios = {}
+        for name in names:
+            self.stdout.write(f'Cenário {name}...')
+            scenarios[name] = run_scenario(
+                SCENARIOS[name], dataset,
+                threads=options['threads'], requests=options['requests'], seed=options['seed'],
+            )
+
+        return {
+            'meta': {
+                'commit': git_commit(),
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'database': connection.vendor,
+                'database_mode': database_mode(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'dataset': dataset['sizes'],
+            },
+            'scenarios': scenarios,
+        }
@@ -0,0 +1,113 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from importlib.util import find_spec
+from time import perf_counter
+
+from django.contrib.auth import hashers
+from django.core.management.base import BaseCommand, CommandError
+
+PASSWORD = 'calibracao-Conektei-2026'
+SALT = 'calibracaosalt1234567890'
+
+
+def hash_once(algorithm, cost):
+    """Um hash com custo explícito (sem depender do settings: roda nos processos do pool)."""
+    if algorithm == 'pbkdf2':
+        hashers.PBKDF2PasswordHasher().encode(PASSWORD, SALT, iterations=cost)
+    elif algorithm == 'scrypt':
+        hasher = hashers.ScryptPasswordHasher()
+        hasher.maxmem = 256 * cost * hasher.block_size
+        hasher.encode(PASSWORD, SALT, n=cost)
+    else:
+        hasher = hashers.Argon2PasswordHasher()
+        hasher.time_cost = cost
+        hasher.encode(PASSWORD, SALT)
+
+
+def hash_many(algorithm, cost, count):
+    for _ in range(count):
+        hash_once(algorithm, cost)
+    return count
+
+
+def ms_per_hash(algorithm, cost, samples):
+    hash_once(algorithm, cost)  # aquece (alocação de memória do scrypt/argon2)
+    start = perf_counter()
+    hash_many(algorithm, cost, samples)
+    return (perf_counter() - start) / samples * 1000
+
+
+# --- CALIBRAÇÃO (maior custo que cabe no alvo de ms por hash) ---
+def calibrate_pbkdf2(target_ms, samples):
+    # Custo linear nas iterações: mede uma base e faz regra de três
+    base = 100_000
+    per_iteration = ms_per_hash('pbkdf2', base, samples) / base
+    return max(10_000, int(target_ms / per_iteration) // 1000 * 1000)
+
+
+def calibrate_by_steps(algorithm, steps, target_ms, samples):
+    chosen = steps[0]
+    for cost in steps:
+        if ms_per_hash(algorithm, cost, samples) > target_ms:
+            break
+        chosen = cost
+    return chosen
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede o custo de hash de senha neste servidor: sugere iterações/work factor para um alvo '
+        'de ms por hash e mostra hashes por segundo por núcleo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target-ms', type=float, default=250, help='Tempo alvo de um hash no login.')
+        parser.add_argument('--samples', type=int, default=5, help='Hashes por medição.')
+        parser.add_argument('--algorithms', default='pbkdf2,scrypt,argon2')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processos no teste de vazão (1 = só um núcleo).')
+
+    def handle(self, *args, **options):
+        algorithms = [a.strip() for a in options['algorithms'].split(',') if a.strip()]
+        unknown = set(algorithms) - {'pbkdf2', 'scrypt', 'argon2'}
+        if unknown:
+            raise CommandError(f'Algoritmos desconhecidos: {", ".join(sorted(unknown))}')
+        if 'argon2' in algorithms and not find_spec('argon2'):
+            self.stdout.write('argon2: pacote argon2-cffi não instalado, ignorado.')
+            algorithms.remove('argon2')
+
+        target, samples, workers = options['target_ms'], options['samples'], options['workers']
+        self.stdout.write(f'Alvo: {target:.0f} ms por hash; {workers} núcleo(s) no teste de vazão.')
+
+        settings_lines = []
+        for algorithm in algorithms:
+            if algorithm == 'pbkdf2':
+                cost = calibrate_pbkdf2(target, samples)
+                settings_lines.append(f'PASSWORD_PBKDF2_ITERATIONS={cost}')
+            elif algorithm == 'scrypt':
+                cost = calibrate_by_steps('scrypt', [2 ** n for n in range(12, 21)], target, samples)
+                settings_lines.append(f'PASSWORD_SCRYPT_WORK_FACTOR={cost}')
+            else:
+                cost = calibrate_by_steps('argon2', list(range(1, 11)), target, samples)
+                settings_lines.append(f'PASSWORD_ARGON2_TIME_COST={cost}')
+
+            single_ms = ms_per_hash(algorithm, cost, samples)
+            per_core = self.throughput(algorithm, cost, samples, workers) / workers
+            self.stdout.write(
+                f'{algorithm}: custo {cost} -> {single_ms:.0f} ms/hash, '
+                f'{1000 / single_ms:.1f} hashes/s em 1 núcleo, {per_core:.1f} hashes/s por núcleo com {workers}'
+            )
+
+        self.stdout.write('\nVariáveis de ambiente sugeridas:')
+        for line in settings_lines:
+            self.stdout.write(f'  {line}')
+
+    def throughput(self, algorithm, cost, samples, workers):
+        """Hashes por segundo com todos os processos ocupados ao mesmo tempo."""
+        if workers == 1:
+            return 1000 / ms_per_hash(algorithm, cost, samples)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(hash_once, [algorithm] * workers, [cost] * workers))  # sobe os processos
+            start = perf_counter()
+            total = sum(pool.map(hash_many, [algorithm] * workers, [cost] * workers, [samples] * workers))
+            return total / (perf_counter() - start)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core.billing import EXPIRY_BATCH, expire_subscriptions
+
+
+class Command(BaseCommand):
+    help = 'Desativa as assinaturas vencidas e tira o plano dos perfis, em lotes de UPDATE.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=EXPIRY_BATCH)
+
+    def handle(self, *args, **options):
+        total = 0
+        for count in expire_subscriptions(batch_size=options['batch_size']):
+            total += count
+            self.stdout.write(f'{total} assinaturas desativadas')
+
+        self.stdout.write(self.style.SUCCESS(f'Concluído: {total} assinaturas vencidas desativadas.'))
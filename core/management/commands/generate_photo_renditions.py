@@ -0,0 +1,48 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from core.images import process_in_worker, process_profile_photo
+from core.models import Profile
+
+
+class Command(BaseCommand):
+    help = 'Gera as miniaturas WebP/JPEG das fotos de perfil já existentes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Threads em paralelo (1 = sem pool).')
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--force', action='store_true', help='Refaz também os perfis que já têm miniaturas.')
+
+    def handle(self, *args, **options):
+        profiles = Profile.objects.exclude(photo='').exclude(photo__isnull=True)
+        if not options['force']:
+            profiles = profiles.filter(photo_renditions={})
+        pending = profiles.order_by('pk').values_list('pk', 'photo')
+
+        workers = options['workers']
+        pool = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+        done = failed = 0
+        last_pk = 0
+        try:
+            while True:
+                # Lotes por pk: a memória não cresce com o número de perfis
+                batch = list(pending.filter(pk__gt=last_pk)[:options['batch_size']])
+                if not batch:
+                    break
+                last_pk = batch[-1][0]
+                if pool:
+                    results = pool.map(lambda row: process_in_worker(*row), batch)
+                else:
+                    results = (process_profile_photo(*row) for row in batch)
+                for result in results:
+                    if result is None:
+                        failed += 1
+                    else:
+                        done += 1
+                self.stdout.write(f'{done} fotos processadas, {failed} com erro')
+        finally:
+            if pool:
+                pool.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(f'Concluído: {done} fotos processadas, {failed} com erro.'))
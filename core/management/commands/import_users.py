@@ -0,0 +1,64 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import facets
+from core.accounts import get_group_ids
+from core.importer import batched, import_batch, init_worker, read_records
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa clientes e especialistas de um arquivo CSV ou JSONL (colunas: email, name, '
+        'password, user_type, profession, description, price), em lotes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Arquivo .csv ou .jsonl ("-" lê da entrada padrão).')
+        parser.add_argument('--format', choices=('csv', 'jsonl'), help='Padrão: pela extensão do arquivo.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processos para o hash das senhas (1 = sem pool).')
+        parser.add_argument('--errors', help='Grava as linhas rejeitadas neste arquivo (padrão: stderr).')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        if path == '-' and not options['format']:
+            raise CommandError('Informe --format ao ler da entrada padrão.')
+
+        try:
+            fh = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8-sig')
+        except OSError as exc:
+            raise CommandError(f'Não foi possível abrir {path}: {exc}')
+        error_log = open(options['errors'], 'w', encoding='utf-8') if options['errors'] else self.stderr
+
+        workers = options['workers']
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker) if workers > 1 else None
+        groups = get_group_ids()
+        created = rejected = 0
+        started = perf_counter()
+        try:
+            for batch in batched(read_records(fh, fmt), options['batch_size']):
+                result = import_batch(batch, groups, pool)
+                created += result.created
+                rejected += len(result.errors)
+                for line_num, email, reason in result.errors:
+                    error_log.write(f'linha {line_num}: {email or "-"}: {reason}\n')
+                rate = created / (perf_counter() - started)
+                self.stdout.write(f'{created} importados, {rejected} rejeitados ({rate:.0f}/s)')
+        finally:
+            if pool:
+                pool.shutdown()
+            if fh is not sys.stdin:
+                fh.close()
+            if options['errors']:
+                error_log.close()
+
+        # bulk_create não dispara signals: as contagens da Home precisam ser refeitas
+        if created:
+            facets.invalidate()
+        self.stdout.write(self.style.SUCCESS(f'Concluído: {created} importados, {rejected} rejeitados.'))
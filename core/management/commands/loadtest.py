@@ -0,0 +1,164 @@
+import http.client
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.bench import generate_dataset, run_slow_clients
+
+from .benchmark import git_commit
+
+HOST = '127.0.0.1'
+READY_TIMEOUT = 30
+
+# Um worker de cada: o que se compara é a concorrência por processo
+SERVERS = {
+    'wsgi': ['-m', 'gunicorn', 'setup.wsgi:application', '--workers', '1', '--worker-class', 'sync',
+             '--bind', f'{HOST}:{{port}}', '--log-level', 'warning'],
+    'asgi': ['-m', 'uvicorn', 'setup.asgi:application', '--workers', '1', '--host', HOST,
+             '--port', '{port}', '--log-level', 'warning', '--no-access-log'],
+}
+
+
+def database_url(settings_dict):
+    """DATABASE_URL do banco descartável, para os processos do servidor."""
+    if connection.vendor == 'sqlite':
+        return f'sqlite:///{settings_dict["NAME"]}'
+    credentials = quote(settings_dict['USER'] or '')
+    if settings_dict['PASSWORD']:
+        credentials += ':' + quote(settings_dict['PASSWORD'])
+    host = settings_dict['HOST'] or 'localhost'
+    port = f':{settings_dict["PORT"]}' if settings_dict['PORT'] else ''
+    return f'postgres://{credentials}@{host}{port}/{settings_dict["NAME"]}'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+def warm_up(port, path, count=20):
+    # Templates compilados, facetas e cards no cache antes de medir
+    for _ in range(count):
+        conn = http.client.HTTPConnection(HOST, port, timeout=30)
+        try:
+            conn.request('GET', path)
+            conn.getresponse().read()
+        finally:
+            conn.close()
+
+
+def wait_ready(port, path, process):
+    deadline = time.monotonic() + READY_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError(f'O servidor saiu com código {process.returncode}.')
+        try:
+            conn = http.client.HTTPConnection(HOST, port, timeout=5)
+            conn.request('GET', path)
+            if conn.getresponse().status < 500:
+                return
+        except OSError:
+            time.sleep(0.2)
+        finally:
+            conn.close()
+    raise CommandError(f'O servidor não respondeu em {READY_TIMEOUT}s.')
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara quantos clientes lentos um único worker aguenta sem atrasar os demais: gunicorn '
+        'síncrono (setup.wsgi) contra uvicorn (setup.asgi, views async), num banco descartável.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servers', default='wsgi,asgi', help='Lista separada por vírgula.')
+        parser.add_argument('--paths', default='/,/specialist/{specialist}/availability/',
+                            help='Caminhos testados; {specialist} vira o id de um especialista.')
+        parser.add_argument('--requests', type=int, default=100, help='Requisições normais por medição.')
+        parser.add_argument('--rate', type=float, default=20, help='Requisições normais por segundo.')
+        parser.add_argument('--slow', default='0,25,100',
+                            help='Quantidades de clientes lentos abertos ao mesmo tempo (uma medição cada).')
+        parser.add_argument('--hold-ms', type=int, default=1000,
+                            help='Quanto cada cliente lento demora para terminar de mandar a requisição.')
+        parser.add_argument('--specialists', type=int, default=200)
+        parser.add_argument('--slots', type=int, default=20, help='Horários por especialista.')
+        parser.add_argument('--output', help='Arquivo JSON de saída (padrão: só imprime).')
+
+    def handle(self, *args, **options):
+        servers = [s.strip() for s in options['servers'].split(',') if s.strip()]
+        unknown = set(servers) - set(SERVERS)
+        if unknown:
+            raise CommandError(f'Servidores desconhecidos: {", ".join(sorted(unknown))}')
+        try:
+            options['slow_levels'] = [int(n) for n in options['slow'].split(',') if n.strip()]
+        except ValueError:
+            raise CommandError('--slow espera números separados por vírgula.')
+
+        tmpdir = None
+        if connection.vendor == 'sqlite':
+            # Arquivo: os servidores abrem o mesmo banco em outros processos
+            tmpdir = tempfile.mkdtemp(prefix='conektei-load-')
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(tmpdir, 'load.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stdout.write('Gerando dados sintéticos...')
+            dataset = generate_dataset(clients=10, specialists=options['specialists'],
+                                       slots_per_specialist=options['slots'])
+            paths = [p.strip().format(specialist=dataset['specialists'][0])
+                     for p in options['paths'].split(',') if p.strip()]
+            env = dict(os.environ, DATABASE_URL=database_url(connection.settings_dict))
+            results = {server: self.run_server(server, paths, env, options) for server in servers}
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            if tmpdir:
+                shutil.rmtree(tmpdir)
+
+        report = json.dumps({
+            'meta': {
+                'commit': git_commit(),
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'database': connection.vendor,
+                'dataset': dataset['sizes'],
+            },
+            'servers': results,
+        }, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(report)
+            self.stdout.write(self.style.SUCCESS(f'Resultado gravado em {options["output"]}'))
+        else:
+            self.stdout.write(report)
+
+    def run_server(self, server, paths, env, options):
+        port = free_port()
+        command = [sys.executable] + [arg.format(port=port) for arg in SERVERS[server]]
+        env = dict(env, ASYNC_VIEWS='1' if server == 'asgi' else '0')
+        process = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env)
+        try:
+            wait_ready(port, paths[0], process)
+            results = {}
+            for path in paths:
+                warm_up(port, path)
+                results[path] = {}
+                for slow in options['slow_levels']:
+                    self.stdout.write(f'{server} {path} com {slow} clientes lentos...')
+                    results[path][slow] = run_slow_clients(
+                        HOST, port, path, requests=options['requests'], rate=options['rate'],
+                        slow=slow, hold=options['hold_ms'] / 1000,
+                    )
+            return results
+        finally:
+            process.terminate()
+            process.wait(timeout=READY_TIMEOUT)
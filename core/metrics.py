@@ -0,0 +1,133 @@
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+# Limites superiores dos baldes (o último balde é "acima disso")
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+# Métricas da requisição em andamento (None fora do RequestMetricsMiddleware)
+current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('queries', 'sql_time', 'render_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+
+    def sql_wrapper(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql_time += perf_counter() - start
+
+
+# --- HISTOGRAMAS (baldes fixos, sem crescer por requisição) ---
+class Histogram:
+    __slots__ = ('bounds', 'counts', 'total', 'maximum')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        if value > self.maximum:
+            self.maximum = value
+
+    def as_dict(self, requests):
+        labels = [f'<={b}' for b in self.bounds] + [f'>{self.bounds[-1]}']
+        return {
+            'buckets': dict(zip(labels, self.counts)),
+            'avg': round(self.total / requests, 2) if requests else 0,
+            'max': round(self.maximum, 2),
+        }
+
+
+class ViewStats:
+    __slots__ = ('requests', 'slow', 'latency', 'sql_time', 'render_time', 'queries')
+
+    def __init__(self):
+        self.requests = 0
+        self.slow = 0
+        self.latency = Histogram(LATENCY_BUCKETS_MS)
+        self.sql_time = Histogram(LATENCY_BUCKETS_MS)
+        self.render_time = Histogram(LATENCY_BUCKETS_MS)
+        self.queries = Histogram(QUERY_BUCKETS)
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'over_query_threshold': self.slow,
+            'latency_ms': self.latency.as_dict(self.requests),
+            'sql_ms': self.sql_time.as_dict(self.requests),
+            'render_ms': self.render_time.as_dict(self.requests),
+            'queries': self.queries.as_dict(self.requests),
+        }
+
+
+# --- REGISTRO (um ViewStats por nome de URL, por processo) ---
+_lock = threading.Lock()
+_registry = {}
+
+
+def record(view_name, latency, metrics, over_threshold=False):
+    with _lock:
+        stats = _registry.get(view_name)
+        if stats is None:
+            stats = _registry[view_name] = ViewStats()
+        stats.requests += 1
+        if over_threshold:
+            stats.slow += 1
+        stats.latency.observe(latency * 1000)
+        stats.sql_time.observe(metrics.sql_time * 1000)
+        stats.render_time.observe(metrics.render_time * 1000)
+        stats.queries.observe(metrics.queries)
+
+
+def snapshot():
+    with _lock:
+        return {name: stats.as_dict() for name, stats in sorted(_registry.items())}
+
+
+def reset():
+    with _lock:
+        _registry.clear()
+
+
+# --- TEMPLATES (mede o tempo de render quando há métricas ativas) ---
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = current.get()
+        if metrics is None:
+            return super().render(context, request)
+        start = perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.render_time += perf_counter() - start
+
+
+class InstrumentedTemplates(DjangoTemplates):
+    """DjangoTemplates que entrega TimedTemplate; sem custo fora do middleware."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
@@ -0,0 +1,160 @@
+import logging
+import time
+from contextlib import ExitStack
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+from django.utils.functional import SimpleLazyObject
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import metrics, routers
+from .models import Profile
+
+logger = logging.getLogger(__name__)
+
+
+def get_request_profile(request):
+    user = request.user
+    if not user.is_authenticated:
+        return None
+    try:
+        # Já veio no JOIN feito pelo ProfileBackend
+        return user.profile
+    except Profile.DoesNotExist:
+        # Só para usuários antigos sem perfil; os novos ganham um pelo signal
+        profile, _ = Profile.objects.get_or_create(user=user)
+        return profile
+
+
+class ProfileMiddleware:
+    """Deixa o perfil em request.profile, carregado só quando usado e uma vez por requisição."""
+
+    # No ASGI devolve a coroutine da próxima camada sem passar por uma thread
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        request.profile = SimpleLazyObject(lambda: get_request_profile(request))
+        return self.get_response(request)
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoise que também roda no modo async: um middleware só síncrono na
+    pilha faria toda requisição ASGI ocupar uma thread do começo ao fim."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None):
+        super().__init__(get_response)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is None:
+            return await self.get_response(request)
+        return await sync_to_async(self.serve_buffered)(static_file, request)
+
+    @classmethod
+    def serve_buffered(cls, static_file, request):
+        # CSS/imagens pequenos: lidos de uma vez na thread, sem iterador síncrono no event loop
+        streamed = cls.serve(static_file, request)
+        try:
+            response = HttpResponse(b''.join(streamed.streaming_content), status=streamed.status_code)
+        finally:
+            streamed.close()
+        del response['Content-Type']
+        for header, value in streamed.items():
+            response[header] = value
+        return response
+
+
+class RequestMetricsMiddleware:
+    """Opcional (REQUEST_METRICS=True): conta queries, tempo de SQL, de template e
+    total por nome de URL. O relatório fica em /admin/metrics/ (só staff).
+    Só síncrono: ligado no ASGI, as views async voltam a rodar numa thread."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_METRICS', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.query_threshold = getattr(settings, 'REQUEST_METRICS_QUERY_THRESHOLD', None)
+
+    def __call__(self, request):
+        request_metrics = metrics.RequestMetrics()
+        token = metrics.current.set(request_metrics)
+        start = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(request_metrics.sql_wrapper))
+                response = self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        latency = perf_counter() - start
+
+        match = request.resolver_match
+        view_name = match.view_name if match else '<sem rota>'
+        over = self.query_threshold is not None and request_metrics.queries > self.query_threshold
+        if over:
+            logger.warning(
+                '%s (%s) executou %d queries (limite %d)',
+                view_name, request.path, request_metrics.queries, self.query_threshold,
+            )
+        metrics.record(view_name, latency, request_metrics, over)
+        return response
+
+
+class ReplicaStickinessMiddleware:
+    """Só com réplica configurada: se a requisição gravou algo, o navegador
+    passa a ler do primário por REPLICA_STICKY_SECONDS (cookie primary_until)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if routers.REPLICA not in settings.DATABASES:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.window = getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with routers.track_writes() as writes:
+            response = self.get_response(request)
+        return self.mark_sticky(response, writes)
+
+    async def __acall__(self, request):
+        # As threads do ORM async recebem uma cópia do contexto com o mesmo set
+        with routers.track_writes() as writes:
+            response = await self.get_response(request)
+        return self.mark_sticky(response, writes)
+
+    def mark_sticky(self, response, writes):
+        if writes:
+            response.set_cookie(
+                routers.STICKY_COOKIE, f'{time.time() + self.window:.3f}',
+                max_age=self.window, httponly=True, samesite='Lax',
+            )
+        return response
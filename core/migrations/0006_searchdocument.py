@@ -0,0 +1,97 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+SQLITE_FORWARD = [
+    """CREATE VIRTUAL TABLE core_searchdocument_fts USING fts5(
+        document,
+        content='core_searchdocument',
+        content_rowid='profile_id',
+        prefix='2 3',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER core_searchdocument_ai AFTER INSERT ON core_searchdocument BEGIN
+        INSERT INTO core_searchdocument_fts(rowid, document) VALUES (new.profile_id, new.document);
+    END""",
+    """CREATE TRIGGER core_searchdocument_ad AFTER DELETE ON core_searchdocument BEGIN
+        INSERT INTO core_searchdocument_fts(core_searchdocument_fts, rowid, document)
+        VALUES ('delete', old.profile_id, old.document);
+    END""",
+    """CREATE TRIGGER core_searchdocument_au AFTER UPDATE ON core_searchdocument BEGIN
+        INSERT INTO core_searchdocument_fts(core_searchdocument_fts, rowid, document)
+        VALUES ('delete', old.profile_id, old.document);
+        INSERT INTO core_searchdocument_fts(rowid, document) VALUES (new.profile_id, new.document);
+    END""",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS core_searchdocument_au",
+    "DROP TRIGGER IF EXISTS core_searchdocument_ad",
+    "DROP TRIGGER IF EXISTS core_searchdocument_ai",
+    "DROP TABLE IF EXISTS core_searchdocument_fts",
+]
+
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX core_searchdocument_tsv ON core_searchdocument USING gin (to_tsvector('simple', document))",
+    "CREATE INDEX core_searchdocument_trgm ON core_searchdocument USING gin (document gin_trgm_ops)",
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS core_searchdocument_trgm",
+    "DROP INDEX IF EXISTS core_searchdocument_tsv",
+]
+
+
+def _run(schema_editor, statements):
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _run(schema_editor, SQLITE_FORWARD)
+    elif vendor == 'postgresql':
+        _run(schema_editor, POSTGRES_FORWARD)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _run(schema_editor, SQLITE_BACKWARD)
+    elif vendor == 'postgresql':
+        _run(schema_editor, POSTGRES_BACKWARD)
+
+
+def populate_documents(apps, schema_editor):
+    from core.search import normalize
+
+    Profile = apps.get_model('core', 'Profile')
+    SearchDocument = apps.get_model('core', 'SearchDocument')
+    docs = []
+    for profile in Profile.objects.filter(is_specialist=True).select_related('user').iterator(chunk_size=1000):
+        parts = [profile.user.first_name, profile.profession, profile.description]
+        docs.append(SearchDocument(profile_id=profile.pk, document=' '.join(normalize(p) for p in parts if p)))
+    SearchDocument.objects.bulk_create(docs, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_appointment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('profile', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='core.profile')),
+                ('document', models.TextField()),
+            ],
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(populate_documents, migrations.RunPython.noop),
+    ]
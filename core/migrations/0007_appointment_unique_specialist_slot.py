@@ -0,0 +1,37 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:03
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def remove_duplicate_slots(apps, schema_editor):
+    # Mantém um horário por (especialista, data, hora), preferindo o que já foi reservado
+    Appointment = apps.get_model('core', 'Appointment')
+    duplicates = (
+        Appointment.objects.values('specialist', 'date', 'time')
+        .annotate(total=Count('id'))
+        .filter(total__gt=1)
+    )
+    for slot in duplicates:
+        rows = Appointment.objects.filter(
+            specialist=slot['specialist'], date=slot['date'], time=slot['time'],
+        ).order_by('-is_booked', 'id')
+        keep = rows.values_list('id', flat=True).first()
+        rows.exclude(id=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_searchdocument'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_slots, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(fields=('specialist', 'date', 'time'), name='unique_specialist_slot'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_appointment_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAppointment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('specialist_id', models.BigIntegerField()),
+                ('client_id', models.IntegerField(blank=True, null=True)),
+                ('date', models.DateField(verbose_name='Data')),
+                ('time', models.TimeField(verbose_name='Horário')),
+                ('is_booked', models.BooleanField(default=False, verbose_name='Reservado?')),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['date', 'time'],
+                'indexes': [models.Index(fields=['specialist_id', 'date'], name='archived_appt_spec_date_idx')],
+            },
+        ),
+    ]
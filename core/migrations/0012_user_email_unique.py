@@ -0,0 +1,44 @@
+# Generated by Django 5.0.2 on 2026-10-18 15:05
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+INDEX_NAME = 'core_auth_user_email_uniq'
+
+
+def create_email_index(apps, schema_editor):
+    # O auth.User não é nosso: o índice único (sem diferenciar maiúsculas) é criado à mão.
+    # Emails repetidos precisam ser resolvidos antes; aqui só avisamos quais são.
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    duplicates = list(
+        User.objects.exclude(email='')
+        .values(lower_email=Lower('email'))
+        .annotate(total=Count('pk'))
+        .filter(total__gt=1)
+        .values_list('lower_email', flat=True)[:20]
+    )
+    if duplicates:
+        raise RuntimeError(f'Emails repetidos em {User._meta.db_table}: {", ".join(duplicates)}')
+
+    table = schema_editor.quote_name(User._meta.db_table)
+    schema_editor.execute(
+        f"CREATE UNIQUE INDEX {INDEX_NAME} ON {table} (LOWER(email)) WHERE email <> ''"
+    )
+
+
+def drop_email_index(apps, schema_editor):
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_profile_photo_renditions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(create_email_index, drop_email_index),
+    ]
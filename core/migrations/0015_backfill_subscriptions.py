@@ -0,0 +1,34 @@
+# Generated by Django 5.0.2 on 2026-10-18 16:10
+
+from datetime import timedelta
+
+from django.db import migrations
+from django.utils import timezone
+
+# Plano de quem já era assinante antes do Subscription: não sabemos qual nem até
+# quando, então vale um ciclo do plano mais curto a partir do deploy
+LEGACY_PLAN = 'Legado'
+LEGACY_DAYS = 30
+
+
+def backfill_subscriptions(apps, schema_editor):
+    # Sem a linha, o BOOKING_REQUIRES_PLAN barraria quem já tinha has_active_plan
+    Profile = apps.get_model('core', 'Profile')
+    Subscription = apps.get_model('core', 'Subscription')
+    expires_at = timezone.now() + timedelta(days=LEGACY_DAYS)
+    missing = Profile.objects.filter(has_active_plan=True, subscription__isnull=True).values_list('pk', flat=True)
+    Subscription.objects.bulk_create(
+        [Subscription(profile_id=pk, plan=LEGACY_PLAN, expires_at=expires_at) for pk in missing.iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_subscription_payment'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_subscriptions, migrations.RunPython.noop),
+    ]
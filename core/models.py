@@ -1,5 +1,11 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from django.contrib.auth.models import User
+from django.dispatch import Signal
+
+# Enviado quando horários mudam por UPDATE/bulk_create (que não disparam post_save).
+# Argumento: specialist_ids
+appointments_changed = Signal()
 
 class Profile(models.Model):
     # Lista de Profissões
@@ -37,6 +43,8 @@ class Profile(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True, verbose_name="Preço da Consulta")
     phone = models.CharField(max_length=20, blank=True, null=True, verbose_name="WhatsApp")
     photo = models.ImageField(upload_to='profiles/', blank=True, null=True, verbose_name="Foto de Perfil")
+    # Miniaturas geradas por core.images: {"hash": "...", "widths": [...], "formats": [...]}
+    photo_renditions = models.JSONField(default=dict, blank=True, editable=False)
 
     # Controle de Pagamento / Acesso
     has_active_plan = models.BooleanField(default=False, verbose_name="Tem Plano Ativo?")
@@ -48,6 +56,9 @@ class Profile(models.Model):
         verbose_name="Tipo de Acesso"
     )
 
+    # Validador do GET condicional (core.freshness); UPDATEs diretos também o atualizam
+    updated_at = models.DateTimeField(auto_now=True)
+
     def clean_phone(self):
         """Retorna o telefone apenas com números para o link do WhatsApp"""
         if self.phone:
@@ -59,6 +70,25 @@ class Profile(models.Model):
 
 
 # --- NOVA CLASSE: AGENDA / HORÁRIOS ---
+class AppointmentQuerySet(models.QuerySet):
+    def book(self, client, appointment_ids):
+        """Reserva os horários com um único UPDATE condicional (is_booked=False -> True).
+        Tudo ou nada: se algum já estiver ocupado, nada é reservado e retorna False."""
+        ids = set(appointment_ids)
+        if not ids:
+            return False
+        with transaction.atomic(using=self.db):
+            updated = self.filter(pk__in=ids, is_booked=False).update(
+                is_booked=True, client=client, updated_at=timezone.now(),
+            )
+            if updated != len(ids):
+                transaction.set_rollback(True, using=self.db)
+                return False
+        booked = dict(self.filter(pk__in=ids).values_list('pk', 'specialist_id'))
+        appointments_changed.send(sender=self.model, specialist_ids=set(booked.values()), booked=booked)
+        return True
+
+
 class Appointment(models.Model):
     specialist = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='appointments')
     client = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='appointments')
@@ -66,10 +96,102 @@ class Appointment(models.Model):
     date = models.DateField(verbose_name="Data")
     time = models.TimeField(verbose_name="Horário")
     is_booked = models.BooleanField(default=False, verbose_name="Reservado?")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = AppointmentQuerySet.as_manager()
 
     class Meta:
         ordering = ['date', 'time']
+        constraints = [
+            # O índice único também atende a agenda do especialista (specialist + date__gte, ordenado)
+            models.UniqueConstraint(fields=['specialist', 'date', 'time'], name='unique_specialist_slot'),
+        ]
+        indexes = [
+            # Painel do cliente: client + date__gte, ordenado por (date, time)
+            models.Index(fields=['client', 'date', 'time'], name='appt_client_date_idx'),
+            # Changelist do admin: ordering padrão e filtro por data
+            models.Index(fields=['date', 'time'], name='appt_date_time_idx'),
+            # Só os horários livres: o que a página pública e a reserva procuram
+            models.Index(
+                fields=['specialist', 'date', 'time'],
+                condition=models.Q(is_booked=False),
+                name='appt_free_slots_idx',
+            ),
+            # MAX(updated_at) da Home (ETag) sem varrer a tabela
+            models.Index(fields=['updated_at'], name='appt_updated_at_idx'),
+        ]
 
     def __str__(self):
         status = "OCUPADO" if self.is_booked else "LIVRE"
-        return f"{self.date} às {self.time} - {self.specialist.user.first_name} ({status})"
\ No newline at end of file
+        return f"{self.date} às {self.time} - {self.specialist.user.first_name} ({status})"
+
+# --- ÍNDICE DE BUSCA (Documento desnormalizado por especialista) ---
+class SearchDocument(models.Model):
+    """Texto normalizado (sem acentos, minúsculo) usado pela busca da Home.
+    O índice FTS5 (SQLite) ou GIN (PostgreSQL) é criado na migration 0006."""
+    profile = models.OneToOneField(Profile, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    document = models.TextField()
+
+    def __str__(self):
+        return f"Índice de {self.profile_id}"
+
+
+# --- HISTÓRICO (Horários passados, movidos pelo comando archive_appointments) ---
+class ArchivedAppointment(models.Model):
+    # Mesmo id do Appointment original; sem FKs para o arquivo sobreviver a exclusões
+    id = models.BigIntegerField(primary_key=True)
+    specialist_id = models.BigIntegerField()
+    client_id = models.IntegerField(null=True, blank=True)
+    date = models.DateField(verbose_name="Data")
+    time = models.TimeField(verbose_name="Horário")
+    is_booked = models.BooleanField(default=False, verbose_name="Reservado?")
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['date', 'time']
+        indexes = [
+            models.Index(fields=['specialist_id', 'date'], name='archived_appt_spec_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} às {self.time} (arquivado)"
+
+
+# --- ASSINATURAS E PAGAMENTOS (core.billing) ---
+class Subscription(models.Model):
+    """Plano vigente do perfil (uma linha por perfil). Pagamentos novos estendem o
+    expires_at com UPDATE ... F(); o comando expire_subscriptions desativa os vencidos."""
+    profile = models.OneToOneField(Profile, on_delete=models.CASCADE, related_name='subscription')
+    plan = models.CharField(max_length=20, verbose_name="Plano")
+    expires_at = models.DateTimeField(verbose_name="Vence em")
+    is_active = models.BooleanField(default=True, verbose_name="Ativa?")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # expire_subscriptions: só as ativas, na ordem de vencimento
+            models.Index(fields=['expires_at'], condition=models.Q(is_active=True), name='subscription_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.plan} de {self.profile_id} até {self.expires_at:%d/%m/%Y}"
+
+
+class Payment(models.Model):
+    """Registro imutável de cada cobrança aprovada. A chave de idempotência vem do
+    formulário do checkout: reenvio e duplo clique encontram o pagamento já feito."""
+    profile = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='payments')
+    subscription = models.ForeignKey(Subscription, on_delete=models.SET_NULL, null=True, blank=True, related_name='payments')
+    idempotency_key = models.CharField(max_length=64)
+    plan = models.CharField(max_length=20, verbose_name="Plano")
+    amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Valor")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['profile', 'idempotency_key'], name='unique_payment_idempotency_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.plan} R$ {self.amount} ({self.profile_id})"
\ No newline at end of file
@@ -0,0 +1,92 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+
+REPLICA = 'replica'
+# Cookie com o instante (epoch) até quando o navegador lê do primário
+STICKY_COOKIE = 'primary_until'
+
+# Ligado só durante as views marcadas com @read_from_replica
+_use_replica = ContextVar('use_replica', default=False)
+# Modelos gravados na requisição atual (None fora do ReplicaStickinessMiddleware)
+_writes = ContextVar('replica_writes', default=None)
+
+
+class ReplicaRouter:
+    """Leituras dos modelos do core vão para a réplica dentro de views de
+    catálogo; todo o resto (escritas, sessão, auth, migrações) fica no default."""
+
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and model._meta.app_label == 'core' and REPLICA in settings.DATABASES:
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        writes = _writes.get()
+        # A sessão é gravada em quase toda requisição autenticada: não conta
+        if writes is not None and model._meta.app_label != 'sessions':
+            writes.add(model._meta.label)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplica e primário têm os mesmos dados
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db != REPLICA
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    token = _use_replica.set(enabled)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def primary_reads():
+    """Para quem grava em cache o que leu: lê do primário mesmo dentro de uma
+    view de catálogo (a réplica pode estar atrasada em relação à versão nova)."""
+    return replica_reads(False)
+
+
+@contextmanager
+def track_writes():
+    writes = set()
+    token = _writes.set(writes)
+    try:
+        yield writes
+    finally:
+        _writes.reset(token)
+
+
+def is_sticky(request):
+    """True se este navegador gravou algo há menos de REPLICA_STICKY_SECONDS."""
+    try:
+        return float(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def read_from_replica(view):
+    """Views de catálogo: leituras na réplica, exceto logo depois de o próprio
+    usuário gravar (aí lê do primário e vê a reserva/alteração que acabou de fazer)."""
+
+    if iscoroutinefunction(view):
+        # O ContextVar segue para as threads do ORM async (sync_to_async copia o contexto)
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            with replica_reads(not is_sticky(request)):
+                return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with replica_reads(not is_sticky(request)):
+            return view(request, *args, **kwargs)
+    return wrapper
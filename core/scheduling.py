@@ -0,0 +1,44 @@
+from datetime import date, datetime, timedelta
+
+from .models import Appointment, appointments_changed
+
+
+# --- AGENDA RECORRENTE ---
+def expand_recurrence(start_date, end_date, weekdays, start_time, end_time, slot_minutes, exceptions=()):
+    """Gera os pares (data, hora) de uma agenda semanal.
+    weekdays usa a convenção do Python: 0 = segunda ... 6 = domingo."""
+    weekdays = {int(d) for d in weekdays}
+    exceptions = set(exceptions)
+    step = timedelta(minutes=slot_minutes)
+    first_day = max(start_date, date.today())
+
+    day = first_day
+    while day <= end_date:
+        if day.weekday() in weekdays and day not in exceptions:
+            current = datetime.combine(day, start_time)
+            last = datetime.combine(day, end_time)
+            # O último horário precisa caber inteiro na janela
+            while current + step <= last:
+                yield day, current.time()
+                current += step
+        day += timedelta(days=1)
+
+
+def create_recurring_slots(profile, **recurrence):
+    """Insere todos os horários em um único bulk_create; os que já existem são
+    ignorados pela constraint unique_specialist_slot. Retorna quantos foram criados."""
+    slots = [
+        Appointment(specialist=profile, date=day, time=hour)
+        for day, hour in expand_recurrence(**recurrence)
+    ]
+    if not slots:
+        return 0
+
+    in_range = Appointment.objects.filter(
+        specialist=profile,
+        date__range=(recurrence['start_date'], recurrence['end_date']),
+    )
+    before = in_range.count()
+    Appointment.objects.bulk_create(slots, batch_size=500, ignore_conflicts=True)
+    appointments_changed.send(sender=Appointment, specialist_ids={profile.pk})
+    return in_range.count() - before
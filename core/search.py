@@ -0,0 +1,136 @@
+import re
+import unicodedata
+from collections import namedtuple
+
+from django.db import connections, router
+from django.db.models.expressions import RawSQL
+
+from .models import Profile, SearchDocument
+
+# Quantos resultados ranqueados a busca devolve no máximo
+SEARCH_LIMIT = 200
+
+FTS_TABLE = 'core_searchdocument_fts'
+
+
+# --- NORMALIZAÇÃO ---
+def normalize(text):
+    """Remove acentos e deixa minúsculo: 'Saúde' -> 'saude'."""
+    if not text:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text):
+    return re.findall(r'\w+', normalize(text))
+
+
+def build_document(profile):
+    parts = [profile.user.first_name, profile.profession, profile.description]
+    return ' '.join(normalize(p) for p in parts if p)
+
+
+# --- MANUTENÇÃO DO ÍNDICE (chamado pelos signals) ---
+def index_profile(profile, created=False):
+    # Perfil recém-criado ainda não tem documento: INSERT direto (ou nada)
+    if created:
+        if profile.is_specialist:
+            SearchDocument.objects.create(profile=profile, document=build_document(profile))
+        return
+    if not profile.is_specialist:
+        SearchDocument.objects.filter(profile=profile).delete()
+        return
+    SearchDocument.objects.update_or_create(
+        profile=profile,
+        defaults={'document': build_document(profile)},
+    )
+
+
+def rebuild_index():
+    SearchDocument.objects.all().delete()
+    profiles = Profile.objects.filter(is_specialist=True).select_related('user')
+    SearchDocument.objects.bulk_create(
+        [SearchDocument(profile=p, document=build_document(p)) for p in profiles.iterator(chunk_size=1000)],
+        batch_size=1000,
+    )
+
+
+# --- CONSULTA ---
+Match = namedtuple('Match', ['sql', 'params', 'order', 'order_params', 'column'])
+
+
+def _match(vendor, tokens):
+    """SQL cru que seleciona os ids que casam (sem ordem nem limite) e a ordem
+    por relevância; None fora do SQLite/PostgreSQL."""
+    if vendor == 'sqlite':
+        # Cada termo vira um prefixo ("tec"* casa com "tecnologia")
+        return Match(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+            [' '.join(f'"{t}"*' for t in tokens)],
+            'rank, rowid', [], 'rowid',
+        )
+    if vendor == 'postgresql':
+        tsquery = ' & '.join(f'{t}:*' for t in tokens)
+        phrase = ' '.join(tokens)
+        return Match(
+            """
+            SELECT profile_id FROM core_searchdocument
+            WHERE (to_tsvector('simple', document) @@ to_tsquery('simple', %s) OR document LIKE %s)
+            """,
+            [tsquery, f'%{phrase}%'],
+            """
+            ts_rank(to_tsvector('simple', document), to_tsquery('simple', %s)) DESC,
+            similarity(document, %s) DESC, profile_id
+            """,
+            [tsquery, phrase], 'profile_id',
+        )
+    return None
+
+
+def _matching_documents(tokens):
+    docs = SearchDocument.objects.all()
+    for t in tokens:
+        docs = docs.filter(document__contains=t)
+    return docs
+
+
+def search_ids(query, limit=SEARCH_LIMIT, offset=0, within=None):
+    """Retorna os ids de Profile que casam com a busca, do mais relevante ao menos.
+    within (queryset de Profile) filtra no próprio SQL, antes do LIMIT/OFFSET."""
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+
+    # SQL cru: escolhe a conexão pelo router (réplica nas views de catálogo)
+    connection = connections[router.db_for_read(SearchDocument)]
+    match = _match(connection.vendor, tokens)
+    if match is None:
+        docs = _matching_documents(tokens)
+        if within is not None:
+            docs = docs.filter(pk__in=within.values('pk'))
+        return list(docs.order_by('pk').values_list('pk', flat=True)[offset:offset + limit])
+
+    sql, params = match.sql, list(match.params)
+    if within is not None:
+        within_sql, within_params = within.values('pk').query.get_compiler(connection=connection).as_sql()
+        sql += f' AND {match.column} IN ({within_sql})'
+        params += within_params
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{sql} ORDER BY {match.order} LIMIT %s OFFSET %s',
+            [*params, *match.order_params, limit, offset],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def filter_matching(queryset, query):
+    """queryset só com os perfis que casam com a busca, num subselect sem limite
+    (contagens como as facetas não param nos SEARCH_LIMIT primeiros)."""
+    tokens = tokenize(query)
+    if not tokens:
+        return queryset.none()
+    match = _match(connections[queryset.db].vendor, tokens)
+    if match is None:
+        return queryset.filter(pk__in=_matching_documents(tokens).values('pk'))
+    return queryset.filter(pk__in=RawSQL(match.sql, match.params))
@@ -0,0 +1,121 @@
+from datetime import date
+
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import accounts, caching, events, facets, search
+from .models import Appointment, Profile, appointments_changed
+
+
+# --- PERFIL (todo usuário novo ganha um Profile) ---
+@receiver(post_save, sender=User)
+def create_profile(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        # O cadastro manda os campos iniciais junto (evita um UPDATE logo em seguida)
+        defaults = getattr(instance, 'profile_defaults', None) or {}
+        instance.profile = Profile.objects.create(user=instance, **defaults)
+
+
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Group)
+def forget_group_ids(sender, **kwargs):
+    accounts.clear_group_ids()
+
+
+# --- ÍNDICE DE BUSCA ---
+# A remoção do Profile apaga o SearchDocument em cascata (e o FTS via trigger).
+@receiver(post_save, sender=Profile)
+def reindex_profile(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    search.index_profile(instance, created=created)
+
+
+@receiver(post_save, sender=User)
+def reindex_user_profile(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    # O login só atualiza last_login; não precisa mexer no índice.
+    # Usuário novo: o perfil acabou de ser indexado pelo create_profile.
+    if raw or created or (update_fields is not None and 'first_name' not in update_fields):
+        return
+    profile = Profile.objects.filter(user=instance, is_specialist=True).first()
+    if profile:
+        profile.user = instance
+        search.index_profile(profile)
+        caching.bump_generation(profile.pk)
+        # O nome aparece no card: o ETag do catálogo precisa mudar
+        Profile.objects.filter(pk=profile.pk).update(updated_at=timezone.now())
+
+
+# --- CACHE DA PÁGINA DO ESPECIALISTA E DAS FACETAS DA HOME ---
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_profile_page(sender, instance, **kwargs):
+    caching.bump_generation(instance.pk)
+    facets.invalidate()
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def invalidate_specialist_agenda(sender, instance, **kwargs):
+    caching.bump_generation(instance.specialist_id)
+    facets.invalidate()
+
+
+@receiver(post_delete, sender=Appointment)
+def touch_specialist_on_delete(sender, instance, **kwargs):
+    # MAX(updated_at) não enxerga exclusões: marca o perfil (só horários futuros,
+    # os passados não aparecem no catálogo e são os que o arquivamento apaga)
+    if not isinstance(instance.date, date) or instance.date >= date.today():
+        Profile.objects.filter(pk=instance.specialist_id).update(updated_at=timezone.now())
+
+
+@receiver(appointments_changed)
+def invalidate_changed_agendas(sender, specialist_ids, **kwargs):
+    for specialist_id in specialist_ids:
+        caching.bump_generation(specialist_id)
+    facets.invalidate()
+
+
+# --- AGENDA AO VIVO (SSE da página do especialista) ---
+@receiver(post_save, sender=Appointment)
+def publish_slot_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if instance.is_booked:
+        events.publish(instance.specialist_id, 'booked', id=instance.pk)
+    else:
+        # date/time chegam como texto quando vêm direto do POST
+        events.publish(instance.specialist_id, 'freed', id=instance.pk,
+                       date=str(instance.date), time=str(instance.time)[:5])
+
+
+@receiver(post_delete, sender=Appointment)
+def publish_slot_removed(sender, instance, **kwargs):
+    events.publish(instance.specialist_id, 'removed', id=instance.pk)
+
+
+@receiver(appointments_changed)
+def publish_changed_agendas(sender, specialist_ids, booked=None, **kwargs):
+    if booked is not None:
+        # Reserva por UPDATE (Appointment.objects.book): sem post_save
+        for appointment_id, specialist_id in booked.items():
+            events.publish(specialist_id, 'booked', id=appointment_id)
+        return
+    # Inserção em lote (agenda recorrente): a página só avisa que há horários novos
+    for specialist_id in specialist_ids:
+        events.publish(specialist_id, 'changed')
+
+
+# --- SQLITE (desenvolvimento) ---
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    # WAL: leitores não bloqueiam o escritor; NORMAL é seguro com WAL e evita um fsync por commit
+    if connection.vendor != 'sqlite' or not settings.SQLITE_WAL:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
@@ -0,0 +1,13 @@
+'use strict';
+// Filtros laterais com autocomplete (core.admin.AutocompleteFilter):
+// escolher um valor recarrega a lista com o parâmetro na URL
+(function($) {
+    $(document).on('change', '.autocomplete-filter select', function() {
+        const filter = this.closest('.autocomplete-filter');
+        const params = new URLSearchParams(filter.dataset.queryString);
+        if (this.value) {
+            params.set(filter.dataset.parameter, this.value);
+        }
+        window.location.search = params.toString();
+    });
+})(django.jQuery);
@@ -0,0 +1,36 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from ..images import rendition_urls
+
+register = template.Library()
+
+
+def _srcset(urls):
+    return format_html_join(', ', '{} {}w', urls)
+
+
+@register.simple_tag
+def photo_srcset(profile, ext='webp'):
+    """srcset com as miniaturas do perfil ('' se ainda não foram geradas)."""
+    if not profile.photo_renditions:
+        return ''
+    return _srcset(rendition_urls(profile.photo_renditions, ext))
+
+
+@register.simple_tag
+def profile_photo(profile, sizes, alt='', css_class=''):
+    """<picture> com WebP + JPEG responsivos; usa a foto original enquanto as
+    miniaturas não ficam prontas."""
+    if not profile.photo_renditions:
+        return format_html('<img src="{}" alt="{}" class="{}" loading="lazy">', profile.photo.url, alt, css_class)
+
+    jpeg = rendition_urls(profile.photo_renditions, 'jpg')
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" loading="lazy">'
+        '</picture>',
+        _srcset(rendition_urls(profile.photo_renditions, 'webp')), sizes,
+        jpeg[-1][0], _srcset(jpeg), sizes, alt, css_class,
+    )
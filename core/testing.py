@@ -0,0 +1,32 @@
+import shutil
+import tempfile
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+def isolated_caches(location):
+    """CACHES com o mesmo backend do site (FileBasedCache), mas em outro diretório."""
+    return {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': location,
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+
+
+class IsolatedCacheRunner(DiscoverRunner):
+    """Os testes usam um cache num diretório temporário: o cache.clear() dos setUps
+    e as páginas das fixtures nunca chegam ao .cache compartilhado do site."""
+
+    def setup_test_environment(self, **kwargs):
+        self._cache_dir = tempfile.mkdtemp(prefix='conektei-test-cache-')
+        self._cache_settings = override_settings(CACHES=isolated_caches(self._cache_dir))
+        self._cache_settings.enable()
+        super().setup_test_environment(**kwargs)
+
+    def teardown_test_environment(self, **kwargs):
+        super().teardown_test_environment(**kwargs)
+        self._cache_settings.disable()
+        shutil.rmtree(self._cache_dir, ignore_errors=True)
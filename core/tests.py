@@ -1,3 +1,1681 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import importlib
+import os
+import tempfile
+import threading
+import time as time_module
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, time, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.contrib.messages import get_messages
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template import Context, Template
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, connections
+from django.http import Http404, HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import admin as admin_module, accounts, archive, async_views, availability, bench, billing, caching, events, facets, hashers, images, importer, listing, metrics, routers, search, throttle
+from .middleware import ProfileMiddleware, StaticFilesMiddleware
+from .models import Appointment, ArchivedAppointment, Payment, Profile, SearchDocument, Subscription, appointments_changed
+from .scheduling import create_recurring_slots
+
+
+# Sem collectstatic nos testes: usa o storage simples em vez do manifest do WhiteNoise
+SIMPLE_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+def make_specialist(name, profession='Tecnologia e TI', description='', price=100):
+    user = User.objects.create(username=f'{name.lower()}@test.com', first_name=name)
+    profile = user.profile
+    profile.is_specialist = True
+    profile.profession = profession
+    profile.description = description
+    profile.price = price
+    profile.save()
+    return profile
+
+
+# --- BUSCA ---
+@override_settings(STORAGES=SIMPLE_STORAGES)
+class SearchTests(TestCase):
+    def test_accent_insensitive_prefix_match(self):
+        joao = make_specialist('João', profession='Saúde e Bem-estar')
+        make_specialist('Maria', profession='Consultoria Jurídica')
+
+        self.assertEqual(search.search_ids('joao'), [joao.pk])
+        self.assertEqual(search.search_ids('SAUDE'), [joao.pk])
+        self.assertEqual(search.search_ids('saú bem'), [joao.pk])
+
+    def test_results_are_ranked(self):
+        weak = make_specialist('Ana', description='Atendo também casos de python.')
+        strong = make_specialist('Bia', description='Python, python e mais python para sua empresa.')
+
+        self.assertEqual(search.search_ids('python'), [strong.pk, weak.pk])
+
+    def test_index_follows_profile_and_user_changes(self):
+        spec = make_specialist('Carlos')
+        spec.user.first_name = 'Roberto'
+        spec.user.save()
+
+        self.assertEqual(search.search_ids('carlos'), [])
+        self.assertEqual(search.search_ids('roberto'), [spec.pk])
+
+        spec.is_specialist = False
+        spec.save()
+        self.assertEqual(search.search_ids('roberto'), [])
+
+        spec.is_specialist = True
+        spec.save()
+        spec.delete()
+        self.assertEqual(search.search_ids('roberto'), [])
+        self.assertFalse(SearchDocument.objects.exists())
+
+    def test_home_search(self):
+        make_specialist('Paula', profession='Marketing Digital')
+        make_specialist('Pedro', profession='Consultoria Financeira')
+
+        response = self.client.get(reverse('home'), {'q': 'marketing'})
+
+        names = [spec.user.first_name for spec in response.context['specialists']]
+        self.assertEqual(names, ['Paula'])
+
+
+# --- LISTAGEM PAGINADA ---
+@override_settings(STORAGES=SIMPLE_STORAGES)
+class ListingTests(TestCase):
+    def setUp(self):
+        self.specs = [make_specialist(f'Spec{i}', description=f'consultor {i}') for i in range(30)]
+
+    def test_keyset_pages_cover_everything_once(self):
+        seen = []
+        after = None
+        while True:
+            page = listing.keyset_page(listing.specialist_cards(), after=after, size=7)
+            seen += [spec.id for spec in page.items]
+            if page.next_cursor is None:
+                break
+            after = page.next_cursor
+        self.assertEqual(seen, [spec.id for spec in self.specs])
+
+    def test_search_pages_follow_rank(self):
+        first = listing.search_page(listing.specialist_cards(), 'consultor', size=20)
+        second = listing.search_page(listing.specialist_cards(), 'consultor', after=first.next_cursor, size=20)
+
+        ids = [spec.id for spec in first.items + second.items]
+        self.assertEqual(ids, search.search_ids('consultor'))
+        self.assertIsNone(second.next_cursor)
+
+    def test_home_query_count_is_constant_per_page(self):
+        url = reverse('home')
+        cache.clear()
+        # ETag (2 agregados) + cards + facetas (só na primeira vez; depois vêm do memo)
+        with self.assertNumQueries(4):
+            first = self.client.get(url)
+        with self.assertNumQueries(3):
+            self.client.get(url, {'after': first.context['next_cursor']})
+        # busca: FTS já filtrado e paginado + cards, e o agregado das facetas (subselect no FTS)
+        with self.assertNumQueries(5):
+            self.client.get(url, {'q': 'consultor', 'after': listing.PAGE_SIZE})
+        with self.assertNumQueries(4):
+            self.client.get(url, {'q': 'consultor', 'after': listing.PAGE_SIZE})
+
+    def test_search_is_not_capped_by_search_limit(self):
+        seen, after = [], None
+        while True:
+            page = listing.search_page(listing.specialist_cards(), 'consultor', after=after, size=7)
+            seen += [spec.id for spec in page.items]
+            if page.next_cursor is None:
+                break
+            after = page.next_cursor
+        self.assertEqual(seen, search.search_ids('consultor', limit=len(self.specs)))
+        self.assertEqual(len(set(seen)), len(self.specs))
+
+        with mock.patch.object(search, 'search_ids', side_effect=AssertionError('lista limitada')):
+            counts = {facet['value']: facet['specialists'] for facet in facets.compute_facets('consultor')}
+        self.assertEqual(sum(counts.values()), len(self.specs))
+
+
+# --- FACETAS DA HOME ---
+@override_settings(STORAGES=SIMPLE_STORAGES)
+class FacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        tomorrow = date.today() + timedelta(days=1)
+        self.tech = [make_specialist(f'Dev{i}', description='python django') for i in range(3)]
+        self.health = make_specialist('Nutri', profession='Saúde e Bem-estar', description='nutrição')
+        make_specialist('Sem preço', price=None)
+        Appointment.objects.create(specialist=self.tech[0], date=tomorrow, time=time(9))
+        Appointment.objects.create(specialist=self.tech[0], date=tomorrow, time=time(10))
+        Appointment.objects.create(specialist=self.tech[1], date=date.today() - timedelta(days=1), time=time(9))
+
+    def counts(self, query=None):
+        return {f['value']: (f['specialists'], f['with_free_slots']) for f in facets.get_facets(query)}
+
+    def test_counts_follow_profession_choices_in_one_query(self):
+        with self.assertNumQueries(1):
+            result = facets.get_facets()
+        self.assertEqual([f['value'] for f in result], [v for v, _ in Profile.PROFISSOES_CHOICES])
+        counts = self.counts()
+        self.assertEqual(counts['Tecnologia e TI'], (3, 1))
+        self.assertEqual(counts['Saúde e Bem-estar'], (1, 0))
+        self.assertEqual(counts['Outros'], (0, 0))
+
+    def test_search_restricts_counts(self):
+        counts = self.counts('nutri')
+        self.assertEqual(counts['Saúde e Bem-estar'], (1, 0))
+        self.assertEqual(counts['Tecnologia e TI'], (0, 0))
+
+    def test_memo_is_invalidated_by_profile_and_appointment_changes(self):
+        self.counts()
+        with self.assertNumQueries(0):
+            self.counts()
+
+        Appointment.objects.create(specialist=self.health, date=date.today() + timedelta(days=2), time=time(9))
+        self.assertEqual(self.counts()['Saúde e Bem-estar'], (1, 1))
+
+        self.health.profession = 'Outros'
+        self.health.save()
+        counts = self.counts()
+        self.assertEqual(counts['Saúde e Bem-estar'], (0, 0))
+        self.assertEqual(counts['Outros'], (1, 1))
+
+        Appointment.objects.book(User.objects.create(username='c@test.com'), [self.health.appointments.get().pk])
+        self.assertEqual(self.counts()['Outros'], (1, 0))
+
+    def test_home_renders_counts(self):
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'category=Tecnologia%20e%20TI')
+        self.assertContains(response, '<span class="category-count">3</span>', html=True)
+
+
+# --- RESERVA ATÔMICA ---
+class BookingTests(TestCase):
+    def setUp(self):
+        self.spec = make_specialist('Agenda')
+        self.client_user = User.objects.create(username='cliente@test.com')
+        tomorrow = date.today() + timedelta(days=1)
+        self.slots = [
+            Appointment.objects.create(specialist=self.spec, date=tomorrow, time=time(9 + i))
+            for i in range(3)
+        ]
+
+    def test_book_is_all_or_nothing(self):
+        first, second, third = self.slots
+        self.assertTrue(Appointment.objects.book(self.client_user, [first.id]))
+
+        self.assertFalse(Appointment.objects.book(self.client_user, [first.id, second.id]))
+        second.refresh_from_db()
+        self.assertFalse(second.is_booked)
+
+        self.assertTrue(Appointment.objects.book(self.client_user, [second.id, third.id]))
+        self.assertEqual(Appointment.objects.filter(client=self.client_user).count(), 3)
+
+    def test_view_reports_taken_slot(self):
+        self.client.force_login(self.client_user)
+        slot = self.slots[0]
+        Appointment.objects.book(User.objects.create(username='outro@test.com'), [slot.id])
+
+        response = self.client.get(reverse('book_appointment', args=[slot.id]), follow=False)
+
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+        slot.refresh_from_db()
+        self.assertNotEqual(slot.client, self.client_user)
+        self.assertEqual(self.client.get(reverse('book_appointment', args=[999999])).status_code, 404)
+
+
+class BookingConcurrencyTests(TransactionTestCase):
+    def test_parallel_bookings_have_exactly_one_winner(self):
+        spec = make_specialist('Concorrido')
+        slot = Appointment.objects.create(specialist=spec, date=date.today(), time=time(10))
+        clients = [User(username=f'c{i}@test.com') for i in range(200)]
+        User.objects.bulk_create(clients)
+        clients = list(User.objects.filter(username__startswith='c', username__endswith='@test.com'))
+
+        def attempt(user):
+            try:
+                while True:
+                    try:
+                        return Appointment.objects.book(user, [slot.id])
+                    except OperationalError:
+                        # SQLite em memória (cache compartilhado) devolve "table is locked"
+                        # em vez de esperar; o PostgreSQL nunca cai aqui.
+                        continue
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            results = list(pool.map(attempt, clients))
+
+        self.assertEqual(results.count(True), 1)
+        slot.refresh_from_db()
+        self.assertTrue(slot.is_booked)
+        self.assertEqual(slot.client, clients[results.index(True)])
+
+
+# --- AGENDA RECORRENTE ---
+@override_settings(STORAGES=SIMPLE_STORAGES)
+class RecurringScheduleTests(TestCase):
+    def setUp(self):
+        self.spec = make_specialist('Recorrente')
+        self.client.force_login(self.spec.user)
+        self.start = date.today() + timedelta(days=1)
+
+    def post(self, days=90, **extra):
+        data = {
+            'start_date': self.start.isoformat(),
+            'end_date': (self.start + timedelta(days=days - 1)).isoformat(),
+            'weekdays': ['0', '2', '4'],
+            'start_time': '09:00',
+            'end_time': '12:00',
+            'slot_minutes': '60',
+            **extra,
+        }
+        return self.client.post(reverse('create_recurring_appointments'), data)
+
+    def expected_days(self, days=90, skip=()):
+        span = [self.start + timedelta(days=i) for i in range(days)]
+        return [d for d in span if d.weekday() in (0, 2, 4) and d not in skip]
+
+    def test_three_months_in_one_request(self):
+        # sessão + usuário/perfil + (contagem, insert em lote, contagem)
+        with self.assertNumQueries(5):
+            self.post()
+        self.assertEqual(Appointment.objects.filter(specialist=self.spec).count(), len(self.expected_days()) * 3)
+
+    def test_existing_slots_and_exceptions_are_skipped(self):
+        holiday = self.expected_days()[0]
+        Appointment.objects.create(specialist=self.spec, date=self.expected_days()[1], time=time(9))
+
+        self.post(exceptions=holiday.strftime('%d/%m/%Y'))
+
+        total = len(self.expected_days(skip=[holiday])) * 3
+        self.assertEqual(Appointment.objects.filter(specialist=self.spec).count(), total)
+        self.assertFalse(Appointment.objects.filter(specialist=self.spec, date=holiday).exists())
+
+    def test_range_is_capped(self):
+        self.post(days=400)
+        self.assertFalse(Appointment.objects.exists())
+
+
+# --- ÍNDICES DA AGENDA ---
+@override_settings(STORAGES=SIMPLE_STORAGES)
+class AppointmentIndexTests(TestCase):
+    def setUp(self):
+        self.spec = make_specialist('Indexado')
+        self.user = User.objects.create(username='indexado-cliente@test.com')
+
+    def assertUsesIndex(self, queryset, *index_names):
+        plan = queryset.explain()
+        self.assertTrue(any(name in plan for name in index_names), plan)
+        # Nada de ordenação extra: o índice já entrega (date, time) em ordem
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_hot_queries_use_composite_indexes(self):
+        today = date.today()
+        self.assertUsesIndex(
+            Appointment.objects.filter(specialist=self.spec, date__gte=today).order_by('date', 'time'),
+            # No SQLite a constraint vira o índice interno da tabela
+            'unique_specialist_slot', 'sqlite_autoindex_core_appointment',
+        )
+        self.assertUsesIndex(
+            Appointment.objects.filter(client=self.user, date__gte=today).order_by('date', 'time'),
+            'appt_client_date_idx',
+        )
+        self.assertUsesIndex(
+            Appointment.objects.filter(specialist=self.spec, is_booked=False, date__gte=today),
+            'appt_free_slots_idx',
+        )
+
+    def last_message(self, response):
+        # O painel não mostra as mensagens: elas se acumulam na sessão
+        return [str(message) for message in get_messages(response.wsgi_request)][-1]
+
+    def test_duplicate_slot_is_rejected_by_constraint(self):
+        self.client.force_login(self.spec.user)
+        data = {'date': (date.today() + timedelta(days=2)).isoformat(), 'time': '14:00'}
+        self.client.post(reverse('create_appointment'), data)
+        response = self.client.post(reverse('create_appointment'), data)
+        self.assertEqual(Appointment.objects.filter(specialist=self.spec).count(), 1)
+        self.assertEqual(self.last_message(response), 'Você já tem um horário liberado nesta data e hora.')
+
+    def test_missing_or_bad_date_and_time_are_validated(self):
+        self.client.force_login(self.spec.user)
+        response = self.client.post(reverse('create_appointment'), {'date': '', 'time': '14:00'})
+        self.assertEqual(self.last_message(response), 'Informe a data do horário.')
+        response = self.client.post(reverse('create_appointment'), {'date': '2030-01-01', 'time': '25:99'})
+        self.assertEqual(self.last_message(response), 'Hora inválida.')
+        self.assertFalse(Appointment.objects.filter(specialist=self.spec).exists())
+
+    def test_other_integrity_errors_are_not_reported_as_duplicates(self):
+        self.client.force_login(self.spec.user)
+        data = {'date': '2030-01-01', 'time': '14:00'}
+        with mock.patch.object(Appointment.objects, 'create', side_effect=IntegrityError('NOT NULL')):
+            with self.assertRaises(IntegrityError):
+                self.client.post(reverse('create_appointment'), data)
+
+
+# --- ARQUIVAMENTO ---
+class ArchiveTests(TestCase):
+    def setUp(self):
+        spec = make_specialist('Antigo')
+        today = date.today()
+        Appointment.objects.bulk_create(
+            [Appointment(specialist=spec, date=today - timedelta(days=d), time=time(9)) for d in range(1, 8)]
+            + [Appointment(specialist=spec, date=today, time=time(9))]
+        )
+
+    def test_moves_past_slots_to_archive_table(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            checkpoint = os.path.join(tmp, 'checkpoint.json')
+            call_command('archive_appointments', batch_size=3, checkpoint=checkpoint, stdout=StringIO())
+
+            self.assertEqual(Appointment.objects.count(), 1)
+            self.assertEqual(ArchivedAppointment.objects.count(), 7)
+            # Terminou: o checkpoint não prende a próxima execução
+            self.assertFalse(os.path.exists(checkpoint))
+
+    def test_checkpoint_resumes_only_the_same_cutoff(self):
+        today = date.today()
+        with tempfile.TemporaryDirectory() as tmp:
+            checkpoint = os.path.join(tmp, 'checkpoint.json')
+            # Interrompida depois do primeiro lote
+            run = archive.archive_appointments(before=today, batch_size=3, checkpoint=checkpoint)
+            next(run)
+            run.close()
+            with open(checkpoint) as fh:
+                self.assertEqual(json.load(fh)['before'], today.isoformat())
+            list(archive.archive_appointments(before=today, batch_size=3, checkpoint=checkpoint))
+            self.assertEqual(ArchivedAppointment.objects.count(), 7)
+
+            # O horário de hoje (id menor que os futuros) passa a ser arquivado com um corte novo
+            future = Appointment.objects.get()
+            Appointment.objects.create(specialist=future.specialist, date=today + timedelta(days=5), time=time(9))
+            # Checkpoint antigo esquecido (outro corte): ignorado
+            archive.save_checkpoint(checkpoint, today, 10 ** 9)
+            list(archive.archive_appointments(before=today + timedelta(days=1), batch_size=3, checkpoint=checkpoint))
+            self.assertTrue(ArchivedAppointment.objects.filter(pk=future.pk).exists())
+            self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_past_slots_skip_per_row_receivers(self):
+        with mock.patch.object(events.LocalBackend, 'publish') as publish, \
+                mock.patch.object(caching, 'bump_version') as bump:
+            with self.captureOnCommitCallbacks(execute=True):
+                list(archive.archive_appointments(batch_size=3))
+        self.assertEqual(ArchivedAppointment.objects.count(), 7)
+        publish.assert_not_called()
+        bump.assert_not_called()
+
+    def test_visible_slots_send_one_signal_per_batch(self):
+        received = []
+        handler = lambda sender, specialist_ids, **kwargs: received.append(specialist_ids)
+        appointments_changed.connect(handler)
+        self.addCleanup(appointments_changed.disconnect, handler)
+
+        list(archive.archive_appointments(before=date.today() + timedelta(days=1), batch_size=5))
+        self.assertEqual(received, [{ArchivedAppointment.objects.get(date=date.today()).specialist_id}])
+
+    def test_jsonl_output(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            call_command('archive_appointments', batch_size=5, output_dir=tmp, stdout=StringIO())
+
+            rows = []
+            for name in sorted(os.listdir(tmp)):
+                with gzip.open(os.path.join(tmp, name), 'rt') as fh:
+                    rows += [json.loads(line) for line in fh]
+            self.assertEqual(len(rows), 7)
+            self.assertEqual(len(os.listdir(tmp)), 2)
+            self.assertFalse(ArchivedAppointment.objects.exists())
+            self.assertEqual(Appointment.objects.count(), 1)
+
+
+# --- CACHE DA PÁGINA DO ESPECIALISTA ---
+@override_settings(STORAGES=SIMPLE_STORAGES)
+class SpecialistPageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        caching.reset_stats()
+        self.spec = make_specialist('Cacheado')
+        self.slot = Appointment.objects.create(specialist=self.spec, date=date.today(), time=time(15))
+        self.url = reverse('specialist_detail', args=[self.spec.id])
+
+    def agenda(self):
+        return caching.get_specialist_page(self.spec.id)['agenda_html']
+
+    def test_second_hit_skips_database(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertContains(response, 'Cacheado')
+        self.assertEqual(caching.stats(), {'hits': 1, 'misses': 1})
+
+    def test_generation_bumps_on_changes(self):
+        self.assertIn('Livre', self.agenda())
+
+        Appointment.objects.book(User.objects.create(username='c@test.com'), [self.slot.id])
+        self.assertIn('Ocupado', self.agenda())
+
+        Appointment.objects.create(specialist=self.spec, date=date.today(), time=time(16))
+        self.assertIn('16:00', self.agenda())
+
+        self.spec.price = 250
+        self.spec.save()
+        self.assertIn('250', caching.get_specialist_page(self.spec.id)['card_html'])
+
+        self.slot.delete()
+        self.assertNotIn('15:00', self.agenda())
+
+    def test_generation_bumps_again_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.slot.is_booked = True
+            self.slot.save()
+            # Um miss concorrente ainda vê o horário livre e guarda a página na geração nova
+            before_commit = caching.get_version(f'specialist:{self.spec.id}')
+        self.assertNotEqual(caching.get_version(f'specialist:{self.spec.id}'), before_commit)
+        self.assertIn('Ocupado', self.agenda())
+
+    def test_missing_profile_is_404(self):
+        self.assertEqual(self.client.get(reverse('specialist_detail', args=[999999])).status_code, 404)
+
+    def test_file_based_backend(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            backend = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': tmp}}
+            with override_settings(CACHES=backend):
+                self.assertIn('Livre', self.agenda())
+                self.slot.is_booked = True
+                self.slot.save()
+                self.assertIn('Ocupado', self.agenda())
+                self.assertEqual(caching.stats()['misses'], 2)
+
+    def test_suite_never_touches_the_site_cache(self):
+        location = settings.CACHES['default'].get('LOCATION', '')
+        self.assertNotEqual(os.path.realpath(location), os.path.realpath(settings.CACHE_DIR))
+
+    def test_stampede_builds_once(self):
+        def slow_build(specialist_id):
+            time_module.sleep(0.2)
+            return {'is_specialist': False}
+
+        with mock.patch.object(caching, 'build_specialist_page', side_effect=slow_build) as build:
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                list(pool.map(caching.get_specialist_page, [self.spec.id] * 8))
+        self.assertEqual(build.call_count, 1)
+        self.assertEqual(caching.stats(), {'hits': 7, 'misses': 1})
+
+
+# --- PERFIL NA REQUISIÇÃO ---
+@override_settings(STORAGES=SIMPLE_STORAGES)
+class RequestProfileTests(TestCase):
+    def test_new_users_get_a_profile(self):
+        user = User.objects.create_user(username='novo@test.com', password='x')
+        self.assertTrue(Profile.objects.filter(user=user).exists())
+
+    def test_dashboard_loads_user_and_profile_together(self):
+        make_specialist('Sugerido')
+        user = User.objects.create(username='painel@test.com')
+        Profile.objects.filter(user=user).update(has_active_plan=True)
+        self.client.force_login(user)
+
+        # Antes: sessão, usuário, get_or_create do perfil, carrossel, user.profile
+        # no template e agendamentos (6). Agora usuário + perfil saem num JOIN.
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['profile'].user, user)
+        self.assertTrue(response.context['profile'].has_active_plan)
+
+
+# --- MINIATURAS DAS FOTOS ---
+def make_jpeg(width, height):
+    image = Image.new('RGB', (width, height), 'steelblue')
+    exif = Image.Exif()
+    exif[0x010F] = 'CameraMaker'  # Make
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', exif=exif)
+    return buffer.getvalue()
+
+
+class PhotoRenditionTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=self.media.name, STORAGES=SIMPLE_STORAGES)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+        self.spec = make_specialist('Fotogenico')
+        self.spec.photo = SimpleUploadedFile('foto.jpg', make_jpeg(3000, 2000), content_type='image/jpeg')
+        self.spec.save()
+
+    def test_renditions_are_bounded_and_stripped(self):
+        renditions = images.process_profile_photo(self.spec.id, self.spec.photo.name)
+
+        self.assertEqual(renditions['widths'], list(images.RENDITION_WIDTHS))
+        self.spec.refresh_from_db()
+        self.assertEqual(self.spec.photo_renditions, renditions)
+
+        largest = images.rendition_name(renditions['hash'], 800, 'jpg')
+        with default_storage.open(largest) as fh, Image.open(fh) as rendition:
+            self.assertEqual(rendition.size, (800, 533))
+            self.assertEqual(len(rendition.getexif()), 0)
+        self.assertTrue(default_storage.exists(images.rendition_name(renditions['hash'], 64, 'webp')))
+
+    def test_portrait_and_small_photos_advertise_real_widths(self):
+        renditions = images.generate_renditions(make_jpeg(1000, 3000))
+        with default_storage.open(images.rendition_name(renditions['hash'], 800, 'jpg')) as fh, Image.open(fh) as rendition:
+            self.assertEqual(rendition.size, (800, 2400))
+
+        self.assertEqual(images.generate_renditions(make_jpeg(100, 50))['widths'], [64, 100])
+        self.assertEqual(images.generate_renditions(make_jpeg(40, 40))['widths'], [40])
+
+    def test_uploaded_original_is_stripped_and_bounded(self):
+        self.client.force_login(self.spec.user)
+        photo = SimpleUploadedFile('grande.png', make_jpeg(3000, 2000), content_type='image/jpeg')
+        with self.captureOnCommitCallbacks():
+            self.client.post(reverse('edit_profile'), {'profession': self.spec.profession, 'price': '100', 'photo': photo})
+
+        self.spec.refresh_from_db()
+        self.assertTrue(self.spec.photo.name.endswith('.jpg'))
+        with self.spec.photo.open('rb') as fh, Image.open(fh) as original:
+            self.assertEqual(original.size, (images.ORIGINAL_MAX_WIDTH, 1067))
+            self.assertEqual(len(original.getexif()), 0)
+
+    def test_replaced_photo_is_not_overwritten(self):
+        old_name = self.spec.photo.name
+        self.spec.photo = SimpleUploadedFile('nova.jpg', make_jpeg(100, 100), content_type='image/jpeg')
+        self.spec.save()
+
+        images.process_profile_photo(self.spec.id, old_name)
+
+        self.spec.refresh_from_db()
+        self.assertEqual(self.spec.photo_renditions, {})
+
+    def test_srcset_helper_and_backfill(self):
+        template = Template('{% load photos %}{% profile_photo spec "350px" "Foto" %}')
+        self.assertIn(self.spec.photo.url, template.render(Context({'spec': self.spec})))
+
+        call_command('generate_photo_renditions', workers=1, stdout=StringIO())
+
+        self.spec.refresh_from_db()
+        html = template.render(Context({'spec': self.spec}))
+        self.assertIn('type="image/webp"', html)
+        self.assertIn('-800.jpg 800w', html)
+        self.assertNotIn(self.spec.photo.url, html)
+
+
+# --- MÉTRICAS POR VIEW ---
+@override_settings(STORAGES=SIMPLE_STORAGES, REQUEST_METRICS=True, REQUEST_METRICS_QUERY_THRESHOLD=2)
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+        make_specialist('Medido')
+
+    def test_records_per_view_histograms(self):
+        self.client.get(reverse('home'))
+        self.client.get(reverse('home'))
+
+        stats = metrics.snapshot()['home']
+        self.assertEqual(stats['requests'], 2)
+        # a primeira calcula as facetas; a segunda já as encontra no memo
+        self.assertEqual(stats['queries']['buckets']['<=3'], 1)
+        self.assertEqual(stats['queries']['buckets']['<=5'], 1)
+        self.assertGreater(stats['render_ms']['max'], 0)
+        self.assertEqual(sum(stats['latency_ms']['buckets'].values()), 2)
+
+    def test_logs_requests_over_threshold(self):
+        user = User.objects.create(username='staff@test.com', is_staff=True)
+        self.client.force_login(user)
+
+        with self.assertLogs('core.middleware', 'WARNING') as logs:
+            self.client.get(reverse('dashboard'))
+        self.assertIn('dashboard', logs.output[0])
+
+        report = self.client.get(reverse('request_metrics')).json()
+        self.assertEqual(report['views']['dashboard']['over_query_threshold'], 1)
+
+    def test_report_is_staff_only(self):
+        self.client.force_login(User.objects.create(username='comum@test.com'))
+        self.assertEqual(self.client.get(reverse('request_metrics')).status_code, 302)
+
+
+# --- BENCHMARK ---
+@override_settings(STORAGES=SIMPLE_STORAGES)
+class BenchmarkSmokeTests(TestCase):
+    def test_dataset_and_scenarios(self):
+        dataset = bench.generate_dataset(clients=3, specialists=5, slots_per_specialist=4)
+
+        self.assertEqual(SearchDocument.objects.count(), 5)
+        self.assertEqual(Appointment.objects.count(), 20)
+        for name, scenario in bench.SCENARIOS.items():
+            result = bench.run_scenario(scenario, dataset, threads=1, requests=3)
+            self.assertEqual(result['errors'], 0, name)
+            self.assertEqual(result['requests'], 3, name)
+            self.assertGreater(result['queries_per_request'], 0, name)
+
+
+# --- EXPORTAÇÃO EM STREAMING ---
+@override_settings(STORAGES=SIMPLE_STORAGES)
+class ExportTests(TestCase):
+    def setUp(self):
+        self.spec = make_specialist('Exporta', profession='Engenharia e Arquitetura')
+        self.other = make_specialist('Outro')
+        self.client_user = User.objects.create(username='cli@test.com', email='cli@test.com', first_name='Cli')
+        start = date(2030, 1, 1)
+        for n in range(5):
+            Appointment.objects.create(specialist=self.spec, date=start + timedelta(days=n), time=time(9))
+        Appointment.objects.create(specialist=self.other, date=start, time=time(9))
+        Appointment.objects.book(self.client_user, [Appointment.objects.filter(specialist=self.spec).first().pk])
+
+    def test_specialist_exports_only_own_agenda_as_csv(self):
+        self.client.force_login(self.spec.user)
+        response = self.client.get(reverse('export_appointments'), {'from': '2030-01-02'})
+
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment;', response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,data,hora,reservado,especialista_id,especialista,profissao,cliente,cliente_email')
+        self.assertEqual(len(lines), 1 + 4)
+        self.assertTrue(all(',Exporta,Engenharia e Arquitetura,' in line for line in lines[1:]))
+
+    def test_csv_neutralizes_formulas(self):
+        User.objects.filter(pk=self.client_user.pk).update(first_name='=HYPERLINK("http://x")', email='@evil.com')
+        self.client.force_login(self.spec.user)
+        lines = b''.join(self.client.get(reverse('export_appointments')).streaming_content).decode().splitlines()
+        booked = next(line for line in lines if 'evil' in line)
+        self.assertIn('''"'=HYPERLINK(""http://x"")",'@evil.com''', booked)
+
+        response = self.client.get(reverse('export_appointments'), {'format': 'jsonl'})
+        records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertIn('@evil.com', [record['cliente_email'] for record in records])
+
+    def test_jsonl_resolves_joins_in_one_query(self):
+        self.client.force_login(self.spec.user)
+        response = self.client.get(reverse('export_appointments'), {'format': 'jsonl'})
+        with self.assertNumQueries(1):
+            records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+        self.assertEqual(len(records), 5)
+        self.assertEqual(records[0]['cliente_email'], 'cli@test.com')
+        self.assertEqual(records[0]['data'], '2030-01-01')
+        self.assertEqual(records[0]['hora'], '09:00')
+
+    def test_rejects_clients_and_bad_format(self):
+        self.client.force_login(self.client_user)
+        self.assertRedirects(self.client.get(reverse('export_appointments')), reverse('dashboard'))
+        self.client.force_login(self.spec.user)
+        self.assertEqual(self.client.get(reverse('export_appointments'), {'format': 'xlsx'}).status_code, 400)
+
+    async def test_asgi_streams_async_iterator(self):
+        await self.async_client.aforce_login(self.spec.user)
+        response = await self.async_client.get(reverse('export_appointments'))
+        self.assertTrue(response.is_async)
+        lines = b''.join([chunk async for chunk in response.streaming_content]).decode().splitlines()
+        self.assertEqual(len(lines), 1 + 5)
+
+    def test_admin_action_streams_selection(self):
+        admin_user = User.objects.create(username='admin@test.com', is_staff=True, is_superuser=True)
+        self.client.force_login(admin_user)
+        selected = Appointment.objects.filter(specialist=self.other).values_list('pk', flat=True)
+        response = self.client.post(
+            reverse('admin:core_appointment_changelist'),
+            {'action': 'export_csv', '_selected_action': [str(pk) for pk in selected]},
+        )
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn(',Outro,', lines[1])
+
+
+# --- IMPORTAÇÃO EM LOTE ---
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ImportUsersTests(TestCase):
+    CSV = (
+        'email,name,password,user_type,profession,description,price\n'
+        'Ana@Clinica.com,Ana,segredo1,specialist,Saúde e Bem-estar,nutrição esportiva,150\n'
+        'bruno@clinica.com,Bruno,,client,,,\n'
+        'ana@clinica.com,Ana de novo,x,specialist,,,\n'
+        'existente@test.com,Existente,x,client,,,\n'
+        'sem-arroba,Inválido,x,client,,,\n'
+        'carla@clinica.com,Carla,x,specialist,Astrologia,,\n'
+        'diego@clinica.com,Diego,x,specialist,Tecnologia e TI,django,abc\n'
+    )
+
+    def setUp(self):
+        accounts.clear_group_ids()
+        User.objects.create(username='existente@test.com')
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'usuarios.csv')
+        with open(self.path, 'w', encoding='utf-8') as fh:
+            fh.write(self.CSV)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_import(self, path, **options):
+        out, err = StringIO(), StringIO()
+        call_command('import_users', path, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_imports_valid_rows_and_reports_rejected(self):
+        out, err = self.run_import(self.path, workers=1)
+
+        self.assertIn('2 importados, 5 rejeitados', out)
+        self.assertIn('linha 4: ana@clinica.com: email repetido no arquivo', err)
+        self.assertIn('linha 5: existente@test.com: email já cadastrado', err)
+        self.assertIn('linha 6: sem-arroba: email inválido', err)
+        self.assertIn('profissão fora da lista: Astrologia', err)
+        self.assertIn('preço inválido: abc', err)
+
+        ana = User.objects.select_related('profile').get(username='ana@clinica.com')
+        self.assertEqual(ana.first_name, 'Ana')
+        self.assertTrue(ana.check_password('segredo1'))
+        self.assertTrue(ana.profile.is_specialist)
+        self.assertEqual(ana.profile.price, 150)
+        self.assertEqual(list(ana.groups.values_list('name', flat=True)), ['Especialistas'])
+        self.assertEqual(search.search_ids('nutricao'), [ana.profile.pk])
+
+        bruno = User.objects.get(username='bruno@clinica.com')
+        self.assertFalse(bruno.has_usable_password())
+        self.assertFalse(bruno.profile.is_specialist)
+        self.assertEqual(list(bruno.groups.values_list('name', flat=True)), ['Clientes'])
+
+    def test_batch_insert_does_not_grow_with_rows(self):
+        rows = [(n, {'email': f'spec{n}@lote.com', 'user_type': 'specialist', 'name': f'S{n}'}) for n in range(50)]
+        groups = accounts.get_group_ids()
+        # checagem de existentes + usuários + perfis + grupos + busca (+ savepoint)
+        with self.assertNumQueries(7):
+            result = importer.import_batch(rows, groups)
+        self.assertEqual(result.created, 50)
+        self.assertEqual(Profile.objects.filter(is_specialist=True).count(), 50)
+
+    def test_existing_email_matches_without_case(self):
+        User.objects.create(username='Foo@X.com', email='Foo@X.com')
+        rows = [(2, {'email': 'foo@x.com'}), (3, {'email': 'bar@x.com'})]
+        result = importer.import_batch(rows, accounts.get_group_ids())
+        self.assertEqual(result.created, 1)
+        self.assertEqual(result.errors, [(2, 'foo@x.com', 'email já cadastrado')])
+        self.assertTrue(User.objects.filter(username='bar@x.com').exists())
+
+    def test_non_text_values_reject_only_that_line(self):
+        rows = [
+            (1, {'email': 'num@x.com', 'name': 123}),
+            (2, {'email': ['lista@x.com']}),
+            (3, {'email': 'senha@x.com', 'password': 42}),
+            (4, {'email': 'preco@x.com', 'user_type': 'specialist', 'price': 'NaN'}),
+            (5, {'email': 'ok@x.com', 'name': 'Ok'}),
+        ]
+        result = importer.import_batch(rows, accounts.get_group_ids())
+        self.assertEqual(result.created, 1)
+        self.assertEqual([(line, reason) for line, _, reason in result.errors], [
+            (1, 'name deve ser texto'), (2, 'email deve ser texto'),
+            (3, 'password deve ser texto'), (4, 'preço inválido: NaN'),
+        ])
+
+    def test_existing_emails_are_not_hashed(self):
+        rows = [(2, {'email': 'existente@test.com', 'password': 'x'}), (3, {'email': 'novo@x.com', 'password': 'y'})]
+        with mock.patch.object(importer, 'hash_passwords', wraps=importer.hash_passwords) as hashed:
+            importer.import_batch(rows, accounts.get_group_ids())
+        self.assertEqual(hashed.call_args.args[0], ['y'])
+
+    def test_signup_racing_the_batch_is_reported_per_row(self):
+        # Conta criada entre a checagem e o INSERT: o lote não aborta
+        User.objects.create(username='Corrida@X.com', email='Corrida@X.com')
+        rows = [(2, {'email': 'corrida@x.com'}), (3, {'email': 'outro@x.com'})]
+        with mock.patch.object(importer, 'existing_emails', return_value=set()):
+            result = importer.import_batch(rows, accounts.get_group_ids())
+        self.assertEqual(result.created, 1)
+        self.assertEqual(result.errors, [(2, 'corrida@x.com', 'email já cadastrado')])
+        self.assertTrue(User.objects.filter(username='outro@x.com').exists())
+
+    def test_jsonl_with_process_pool(self):
+        path = os.path.join(self.tmp.name, 'usuarios.jsonl')
+        with open(path, 'w', encoding='utf-8') as fh:
+            for n in range(10):
+                fh.write(json.dumps({'email': f'p{n}@pool.com', 'password': f'senha{n}'}) + '\n')
+            fh.write('não é json\n')
+
+        out, err = self.run_import(path, workers=2, batch_size=4)
+        self.assertIn('10 importados, 1 rejeitados', out)
+        self.assertIn('linha 11: -: linha não é um objeto JSON', err)
+        self.assertTrue(User.objects.get(username='p7@pool.com').check_password('senha7'))
+
+
+# --- CADASTRO ---
+@override_settings(STORAGES=SIMPLE_STORAGES, PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class SignupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        accounts.clear_group_ids()
+
+    def signup(self, email='novo@test.com', user_type='client', name='Novo'):
+        return self.client.post(reverse('login'), {
+            'email': email, 'name': name, 'password': 'segredo123', 'confirm_password': 'segredo123',
+            'user_type': user_type,
+        })
+
+    def test_create_account_is_one_insert_per_table(self):
+        accounts.get_group_ids()
+        # savepoint + usuário + perfil + grupo + release (antes: exists, get_or_create, UPDATEs...)
+        with self.assertNumQueries(5):
+            accounts.create_account('cli@test.com', 'segredo123', name='Cli')
+        self.assertEqual(User.objects.get(username='cli@test.com').groups.get().name, 'Clientes')
+
+    def test_signup_is_a_handful_of_queries(self):
+        accounts.get_group_ids()
+        # 6 do cadastro (com o documento de busca) + 8 do login/sessão do Django; eram 27
+        with self.assertNumQueries(14):
+            response = self.signup(user_type='specialist', name='Spec')
+        self.assertRedirects(response, reverse('edit_profile'), fetch_redirect_response=False)
+
+        user = User.objects.select_related('profile').get(username='novo@test.com')
+        self.assertEqual(user.first_name, 'Spec')
+        self.assertTrue(user.profile.is_specialist)
+        self.assertEqual(list(user.groups.values_list('name', flat=True)), ['Especialistas'])
+        self.assertTrue(SearchDocument.objects.filter(profile=user.profile).exists())
+
+    def test_duplicate_email_is_rejected_by_the_database(self):
+        self.signup(email='dup@test.com')
+        self.client.logout()
+        response = self.signup(email='DUP@test.com')
+        self.assertContains(response, 'Este email já está cadastrado.')
+        self.assertEqual(User.objects.filter(email__iexact='dup@test.com').count(), 1)
+
+    def test_stale_group_id_is_refetched_not_reported_as_duplicate(self):
+        accounts.get_group_ids()
+        create = User.groups.through.objects.create
+        calls = []
+
+        def stale_once(**kwargs):
+            calls.append(kwargs['group_id'])
+            if len(calls) == 1:
+                raise IntegrityError('FOREIGN KEY constraint failed')
+            return create(**kwargs)
+
+        with mock.patch.object(User.groups.through.objects, 'create', side_effect=stale_once), \
+                mock.patch.object(accounts, 'clear_group_ids', wraps=accounts.clear_group_ids) as cleared:
+            response = self.signup(email='grupo@test.com')
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+        cleared.assert_called_once()
+        self.assertEqual(User.objects.get(username='grupo@test.com').groups.get().name, 'Clientes')
+
+    def test_other_integrity_errors_use_the_generic_message(self):
+        with mock.patch.object(User.groups.through.objects, 'create', side_effect=IntegrityError('CHECK')):
+            with self.assertLogs('core.views', 'ERROR'):
+                response = self.signup(email='check@test.com')
+        self.assertContains(response, 'Erro ao criar conta.')
+        self.assertNotContains(response, 'Este email já está cadastrado.')
+
+    def test_failure_leaves_no_half_created_user(self):
+        with mock.patch.object(User.groups.through.objects, 'create', side_effect=RuntimeError('falhou')):
+            with self.assertLogs('core.views', 'ERROR') as logs:
+                response = self.signup(email='metade@test.com')
+        self.assertIn('metade@test.com', logs.output[0])
+        self.assertContains(response, 'Erro ao criar conta.')
+        self.assertFalse(User.objects.filter(username='metade@test.com').exists())
+        self.assertFalse(Profile.objects.filter(user__username='metade@test.com').exists())
+
+
+# --- HASH DE SENHAS E LIMITE DE LOGIN ---
+@override_settings(
+    STORAGES=SIMPLE_STORAGES,
+    PASSWORD_HASHERS=['core.hashers.PBKDF2PasswordHasher', 'core.hashers.ScryptPasswordHasher'],
+    PASSWORD_PBKDF2_ITERATIONS=1000,
+    PASSWORD_SCRYPT_WORK_FACTOR=2 ** 10,
+)
+class PasswordHashingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='login@test.com')
+        self.user.set_password('segredo123')
+        self.user.save()
+
+    def login(self, password='segredo123', email='login@test.com'):
+        return self.client.post(reverse('login'), {'email': email, 'password': password})
+
+    def test_cost_comes_from_settings(self):
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+        with self.settings(PASSWORD_PBKDF2_ITERATIONS=2000):
+            self.assertTrue(get_hasher().must_update(self.user.password))
+        with self.settings(PASSWORD_HASHERS=['core.hashers.ScryptPasswordHasher']):
+            self.assertTrue(make_password('x').startswith('scrypt$1024$'))
+
+    def test_login_rehashes_legacy_hash_after_the_response(self):
+        with self.settings(PASSWORD_HASHERS=['core.hashers.ScryptPasswordHasher', 'core.hashers.PBKDF2PasswordHasher']):
+            with mock.patch.object(hashers, 'get_executor') as get_executor:
+                with self.captureOnCommitCallbacks(execute=True):
+                    response = self.login()
+            self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+            self.user.refresh_from_db()
+            self.assertTrue(self.user.password.startswith('pbkdf2_sha256$'))
+
+            _, user_id, old_encoded, raw = get_executor.return_value.submit.call_args.args
+            self.assertTrue(hashers.rehash_password(user_id, old_encoded, raw))
+            self.user.refresh_from_db()
+            self.assertTrue(self.user.password.startswith('scrypt$1024$'))
+            self.assertTrue(self.user.check_password('segredo123'))
+            # Senha trocada nesse meio tempo: não sobrescreve
+            self.assertFalse(hashers.rehash_password(user_id, old_encoded, raw))
+
+    def test_sessions_from_model_backend_survive(self):
+        self.client.force_login(self.user, backend='django.contrib.auth.backends.ModelBackend')
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['user'], self.user)
+
+    def test_failed_login_hashes_only_once(self):
+        with mock.patch('django.contrib.auth.backends.ModelBackend.authenticate') as fallback:
+            self.assertEqual(self.login(password='errada').status_code, 200)
+            self.assertEqual(self.login(email='ninguem@test.com').status_code, 200)
+        fallback.assert_not_called()
+
+    @override_settings(LOGIN_RATE_LIMIT=3)
+    def test_rate_limit_per_email(self):
+        for _ in range(3):
+            self.assertEqual(self.login(password='errada').status_code, 200)
+        response = self.login()
+        self.assertEqual(response.status_code, 429)
+        self.assertContains(response, 'Muitas tentativas', status_code=429)
+
+    def test_client_ip_from_trusted_proxy_header(self):
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='6.6.6.6, 203.0.113.7')
+        self.assertEqual(throttle.client_ip(request), '10.0.0.1')
+        with override_settings(TRUSTED_PROXY_HEADER='HTTP_X_FORWARDED_FOR'):
+            # O primeiro endereço veio do próprio cliente: vale o que o proxy acrescentou
+            self.assertEqual(throttle.client_ip(request), '203.0.113.7')
+            with override_settings(TRUSTED_PROXY_COUNT=2):
+                self.assertEqual(throttle.client_ip(request), '6.6.6.6')
+            with override_settings(TRUSTED_PROXY_COUNT=3):
+                self.assertEqual(throttle.client_ip(request), '10.0.0.1')
+
+    @override_settings(LOGIN_HASH_WAIT=0)
+    def test_concurrency_limit_rejects_when_all_slots_are_busy(self):
+        slots = threading.BoundedSemaphore(1)
+        slots.acquire()
+        with mock.patch.object(throttle, '_slots', slots):
+            response = self.login()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+        slots.release()
+        self.assertEqual(self.login().status_code, 302)
+
+    def test_calibration_reports_throughput(self):
+        out = StringIO()
+        call_command('calibrate_hashers', target_ms=5, samples=1, workers=1, algorithms='pbkdf2', stdout=out)
+        self.assertIn('hashes/s por núcleo', out.getvalue())
+        self.assertIn('PASSWORD_PBKDF2_ITERATIONS=', out.getvalue())
+
+
+# --- BANCO: SQLITE EM WAL E ROTEAMENTO PARA A RÉPLICA ---
+class DatabaseConfigTests(TestCase):
+    def test_sqlite_file_runs_in_wal_with_busy_timeout(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            default = connections['default']
+            settings_dict = dict(default.settings_dict, NAME=os.path.join(tmp, 'wal.sqlite3'))
+            wrapper = default.__class__(settings_dict, alias='wal_check')
+            try:
+                with wrapper.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode')
+                    self.assertEqual(cursor.fetchone()[0], 'wal')
+                    cursor.execute('PRAGMA busy_timeout')
+                    self.assertEqual(cursor.fetchone()[0], settings.SQLITE_BUSY_TIMEOUT * 1000)
+            finally:
+                wrapper.close()
+
+    def test_router_sends_only_catalogue_reads_to_replica(self):
+        router = routers.ReplicaRouter()
+        databases = dict(settings.DATABASES, replica=settings.DATABASES['default'])
+        with mock.patch.object(settings, 'DATABASES', databases):
+            self.assertIsNone(router.db_for_read(Profile))
+            with routers.replica_reads():
+                self.assertEqual(router.db_for_read(Profile), 'replica')
+                self.assertIsNone(router.db_for_read(User))
+                with routers.primary_reads():
+                    self.assertIsNone(router.db_for_read(Profile))
+            self.assertEqual(router.db_for_write(Profile), 'default')
+            self.assertFalse(router.allow_migrate('replica', 'core'))
+
+
+# --- RÉPLICA DE LEITURA (dois arquivos SQLite) ---
+@override_settings(STORAGES=SIMPLE_STORAGES)
+class ReplicaRoutingTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.spec = make_specialist('Antigo')
+        self.slot = Appointment.objects.create(specialist=self.spec, date=date.today() + timedelta(days=1), time=time(9))
+        self.client_user = User.objects.create(username='leitor@test.com')
+
+        # A "réplica" é uma cópia do banco neste instante; o primário muda depois
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, 'replica.sqlite3')
+        with connection.cursor() as cursor:
+            cursor.execute('VACUUM INTO %s', [path])
+        connections.settings[routers.REPLICA] = dict(connections['default'].settings_dict, NAME=path)
+        self.addCleanup(self.drop_replica)
+        patcher = mock.patch.object(settings, 'DATABASES', dict(settings.DATABASES, replica=connections.settings['replica']))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.spec.user.first_name = 'Atualizado'
+        self.spec.user.save()
+
+    def drop_replica(self):
+        connections[routers.REPLICA].close()
+        del connections[routers.REPLICA]
+        del connections.settings[routers.REPLICA]
+
+    def test_catalogue_reads_replica_until_the_session_writes(self):
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'Antigo')
+        self.assertNotIn(routers.STICKY_COOKIE, response.cookies)
+
+        self.client.force_login(self.client_user)
+        response = self.client.get(reverse('book_appointment', args=[self.slot.id]))
+        self.assertIn(routers.STICKY_COOKIE, response.cookies)
+        self.assertEqual(response.cookies[routers.STICKY_COOKIE]['max-age'], settings.REPLICA_STICKY_SECONDS)
+
+        # Logo depois de gravar: primário (vê o próprio dado)
+        self.assertContains(self.client.get(reverse('home')), 'Atualizado')
+
+        # Janela expirada: volta para a réplica
+        self.client.cookies[routers.STICKY_COOKIE] = '0'
+        self.assertContains(self.client.get(reverse('home')), 'Antigo')
+
+    def test_writes_always_go_to_primary(self):
+        self.client.force_login(self.client_user)
+        self.client.get(reverse('book_appointment', args=[self.slot.id]))
+        self.assertTrue(Appointment.objects.using('default').get(pk=self.slot.pk).is_booked)
+        self.assertFalse(Appointment.objects.using(routers.REPLICA).get(pk=self.slot.pk).is_booked)
+
+
+# --- GET CONDICIONAL (ETag / Last-Modified) ---
+@override_settings(STORAGES=SIMPLE_STORAGES)
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.spec = make_specialist('Condicional', description='consultoria')
+        self.slot = Appointment.objects.create(specialist=self.spec, date=date.today() + timedelta(days=1), time=time(9))
+
+    def revalidate(self, url, response, **params):
+        return self.client.get(url, params, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_home_returns_304_without_rendering(self):
+        url = reverse('home')
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('Last-Modified', first)
+        self.assertEqual(first['Cache-Control'], 'public, max-age=0, s-maxage=0')
+        self.assertIn('Cookie', first['Vary'])
+
+        # só os dois agregados do validador; nada de template
+        with self.assertNumQueries(2):
+            second = self.revalidate(url, first)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.content, b'')
+        self.assertEqual(second.templates, [])
+
+        # outros parâmetros, outro ETag
+        self.assertEqual(self.revalidate(url, first, category='Outros').status_code, 200)
+
+    def test_home_etag_follows_profiles_and_bookings(self):
+        url = reverse('home')
+        first = self.client.get(url)
+        Appointment.objects.book(User.objects.create(username='c@test.com'), [self.slot.pk])
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+        second = self.client.get(url)
+        self.spec.user.first_name = 'Renomeado'
+        self.spec.user.save()
+        self.assertEqual(self.revalidate(url, second).status_code, 200)
+
+    def test_specialist_page_etag_sees_deleted_slots(self):
+        url = reverse('specialist_detail', args=[self.spec.pk])
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.revalidate(url, first).status_code, 304)
+
+        self.slot.delete()
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+    def test_authenticated_pages_are_private_and_per_user(self):
+        url = reverse('specialist_detail', args=[self.spec.pk])
+        anonymous = self.client.get(url)
+        self.client.force_login(User.objects.create(username='logado@test.com', first_name='Logado'))
+        response = self.client.get(url)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+        self.assertNotEqual(response['ETag'], anonymous['ETag'])
+        self.assertEqual(self.revalidate(url, response).status_code, 304)
+
+
+@override_settings(STORAGES=SIMPLE_STORAGES)
+class TemplateFragmentTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.spec = make_specialist('Fragmento', description='descrição original')
+
+    def test_css_comes_from_static_bundles(self):
+        response = self.client.get(reverse('home'))
+        self.assertNotContains(response, '<style>')
+        self.assertContains(response, 'css/base.css')
+        self.assertContains(response, 'css/home.css')
+
+    def test_specialist_card_is_cached_until_profile_changes(self):
+        url = reverse('home')
+        self.assertContains(self.client.get(url), 'descrição original')
+
+        # Sem tocar o updated_at a chave do fragmento é a mesma: card vem do cache
+        Profile.objects.filter(pk=self.spec.pk).update(description='descrição nova')
+        self.assertContains(self.client.get(url), 'descrição original')
+
+        # save() muda o updated_at (versão do perfil): card novo
+        self.spec.refresh_from_db()
+        self.spec.save()
+        self.assertContains(self.client.get(url), 'descrição nova')
+
+    def test_name_change_refreshes_card(self):
+        url = reverse('home')
+        self.client.get(url)
+        user = self.spec.user
+        user.first_name = 'Renomeado'
+        user.save()
+        self.assertContains(self.client.get(url), 'Renomeado')
+
+
+@override_settings(STORAGES=SIMPLE_STORAGES)
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.spec = make_specialist('Assincrono', description='atende rápido')
+        tomorrow = date.today() + timedelta(days=1)
+        self.free = Appointment.objects.create(specialist=self.spec, date=tomorrow, time=time(10))
+        Appointment.objects.create(specialist=self.spec, date=tomorrow, time=time(9), is_booked=True)
+        Appointment.objects.create(specialist=self.spec, date=date.today() - timedelta(days=1), time=time(9))
+
+    def async_request(self, path, user=None, **headers):
+        # O que o AuthenticationMiddleware deixaria no request
+        request = AsyncRequestFactory().get(path, headers=headers)
+
+        async def auser():
+            return user or AnonymousUser()
+        request.auser = auser
+        return request
+
+    async def test_availability_lists_only_free_future_slots(self):
+        response = await self.async_client.get(reverse('specialist_availability', args=[self.spec.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'specialist': self.spec.pk,
+            'total': 1,
+            'slots': [{'id': self.free.pk, 'date': self.free.date.isoformat(), 'time': '10:00'}],
+        })
+
+    async def test_availability_caps_slots_and_counts_the_rest(self):
+        with mock.patch.object(async_views, 'AVAILABILITY_LIMIT', 1):
+            await Appointment.objects.acreate(specialist=self.spec, date=self.free.date, time=time(11))
+            data = (await self.async_client.get(reverse('specialist_availability', args=[self.spec.pk]))).json()
+        self.assertEqual(len(data['slots']), 1)
+        self.assertEqual(data['total'], 2)
+
+    async def test_availability_404_for_non_specialist(self):
+        client = await User.objects.acreate(username='cliente@test.com')
+        profile = await Profile.objects.aget(user=client)
+        response = await self.async_client.get(reverse('specialist_availability', args=[profile.pk]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_async_home_renders_and_revalidates(self):
+        response = await async_views.home(self.async_request('/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Assincrono')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=0, s-maxage=0')
+
+        again = await async_views.home(self.async_request('/', If_None_Match=response['ETag']))
+        self.assertEqual(again.status_code, 304)
+
+    async def test_async_home_search_and_category(self):
+        response = await async_views.home(self.async_request('/?q=rapido'))
+        self.assertContains(response, 'Assincrono')
+        response = await async_views.home(self.async_request('/?category=Outros'))
+        self.assertNotContains(response, 'Assincrono')
+
+    async def test_async_specialist_page_for_logged_user(self):
+        user = await User.objects.select_related('profile').aget(username='assincrono@test.com')
+        response = await async_views.specialist_detail_view(self.async_request('/', user=user), self.spec.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'atende rápido')
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+    def test_middleware_runs_without_thread_in_async_stack(self):
+        async def get_response(request):
+            return HttpResponse('ok')
+
+        self.assertTrue(iscoroutinefunction(ProfileMiddleware(get_response)))
+        self.assertTrue(iscoroutinefunction(StaticFilesMiddleware(get_response)))
+        self.assertFalse(iscoroutinefunction(StaticFilesMiddleware(lambda request: HttpResponse('ok'))))
+
+
+@override_settings(STORAGES=SIMPLE_STORAGES)
+class SlotEventTests(TestCase):
+    def setUp(self):
+        self.spec = make_specialist('AoVivo')
+        self.tomorrow = date.today() + timedelta(days=1)
+
+    async def test_fan_out_only_reaches_that_specialist(self):
+        first, second = events.subscribe(1), events.subscribe(1)
+        other = events.subscribe(2)
+        try:
+            events.broadcaster.deliver(1, {'type': 'booked', 'id': 10})
+            self.assertEqual(await first.get(), {'type': 'booked', 'id': 10})
+            self.assertEqual(await second.get(), {'type': 'booked', 'id': 10})
+            self.assertTrue(other.queue.empty())
+        finally:
+            for subscription in (first, second, other):
+                events.unsubscribe(subscription)
+        self.assertEqual(events.broadcaster.subscribers(1), 0)
+
+    async def test_slow_reader_is_disconnected(self):
+        subscription = events.subscribe(1)
+        try:
+            for n in range(events.QUEUE_SIZE + 1):
+                subscription.offer({'type': 'booked', 'id': n})
+            self.assertIsNone(await subscription.get())
+        finally:
+            events.unsubscribe(subscription)
+
+    async def test_postgres_backend_delivers_notify_payload(self):
+        with mock.patch.object(events.threading, 'Thread'):
+            backend = events.PostgresBackend(events.broadcaster)
+        subscription = events.broadcaster.subscribe(self.spec.pk)
+        try:
+            backend.dispatch(backend.encode(self.spec.pk, {'type': 'booked', 'id': 7}))
+            self.assertEqual(await subscription.get(), {'type': 'booked', 'id': 7})
+        finally:
+            events.unsubscribe(subscription)
+
+    def test_signals_publish_after_commit(self):
+        with mock.patch.object(events.LocalBackend, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                slot = Appointment.objects.create(specialist=self.spec, date=self.tomorrow, time=time(9))
+                publish.assert_not_called()
+            publish.assert_called_with(
+                self.spec.pk, {'type': 'freed', 'id': slot.pk, 'date': self.tomorrow.isoformat(), 'time': '09:00'},
+            )
+
+            with self.captureOnCommitCallbacks(execute=True):
+                Appointment.objects.book(User.objects.create(username='c@test.com'), [slot.pk])
+            publish.assert_called_with(self.spec.pk, {'type': 'booked', 'id': slot.pk})
+
+            slot_id = slot.pk
+            with self.captureOnCommitCallbacks(execute=True):
+                slot.delete()
+            publish.assert_called_with(self.spec.pk, {'type': 'removed', 'id': slot_id})
+
+    def test_recurring_schedule_announces_change(self):
+        with mock.patch.object(events.LocalBackend, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                create_recurring_slots(
+                    self.spec, start_date=self.tomorrow, end_date=self.tomorrow + timedelta(days=6),
+                    weekdays=[self.tomorrow.weekday()], start_time=time(9), end_time=time(11), slot_minutes=60,
+                )
+        publish.assert_called_once_with(self.spec.pk, {'type': 'changed'})
+
+    def test_sync_deployment_answers_no_content(self):
+        response = self.client.get(reverse('specialist_events', args=[self.spec.pk]))
+        self.assertEqual(response.status_code, 204)
+
+    @override_settings(ASYNC_VIEWS=True, SLOT_EVENTS_HEARTBEAT=0.01)
+    async def test_stream_sends_events_and_unsubscribes_on_disconnect(self):
+        request = AsyncRequestFactory().get(reverse('specialist_events', args=[self.spec.pk]))
+        response = await async_views.slot_events_view(request, self.spec.pk)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+
+        self.assertEqual(await anext(stream), b'retry: 5000\n\n')
+        self.assertEqual(events.broadcaster.subscribers(self.spec.pk), 1)
+        self.assertEqual(await anext(stream), b': ping\n\n')
+
+        events.get_backend().publish(self.spec.pk, {'type': 'booked', 'id': 7})
+        chunk = await anext(stream)
+        while chunk == b': ping\n\n':
+            chunk = await anext(stream)
+        self.assertEqual(chunk, b'event: booked\ndata: {"id": 7}\n\n')
+
+        # Cliente desconecta: o ASGIHandler cancela a tarefa que consome o stream
+        with override_settings(SLOT_EVENTS_HEARTBEAT=60):
+            task = asyncio.ensure_future(anext(stream))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+        self.assertEqual(events.broadcaster.subscribers(self.spec.pk), 0)
+
+    async def test_stream_404_for_unknown_specialist(self):
+        request = AsyncRequestFactory().get('/')
+        with override_settings(ASYNC_VIEWS=True):
+            with self.assertRaises(Http404):
+                await async_views.slot_events_view(request, 999999)
+
+
+# --- API DE DISPONIBILIDADE (intervalo de datas, mapa de bits por dia com ids) ---
+@override_settings(STORAGES=SIMPLE_STORAGES)
+class AvailabilityApiTests(TestCase):
+    def setUp(self):
+        self.ana = make_specialist('Ana')
+        self.bia = make_specialist('Bia')
+        self.day = date.today() + timedelta(days=1)
+        self.ana_slots = {
+            hhmm: Appointment.objects.create(specialist=self.ana, date=self.day, time=time(*map(int, hhmm.split(':')))).pk
+            for hhmm in ('09:00', '09:30', '14:00')
+        }
+        Appointment.objects.create(specialist=self.ana, date=self.day, time=time(10), is_booked=True)
+        Appointment.objects.create(specialist=self.ana, date=self.day + timedelta(days=10), time=time(8))
+        self.bia_slot = Appointment.objects.create(specialist=self.bia, date=self.day + timedelta(days=2), time=time(23, 30))
+
+    def get(self, **params):
+        return self.client.get(reverse('availability_api'), params)
+
+    def test_many_specialists_in_one_query(self):
+        ids = f'{self.ana.pk},{self.bia.pk}'
+        with self.assertNumQueries(2):  # página de especialistas + horários livres
+            response = self.get(specialists=ids)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['start'], date.today().isoformat())
+        self.assertEqual(data['end'], (date.today() + timedelta(days=6)).isoformat())
+        self.assertIsNone(data['next'])
+
+        ana, bia = data['specialists']
+        self.assertEqual(ana['id'], self.ana.pk)
+        # Reservado e fora da semana não aparecem
+        self.assertEqual(list(ana['days']), [self.day.isoformat()])
+        ana_day = ana['days'][self.day.isoformat()]
+        self.assertEqual(ana_day['step'], 30)
+        self.assertEqual(availability.decode(ana_day), [(pk, hhmm) for hhmm, pk in self.ana_slots.items()])
+        bia_day = (self.day + timedelta(days=2)).isoformat()
+        self.assertEqual(bia['days'], {bia_day: {'step': 30 * 47, 'bits': '2', 'ids': [self.bia_slot.pk]}})
+
+    def test_off_grid_times_are_exact(self):
+        other = self.day + timedelta(days=1)
+        created = [
+            (Appointment.objects.create(specialist=self.ana, date=other, time=time(*hm)).pk, f'{hm[0]:02d}:{hm[1]:02d}')
+            for hm in ((9, 0), (9, 15), (9, 45), (10, 10))
+        ]
+        day = self.get(specialists=self.ana.pk).json()['specialists'][0]['days'][other.isoformat()]
+        self.assertEqual(day['step'], 5)
+        self.assertEqual(availability.decode(day), created)
+
+    def test_range_and_ids_are_validated(self):
+        too_long = date.today() + timedelta(days=availability.MAX_DAYS)
+        self.assertEqual(self.get(end=too_long.isoformat()).status_code, 400)
+        self.assertEqual(self.get(start='2024-02-30').status_code, 400)
+        self.assertEqual(self.get(start=self.day.isoformat(), end=date.today().isoformat()).status_code, 400)
+        self.assertEqual(self.get(specialists='1,x').status_code, 400)
+        self.assertIn('error', self.get(after='abc').json())
+
+    def test_past_start_is_clamped_to_today(self):
+        data = self.get(specialists=self.ana.pk, start=(date.today() - timedelta(days=3)).isoformat()).json()
+        self.assertEqual(data['start'], date.today().isoformat())
+        self.assertEqual(data['end'], (date.today() + timedelta(days=3)).isoformat())
+
+    def test_pages_through_all_specialists(self):
+        client = User.objects.create(username='cli@test.com').profile
+        with mock.patch.object(availability, 'PAGE_SIZE', 1):
+            first = self.get().json()
+            second = self.get(after=first['next']).json()
+        self.assertEqual([s['id'] for s in first['specialists']], [self.ana.pk])
+        self.assertEqual(first['next'], self.ana.pk)
+        self.assertEqual([s['id'] for s in second['specialists']], [self.bia.pk])
+        self.assertIsNone(second['next'])
+        # Quem não é especialista nunca entra, nem pedido pelo id
+        self.assertEqual(self.get(specialists=client.pk).json()['specialists'], [])
+
+    def test_smaller_than_the_html_page(self):
+        html = self.client.get(reverse('specialist_detail', args=[self.ana.pk]))
+        api = self.get(specialists=self.ana.pk)
+        self.assertLess(len(api.content) * 10, len(html.content))
+
+
+# --- ADMIN DA AGENDA EM ESCALA ---
+@override_settings(STORAGES=SIMPLE_STORAGES)
+class AppointmentAdminTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin_user = User.objects.create(username='admin@test.com', is_staff=True, is_superuser=True)
+        self.client.force_login(self.admin_user)
+        self.ana = make_specialist('Ana')
+        self.bia = make_specialist('Bia')
+        self.cliente = User.objects.create(username='cli@test.com', first_name='Cli')
+        self.day = date.today() + timedelta(days=1)
+
+    def add_slots(self, count, specialist=None, **fields):
+        start = Appointment.objects.count()
+        Appointment.objects.bulk_create([
+            Appointment(specialist=specialist or self.ana, date=self.day, time=time((start + n) % 24, (start + n) // 24), **fields)
+            for n in range(count)
+        ])
+
+    def changelist(self, params=None):
+        return self.client.get(reverse('admin:core_appointment_changelist'), params or {})
+
+    def action(self, action, params='', **data):
+        return self.client.post(reverse('admin:core_appointment_changelist') + params, {'action': action, **data})
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self.add_slots(3, client=self.cliente, is_booked=True)
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.changelist().status_code, 200)
+        self.add_slots(30, specialist=self.bia, client=self.cliente, is_booked=True)
+        with CaptureQueriesContext(connection) as many:
+            self.assertEqual(self.changelist().status_code, 200)
+        self.assertEqual(len(few), len(many))
+
+    def test_specialist_filter_uses_autocomplete(self):
+        self.add_slots(2)
+        self.add_slots(3, specialist=self.bia)
+        response = self.changelist()
+        # A barra lateral não lista os perfis: o select2 busca pelo autocomplete
+        self.assertContains(response, 'class="autocomplete-filter"')
+        self.assertContains(response, 'js/admin_autocomplete_filter.js')
+        self.assertNotContains(response, f'specialist={self.bia.pk}')
+
+        filtered = self.changelist({'specialist': self.bia.pk})
+        self.assertEqual(filtered.context['cl'].result_count, 3)
+        self.assertContains(filtered, f'<option value="{self.bia.pk}" selected>')
+
+        results = self.client.get(reverse('admin:autocomplete'), {
+            'app_label': 'core', 'model_name': 'appointment', 'field_name': 'specialist', 'term': '',
+        }).json()['results']
+        # O cliente (e o admin) também têm perfil, mas não são especialistas
+        self.assertEqual({int(r['id']) for r in results}, {self.ana.pk, self.bia.pk})
+
+    def test_unfiltered_count_comes_from_table_statistics(self):
+        self.add_slots(5)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        queryset = Appointment.objects.all()
+        self.assertEqual(admin_module.estimated_rows(Appointment, 'default'), 5)
+        with mock.patch.object(admin_module, 'ESTIMATE_THRESHOLD', 1):
+            with self.assertNumQueries(1):
+                self.assertEqual(admin_module.EstimatedCountPaginator(queryset, 10).count, 5)
+            self.add_slots(1)
+            # Com filtro a contagem é exata
+            paginator = admin_module.EstimatedCountPaginator(queryset.filter(is_booked=False), 10)
+            self.assertEqual(paginator.count, 6)
+
+    def test_release_is_a_single_update(self):
+        self.add_slots(3, client=self.cliente, is_booked=True)
+        self.add_slots(1)
+        ids = [str(pk) for pk in Appointment.objects.values_list('pk', flat=True)]
+        with mock.patch.object(events, 'publish') as publish:
+            with CaptureQueriesContext(connection) as queries:
+                self.action('release_slots', _selected_action=ids)
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "core_appointment"')]
+        self.assertEqual(len(updates), 1)
+        self.assertFalse(Appointment.objects.filter(is_booked=True).exists())
+        self.assertFalse(Appointment.objects.exclude(client=None).exists())
+        publish.assert_called_once_with(self.ana.pk, 'changed')
+
+    def test_delete_asks_for_totals_then_deletes_in_one_statement(self):
+        self.add_slots(4)
+        self.add_slots(2, specialist=self.bia, client=self.cliente, is_booked=True)
+        before = Profile.objects.get(pk=self.bia.pk).updated_at
+
+        confirm = self.action('delete_slots', '?specialist=%d' % self.bia.pk,
+                              select_across='1', _selected_action=['0'])
+        self.assertContains(confirm, 'Excluir 2 horário(s), 2 deles já reservado(s)?')
+        self.assertEqual(Appointment.objects.count(), 6)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.action('delete_slots', '?specialist=%d' % self.bia.pk,
+                        select_across='1', _selected_action=['0'], post='yes')
+        deletes = [q['sql'] for q in queries if q['sql'].startswith('DELETE')]
+        self.assertEqual(len(deletes), 1)
+        self.assertEqual(set(Appointment.objects.values_list('specialist_id', flat=True)), {self.ana.pk})
+        self.assertGreater(Profile.objects.get(pk=self.bia.pk).updated_at, before)
+
+    def test_default_delete_selected_is_replaced(self):
+        response = self.changelist()
+        self.assertNotIn('delete_selected', response.context['action_form'].fields['action'].choices.__repr__())
+
+
+# --- ASSINATURAS E PAGAMENTOS ---
+@override_settings(STORAGES=SIMPLE_STORAGES)
+class BillingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='pagante@test.com', first_name='Pagante')
+        self.profile = self.user.profile
+        self.client.force_login(self.user)
+
+    def pay(self, key='chave-1', plan='Basico'):
+        return self.client.post(reverse('process_payment'), {'plan_type': plan, 'idempotency_key': key})
+
+    def test_checkout_uses_server_price_and_fresh_key(self):
+        first = self.client.get(reverse('checkout', args=['Premium', '0.01']))
+        second = self.client.get(reverse('checkout', args=['Premium', '0.01']))
+        # R$ 59,90/mês, cobrado de uma vez pelo trimestre
+        self.assertEqual(first.context['price'], Decimal('179.70'))
+        self.assertNotEqual(first.context['idempotency_key'], second.context['idempotency_key'])
+        self.assertContains(first, 'name="idempotency_key"')
+        self.assertRedirects(self.client.get(reverse('checkout', args=['Gratis', '0'])), reverse('plans_selection'))
+
+    def test_same_key_charges_once(self):
+        self.assertRedirects(self.pay(), reverse('dashboard'), fetch_redirect_response=False)
+        expires_at = Subscription.objects.get(profile=self.profile).expires_at
+        self.pay()
+
+        self.assertEqual(Payment.objects.count(), 1)
+        payment = Payment.objects.get()
+        self.assertEqual(payment.amount, Decimal('29.90'))
+        self.assertEqual(payment.subscription.expires_at, expires_at)
+        self.assertAlmostEqual(expires_at, timezone.now() + timedelta(days=30), delta=timedelta(minutes=1))
+        self.profile.refresh_from_db()
+        self.assertTrue(self.profile.has_active_plan)
+        self.assertEqual(self.profile.access_type, 'assinatura')
+
+    def test_new_payment_extends_from_current_expiry(self):
+        self.pay('a')
+        self.pay('b', plan='Premium')
+        subscription = Subscription.objects.get(profile=self.profile)
+        self.assertEqual(subscription.plan, 'Premium')
+        self.assertAlmostEqual(subscription.expires_at, timezone.now() + timedelta(days=120), delta=timedelta(minutes=1))
+
+    def test_migration_backfills_existing_subscribers(self):
+        backfill = importlib.import_module('core.migrations.0015_backfill_subscriptions')
+        Profile.objects.filter(pk=self.profile.pk).update(has_active_plan=True)
+        make_specialist('SemPlano')
+
+        backfill.backfill_subscriptions(django_apps, None)
+
+        subscription = Subscription.objects.get()
+        self.assertEqual(subscription.profile_id, self.profile.pk)
+        self.assertEqual(subscription.plan, backfill.LEGACY_PLAN)
+        self.assertTrue(billing.has_active_plan(self.profile))
+
+    def test_rejects_unknown_plan_or_missing_key(self):
+        self.assertRedirects(self.pay(plan='Gratis'), reverse('plans_selection'), fetch_redirect_response=False)
+        self.assertRedirects(self.pay(key=''), reverse('plans_selection'), fetch_redirect_response=False)
+        self.assertFalse(Payment.objects.exists())
+
+    def test_plan_check_is_one_query(self):
+        with self.assertNumQueries(1):
+            self.assertFalse(billing.has_active_plan(self.profile))
+        self.pay()
+        self.assertTrue(billing.has_active_plan(self.profile))
+        Subscription.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertFalse(billing.has_active_plan(self.profile))
+
+    @override_settings(BOOKING_REQUIRES_PLAN=True)
+    def test_booking_requires_plan_when_enabled(self):
+        slot = Appointment.objects.create(specialist=make_specialist('Agenda'), date=date.today(), time=time(10))
+        self.assertRedirects(self.client.get(reverse('book_appointment', args=[slot.id])),
+                             reverse('plans_selection'), fetch_redirect_response=False)
+        self.pay()
+        self.client.get(reverse('book_appointment', args=[slot.id]))
+        slot.refresh_from_db()
+        self.assertEqual(slot.client, self.user)
+
+    def test_expiry_runs_in_chunked_updates(self):
+        profiles = [User.objects.create(username=f'exp{i}@test.com').profile for i in range(5)]
+        for i, profile in enumerate(profiles):
+            billing.process_payment(profile, 'Basico', f'k{i}')
+        lapsed = profiles[:3]
+        Subscription.objects.filter(profile__in=lapsed).update(expires_at=timezone.now() - timedelta(days=1))
+
+        with CaptureQueriesContext(connection) as queries:
+            counts = list(billing.expire_subscriptions(batch_size=2))
+        self.assertEqual(counts, [2, 1])
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('UPDATE')]), 4)
+        self.assertEqual(
+            set(Profile.objects.filter(has_active_plan=True).values_list('pk', flat=True)),
+            {p.pk for p in profiles[3:]},
+        )
+        self.assertEqual(Subscription.objects.filter(is_active=False).count(), 3)
+
+        out = StringIO()
+        call_command('expire_subscriptions', stdout=out)
+        self.assertIn('0 assinaturas vencidas', out.getvalue())
+
+        # Pagar de novo reativa a partir de agora
+        billing.process_payment(lapsed[0], 'Basico', 'renova')
+        self.assertTrue(billing.has_active_plan(lapsed[0]))
+
+
+class BillingConcurrencyTests(TransactionTestCase):
+    def test_duplicate_submissions_in_parallel_charge_once(self):
+        profile = User.objects.create(username='duplo@test.com').profile
+
+        def submit(key):
+            try:
+                while True:
+                    try:
+                        return billing.process_payment(profile, 'Basico', key)[1]
+                    except OperationalError:
+                        # SQLite em memória: "table is locked" em vez de esperar
+                        continue
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            created = list(pool.map(submit, ['duplo-clique'] * 20 + ['outra-aba'] * 20))
+
+        self.assertEqual(created.count(True), 2)
+        self.assertEqual(Payment.objects.filter(profile=profile).count(), 2)
+        # Os dois pagamentos distintos somam os períodos, sem perder nenhum UPDATE
+        expires_at = Subscription.objects.get(profile=profile).expires_at
+        self.assertAlmostEqual(expires_at, timezone.now() + timedelta(days=60), delta=timedelta(minutes=1))
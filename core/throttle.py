@@ -0,0 +1,83 @@
+import threading
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.shortcuts import render
+
+# Hashes de senha simultâneos por processo (o resto das views continua com CPU)
+_slots = None
+_slots_lock = threading.Lock()
+
+
+def get_slots():
+    global _slots
+    if _slots is None:
+        with _slots_lock:
+            if _slots is None:
+                _slots = threading.BoundedSemaphore(settings.LOGIN_MAX_CONCURRENT_HASHES)
+    return _slots
+
+
+def client_ip(request):
+    """IP do cliente. Atrás de proxy o REMOTE_ADDR é o do proxy (todos cairiam na
+    mesma chave): com TRUSTED_PROXY_HEADER usa o endereço acrescentado pelo
+    proxy mais externo dos TRUSTED_PROXY_COUNT; o que vem antes o cliente forja."""
+    header = settings.TRUSTED_PROXY_HEADER
+    if header:
+        forwarded = [ip.strip() for ip in request.META.get(header, '').split(',') if ip.strip()]
+        if forwarded and len(forwarded) >= settings.TRUSTED_PROXY_COUNT:
+            return forwarded[-settings.TRUSTED_PROXY_COUNT]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def over_rate_limit(request):
+    """Janela fixa no cache: tentativas por IP e por email."""
+    window = settings.LOGIN_RATE_WINDOW
+    keys = [f'login-rate:ip:{client_ip(request)}']
+    email = (request.POST.get('email') or '').strip().lower()
+    if email:
+        keys.append(f'login-rate:email:{email}')
+
+    limited = False
+    for key in keys:
+        cache.add(key, 0, window)
+        try:
+            attempts = cache.incr(key)
+        except ValueError:
+            # Expirou entre o add e o incr: conta como a primeira da nova janela
+            cache.add(key, 1, window)
+            attempts = 1
+        limited = limited or attempts > settings.LOGIN_RATE_LIMIT
+    return limited
+
+
+def _too_many(request, text):
+    messages.error(request, text)
+    return render(request, 'login.html', status=429)
+
+
+def limit_password_hashing(view):
+    """Para o POST de login/cadastro: recusa quem passou do limite de tentativas
+    e só deixa LOGIN_MAX_CONCURRENT_HASHES requisições calculando hash ao mesmo tempo."""
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != 'POST':
+            return view(request, *args, **kwargs)
+
+        if over_rate_limit(request):
+            return _too_many(request, 'Muitas tentativas. Aguarde um minuto e tente novamente.')
+
+        slots = get_slots()
+        if not slots.acquire(timeout=settings.LOGIN_HASH_WAIT):
+            response = _too_many(request, 'Servidor ocupado. Tente novamente em instantes.')
+            response['Retry-After'] = '1'
+            return response
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            slots.release()
+
+    return wrapper
@@ -1,71 +1,76 @@
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth.models import User, Group
 from django.contrib.auth import authenticate, login as auth_login, logout as auth_logout
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q
-from .models import Profile, Appointment
-from .forms import ProfileForm
+from django.db import IntegrityError, transaction
+from .models import Appointment
+from .accounts import EmailTaken, create_account
+from . import billing, caching, facets, listing, metrics
+from .forms import ProfileForm, RecurringScheduleForm, SlotForm
+from .scheduling import create_recurring_slots
+from .images import schedule_profile_photo
+from .exports import FORMATS, streaming_export
+from .throttle import limit_password_hashing
+from .routers import read_from_replica
+from .freshness import conditional_catalogue, home_validator, specialist_validator, templates_version
 from datetime import date
+import logging
+import uuid
 
-# --- AUXILIAR ---
-def get_profile(user):
-    profile, created = Profile.objects.get_or_create(user=user)
-    return profile
+logger = logging.getLogger(__name__)
 
 # --- HOME (Com Busca e Filtros Otimizados) ---
+@read_from_replica
+@conditional_catalogue(home_validator)
 def home(request):
     # 1. Pega apenas quem é especialista e tem preço definido (perfil completo)
-    specialists = Profile.objects.filter(is_specialist=True).exclude(price__isnull=True)
-    
-    # 2. Lógica de Busca (Barra de Pesquisa)
-    query = request.GET.get('q')
-    if query:
-        specialists = specialists.filter(
-            Q(user__first_name__icontains=query) | 
-            Q(profession__icontains=query) |
-            Q(description__icontains=query)
-        )
+    specialists = listing.specialist_cards()
 
-    # 3. Filtro por Categoria (Botões da Home)
+    # 2. Filtro por Categoria (Botões da Home)
     category = request.GET.get('category')
     if category and category != 'all':
         specialists = specialists.filter(profession=category)
-    
-    # 4. Lista de Profissões para o Menu
-    all_professions = [
-        'Tecnologia e TI', 'Saúde e Bem-estar', 'Consultoria Jurídica',
-        'Consultoria Financeira', 'Marketing Digital', 'Coaching Profissional',
-        'Educação', 'Engenharia', 'Arquitetura e Design', 'Psicologia'
-    ]
-    
+
+    # 3. Paginação por cursor; com busca (índice FTS) a ordem é por relevância
+    query = request.GET.get('q')
+    after = listing.parse_cursor(request.GET.get('after'))
+    if query:
+        page = listing.search_page(specialists, query, after=after)
+    else:
+        page = listing.keyset_page(specialists, after=after)
+
+    # 4. Menu de Profissões com contagens (uma query agrupada, memoizada por versão)
     return render(request, 'home.html', {
-        'specialists': specialists,
-        'all_professions': all_professions
+        'specialists': page.items,
+        'next_cursor': page.next_cursor,
+        'facets': facets.get_facets(query),
+        'category': category or 'all',
+        # {% cache %} dos cards (home.html)
+        'card_seconds': settings.CARD_FRAGMENT_SECONDS,
+        'templates_version': templates_version(),
     })
 
 # --- DETALHES (Página de Ver Perfil) ---
+@read_from_replica
+@conditional_catalogue(specialist_validator)
 def specialist_detail_view(request, id):
-    specialist = get_object_or_404(Profile, id=id)
+    # Card e agenda vêm do cache versionado (invalidado pelos signals)
+    spec = caching.request_specialist_page(request, id)
+    if spec is None:
+        raise Http404
     
-    if not specialist.is_specialist:
+    if not spec['is_specialist']:
         return redirect('home')
 
-    # Mostra apenas horários futuros
-    appointments = Appointment.objects.filter(
-        specialist=specialist, 
-        date__gte=date.today()
-    ).order_by('date', 'time')
-
-    return render(request, 'specialist_detail.html', {
-        'spec': specialist,
-        'appointments': appointments
-    })
+    return render(request, 'specialist_detail.html', {'spec': spec})
 
 # --- DASHBOARD (CORRIGIDO E COMPLETO) ---
 @login_required
 def dashboard_view(request):
-    profile = get_profile(request.user)
+    profile = request.profile
     
     # Contexto Base (Enviamos 'profile' para corrigir o erro de link)
     context = {
@@ -82,6 +87,8 @@ def dashboard_view(request):
         ).order_by('date', 'time')
         
         context['appointments'] = appointments
+        context['weekday_choices'] = RecurringScheduleForm.WEEKDAY_CHOICES
+        context['slot_choices'] = RecurringScheduleForm.SLOT_CHOICES
         return render(request, 'dashboard.html', context)
     
     else:
@@ -89,10 +96,10 @@ def dashboard_view(request):
         my_appointments = Appointment.objects.filter(
             client=request.user,
             date__gte=date.today()
-        ).order_by('date', 'time')
+        ).select_related('specialist__user').order_by('date', 'time')
         
-        # Sugestão de especialistas
-        specialists = Profile.objects.filter(is_specialist=True).exclude(price__isnull=True)
+        # Sugestão de especialistas (só os 4 do carrossel)
+        specialists = listing.keyset_page(listing.specialist_cards(), size=4).items
         
         context['appointments'] = my_appointments
         context['specialists'] = specialists
@@ -102,54 +109,100 @@ def dashboard_view(request):
 # --- AGENDAMENTO (Cliente reserva horário) ---
 @login_required
 def book_appointment_view(request, appointment_id):
-    profile = get_profile(request.user)
+    profile = request.profile
     
     # Validações
     if profile.is_specialist:
         messages.error(request, 'Especialistas não podem agendar consultas.')
         return redirect('dashboard')
 
-    # Validação de Plano (Opcional - descomente se quiser ativar)
-    # if not profile.has_active_plan:
-    #     messages.error(request, 'Você precisa de um plano ativo para agendar.')
-    #     return redirect('plans_selection')
+    # Validação de Plano (opcional: BOOKING_REQUIRES_PLAN)
+    if settings.BOOKING_REQUIRES_PLAN and not billing.has_active_plan(profile):
+        messages.error(request, 'Você precisa de um plano ativo para agendar.')
+        return redirect('plans_selection')
 
-    appointment = get_object_or_404(Appointment, id=appointment_id)
-    
-    if appointment.is_booked:
-        messages.error(request, 'Horário já reservado por outra pessoa.')
-    else:
-        appointment.is_booked = True
-        appointment.client = request.user
-        appointment.save()
+    # UPDATE condicional: só um cliente consegue reservar o mesmo horário
+    if Appointment.objects.book(request.user, [appointment_id]):
         messages.success(request, 'Agendamento confirmado com sucesso!')
+    else:
+        get_object_or_404(Appointment, id=appointment_id)
+        messages.error(request, 'Horário já reservado por outra pessoa.')
     
     return redirect('dashboard')
 
 # --- GERENCIAMENTO DE AGENDA (Especialista cria/deleta horários) ---
 @login_required
 def create_appointment_view(request):
-    profile = get_profile(request.user)
+    profile = request.profile
     if not profile.is_specialist:
         return redirect('dashboard')
 
     if request.method == 'POST':
-        date_appt = request.POST.get('date')
-        time_appt = request.POST.get('time')
-        
-        # Evita duplicidade
-        if not Appointment.objects.filter(specialist=profile, date=date_appt, time=time_appt).exists():
-            Appointment.objects.create(
-                specialist=profile,
-                date=date_appt,
-                time=time_appt
-            )
+        form = SlotForm(request.POST)
+        if not form.is_valid():
+            for errors in form.errors.values():
+                messages.error(request, errors[0])
+            return redirect('dashboard')
+        date_appt = form.cleaned_data['date']
+        time_appt = form.cleaned_data['time']
+
+        # Evita duplicidade: a constraint unique_specialist_slot barra o INSERT repetido
+        try:
+            with transaction.atomic():
+                Appointment.objects.create(
+                    specialist=profile,
+                    date=date_appt,
+                    time=time_appt
+                )
             messages.success(request, 'Horário liberado na agenda!')
-        else:
+        except IntegrityError:
+            # Só a unique_specialist_slot é "horário repetido": o SQLite não diz o nome
+            # da constraint, então confere se o horário existe; outra falha sobe
+            if not Appointment.objects.filter(specialist=profile, date=date_appt, time=time_appt).exists():
+                raise
             messages.error(request, 'Você já tem um horário liberado nesta data e hora.')
             
     return redirect('dashboard')
 
+@login_required
+def create_recurring_appointments_view(request):
+    profile = request.profile
+    if not profile.is_specialist or request.method != 'POST':
+        return redirect('dashboard')
+
+    # Agenda semanal: expande no servidor e insere tudo de uma vez
+    form = RecurringScheduleForm(request.POST)
+    if form.is_valid():
+        created = create_recurring_slots(profile, **form.cleaned_data)
+        messages.success(request, f'{created} horários liberados na agenda!')
+    else:
+        for error in form.non_field_errors() or ['Confira os campos da agenda recorrente.']:
+            messages.error(request, error)
+
+    return redirect('dashboard')
+
+@login_required
+def export_appointments_view(request):
+    profile = request.profile
+    if not profile.is_specialist:
+        return redirect('dashboard')
+
+    # Exporta a própria agenda em streaming (?format=csv|jsonl, &from=&to= opcionais)
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in FORMATS:
+        return HttpResponseBadRequest('Formato inválido. Use csv ou jsonl.')
+
+    appointments = Appointment.objects.filter(specialist=profile)
+    try:
+        if request.GET.get('from'):
+            appointments = appointments.filter(date__gte=date.fromisoformat(request.GET['from']))
+        if request.GET.get('to'):
+            appointments = appointments.filter(date__lte=date.fromisoformat(request.GET['to']))
+    except ValueError:
+        return HttpResponseBadRequest('Datas no formato AAAA-MM-DD.')
+
+    return streaming_export(appointments, fmt, filename='minha-agenda', request=request)
+
 @login_required
 def delete_appointment_view(request, appointment_id):
     appointment = get_object_or_404(Appointment, id=appointment_id)
@@ -160,6 +213,7 @@ def delete_appointment_view(request, appointment_id):
     return redirect('dashboard')
 
 # --- LOGIN / CADASTRO / LOGOUT ---
+@limit_password_hashing
 def login_view(request):
     if request.method == 'POST':
         # CADASTRO
@@ -169,26 +223,22 @@ def login_view(request):
                     messages.error(request, 'As senhas não coincidem.')
                     return render(request, 'login.html')
 
-                if User.objects.filter(email=request.POST.get('email')).exists():
+                # Uma transação só; o email repetido é barrado pelo índice único do banco
+                # (qualquer outro IntegrityError cai no erro genérico abaixo)
+                is_spec = (request.POST.get('user_type') == 'specialist')
+                try:
+                    user = create_account(
+                        email=request.POST.get('email'),
+                        password=request.POST.get('password'),
+                        name=request.POST.get('name'),
+                        is_specialist=is_spec,
+                    )
+                except EmailTaken:
                     messages.error(request, 'Este email já está cadastrado.')
                     return render(request, 'login.html')
 
-                user = User.objects.create_user(
-                    username=request.POST.get('email'), 
-                    email=request.POST.get('email'), 
-                    password=request.POST.get('password')
-                )
-                user.first_name = request.POST.get('name')
-                user.save()
-
-                tipo = request.POST.get('user_type')
-                is_spec = (tipo == 'specialist')
-                
-                Profile.objects.create(user=user, is_specialist=is_spec)
-                grupo, _ = Group.objects.get_or_create(name='Especialistas' if is_spec else 'Clientes')
-                user.groups.add(grupo)
-
-                auth_login(request, user)
+                # Com o ModelBackend também listado, o login precisa saber qual backend gravar
+                auth_login(request, user, backend='core.backends.ProfileBackend')
                 messages.success(request, 'Conta criada com sucesso!')
                 
                 if is_spec:
@@ -196,9 +246,9 @@ def login_view(request):
                 else:
                     return redirect('home')
 
-            except Exception as e:
+            except Exception:
+                logger.exception('Falha no cadastro de %s', request.POST.get('email'))
                 messages.error(request, 'Erro ao criar conta. Tente novamente.')
-                print(e)
                 return render(request, 'login.html')
         
         # LOGIN
@@ -219,11 +269,17 @@ def logout_view(request):
 # --- EDITAR PERFIL ---
 @login_required
 def edit_profile_view(request):
-    profile = get_profile(request.user)
+    profile = request.profile
     if request.method == 'POST':
         form = ProfileForm(request.POST, request.FILES, instance=profile)
         if form.is_valid():
-            form.save()
+            profile = form.save(commit=False)
+            # Foto nova: descarta as miniaturas antigas e gera as novas em segundo plano
+            if 'photo' in form.changed_data:
+                profile.photo_renditions = {}
+            profile.save()
+            if 'photo' in form.changed_data:
+                schedule_profile_photo(profile)
             messages.success(request, 'Perfil atualizado!')
             return redirect('dashboard')
     else:
@@ -248,15 +304,36 @@ def plans_selection_view(request):
 
 @login_required
 def checkout_view(request, plan_type, price):
-    return render(request, 'checkout.html', {'plan_type': plan_type, 'price': price})
+    plan = billing.PLANS.get(plan_type)
+    if plan is None:
+        return redirect('plans_selection')
+    # Uma chave por abertura do checkout: reenviar o mesmo formulário não cobra de novo
+    return render(request, 'checkout.html', {
+        'plan_type': plan_type, 'price': plan.price, 'idempotency_key': uuid.uuid4().hex,
+    })
 
 @login_required
 def process_payment_view(request):
     if request.method == 'POST':
-        profile = get_profile(request.user)
-        profile.has_active_plan = True
-        profile.access_type = 'assinatura'
-        profile.save()
-        messages.success(request, 'Pagamento aprovado! Agora você pode agendar consultas.')
+        plan_type = request.POST.get('plan_type')
+        idempotency_key = request.POST.get('idempotency_key', '')[:64]
+        if plan_type not in billing.PLANS or not idempotency_key:
+            messages.error(request, 'Pagamento inválido. Escolha o plano novamente.')
+            return redirect('plans_selection')
+
+        _, created = billing.process_payment(request.profile, plan_type, idempotency_key)
+        if created:
+            messages.success(request, 'Pagamento aprovado! Agora você pode agendar consultas.')
+        else:
+            messages.info(request, 'Este pagamento já tinha sido aprovado.')
         return redirect('dashboard')
-    return redirect('home')
\ No newline at end of file
+    return redirect('home')
+
+# --- MÉTRICAS (só staff) ---
+@staff_member_required
+def metrics_view(request):
+    # Valores deste processo (cada worker do gunicorn tem os seus)
+    return JsonResponse({
+        'views': metrics.snapshot(),
+        'specialist_page_cache': caching.stats(),
+    }, json_dumps_params={'indent': 2})
\ No newline at end of file
@@ -12,5 +12,16 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'setup.settings')
+# Home e perfil nas versões async (core.async_views); o resto continua síncrono.
+# As views síncronas (login, dashboard, checkout, admin...) rodam todas na mesma
+# thread do worker (sync_to_async thread_sensitive): dentro de um processo elas
+# atendem uma de cada vez. A concorrência delas vem do número de workers.
+# As exportações (core.exports) devolvem um iterador async e não travam essa thread
+# entre um bloco e outro.
+# Ex.: uvicorn setup.asgi:application --workers 1
+# Com PostgreSQL, mais workers só com SLOT_EVENTS_BACKEND=core.events.PostgresBackend:
+# o LocalBackend entrega a agenda ao vivo apenas no worker que fez a mudança.
+# Ex.: SLOT_EVENTS_BACKEND=core.events.PostgresBackend uvicorn setup.asgi:application --workers 4
+os.environ.setdefault('ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
@@ -2,15 +2,22 @@ from django.contrib import admin
 from django.urls import path
 from django.conf import settings
 from django.conf.urls.static import static
-from core import views
+from core import async_views, views
+
+# Catálogo: views async quando servido pelo setup/asgi.py (ASYNC_VIEWS=1)
+catalogue = async_views if settings.ASYNC_VIEWS else views
 
 urlpatterns = [
-    # Admin
+    # Admin (métricas antes do admin.site, que capturaria a rota)
+    path('admin/metrics/', views.metrics_view, name='request_metrics'),
     path('admin/', admin.site.urls),
 
     # Páginas Principais
-    path('', views.home, name='home'),
-    path('specialist/<int:id>/', views.specialist_detail_view, name='specialist_detail'),
+    path('', catalogue.home, name='home'),
+    path('specialist/<int:id>/', catalogue.specialist_detail_view, name='specialist_detail'),
+    path('specialist/<int:id>/availability/', async_views.availability_view, name='specialist_availability'),
+    path('specialist/<int:id>/events/', async_views.slot_events_view, name='specialist_events'),
+    path('api/availability/', async_views.availability_api_view, name='availability_api'),
     path('dashboard/', views.dashboard_view, name='dashboard'),
     
     # Autenticação e Perfil
@@ -21,6 +28,8 @@ urlpatterns = [
 
     # Agenda (Criação e Agendamento)
     path('appointment/create/', views.create_appointment_view, name='create_appointment'),
+    path('appointment/create/recurring/', views.create_recurring_appointments_view, name='create_recurring_appointments'),
+    path('appointment/export/', views.export_appointments_view, name='export_appointments'),
     path('appointment/delete/<int:appointment_id>/', views.delete_appointment_view, name='delete_appointment'),
     path('appointment/book/<int:appointment_id>/', views.book_appointment_view, name='book_appointment'),
 